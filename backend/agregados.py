@@ -0,0 +1,101 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from backend.almacen import almacen_estacion
+from backend.estaciones import registro_estaciones
+from backend.indicadores import motor_indicadores
+
+# === Agregados precalculados para el frontend ===
+# Registros por año, histograma, resumen de indicadores, rachas secas y el digesto de
+# la serie para los prompts (contexto) se calculan
+# una vez por (estación, versión del almacén, parámetros) y se guardan en una LRU.
+# Cada resultado lleva un ETag derivado de esa misma clave: si el cliente ya tiene
+# la versión vigente (If-None-Match), la API responde 304 sin recalcular ni enviar datos.
+
+AGREGADOS_CAPACIDAD = int(os.getenv("AGREGADOS_CAPACIDAD", 256))
+BINS_HISTOGRAMA = 30
+
+def _registros_por_anio(df: pd.DataFrame, **_) -> dict:
+    conteos = df.groupby(df["fecha"].dt.year).size()
+    return {"año": conteos.index.tolist(), "registros": conteos.tolist()}
+
+def _histograma(df: pd.DataFrame, bins: int = BINS_HISTOGRAMA, **_) -> dict:
+    conteos, bordes = np.histogram(df["valor"].dropna(), bins=bins)
+    return {"bordes": bordes.tolist(), "conteos": conteos.tolist()}
+
+def _rachas(df: pd.DataFrame, **_) -> dict:
+    from backend.analysis import rachas_secas
+    rachas = rachas_secas(df)
+    fin = rachas["fin_racha_seca_max"]
+    return {
+        "racha_seca_max": None if rachas["racha_seca_max"] is None else int(rachas["racha_seca_max"]),
+        "fin_racha_seca_max": None if pd.isna(fin) else pd.Timestamp(fin).strftime("%Y-%m-%d"),
+        "racha_seca_actual": None if rachas["racha_seca_actual"] is None else int(rachas["racha_seca_actual"]),
+    }
+
+def _contexto(df: pd.DataFrame, **_) -> dict:
+    from backend.contexto_llm import resumir_serie
+    return {"texto": resumir_serie(df)}
+
+# tipo -> (columnas que necesita del almacén, función)
+AGREGADOS = {
+    "registros_anio": (["fecha"], _registros_por_anio),
+    "histograma": (["valor"], _histograma),
+    "rachas": (["fecha", "valor"], _rachas),
+    "contexto": (["fecha", "valor"], _contexto),
+    "resumen": (None, None),  # Lo responde el motor incremental de indicadores
+}
+
+class CacheAgregados:
+    def __init__(self, capacidad: int = AGREGADOS_CAPACIDAD):
+        self.capacidad = capacidad
+        self._entradas = OrderedDict()  # etag -> resultado
+        self._lock = threading.Lock()
+        self.contadores = {"hits": 0, "misses": 0}
+
+    def etag(self, tipo: str, estacion: str = None, desde=None, hasta=None, **parametros) -> str:
+        # Cambia si cambian los datos de la estación (versión del almacén) o los parámetros
+        if tipo not in AGREGADOS:
+            raise ValueError(f"Agregado desconocido: {tipo}. Opciones: {', '.join(AGREGADOS)}")
+        codigo = registro_estaciones.obtener(estacion)["codigo"]
+        version = almacen_estacion(codigo).version()
+        material = json.dumps([tipo, codigo, version, str(desde), str(hasta), parametros], sort_keys=True)
+        return f'"{hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]}"'
+
+    def obtener(self, tipo: str, estacion: str = None, desde=None, hasta=None, **parametros) -> tuple:
+        etag = self.etag(tipo, estacion, desde, hasta, **parametros)
+        with self._lock:
+            if etag in self._entradas:
+                self._entradas.move_to_end(etag)
+                self.contadores["hits"] += 1
+                return etag, self._entradas[etag]
+            self.contadores["misses"] += 1
+
+        columnas, funcion = AGREGADOS[tipo]
+        if funcion is None:
+            resultado = motor_indicadores.resumen(estacion, desde, hasta)
+        else:
+            resultado = funcion(almacen_estacion(estacion).leer(columnas, desde, hasta), **parametros)
+
+        with self._lock:
+            self._entradas[etag] = resultado
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+        return etag, resultado
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+def coincide_etag(if_none_match: str, etag: str) -> bool:
+    # If-None-Match admite "*", listas separadas por comas y etiquetas débiles (W/"...")
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip() for e in if_none_match.split(",")]
+    return "*" in etiquetas or any(e.removeprefix("W/") == etag for e in etiquetas)
+
+cache_agregados = CacheAgregados()
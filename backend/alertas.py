@@ -0,0 +1,369 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from backend.almacen import almacen_estacion
+from backend.estaciones import registro_estaciones, DATA_DIR
+from backend.correo import bandeja_salida
+
+# === Alertas de sequía evaluadas de forma incremental ===
+# Los operadores definen reglas sobre las columnas del almacén o sobre métricas
+# derivadas; cada regla guarda por estación un estado pequeño (la racha en curso y la
+# última fecha evaluada) y sólo mira las filas nuevas que llegan con la telemetría:
+# el costo por fila no depende de cuánta historia tenga la estación. Una alerta se
+# dispara al entrar en la condición (un episodio, una alerta), queda registrada una
+# sola vez por (regla, estación, fecha) y no se envía por correo más de una vez cada
+# enfriamiento_s. Una regla creada con un episodio ya en curso avisa desde el próximo.
+#
+# Tipos de regla:
+#   condicion:  columna <operador> umbral (o <operador> columna_umbral) en N unidades
+#               seguidas, p. ej. valor == 0, o completo_mediciones < completo_umbral
+#   racha_seca: N días consecutivos sin lluvia (suma diaria de valor == 0)
+# Unidad de N (unidad): "lecturas" cuenta filas seguidas; "dias" cuenta días consecutivos
+# en los que todas las lecturas cumplen, y un día sin datos corta la racha. racha_seca
+# siempre cuenta días; condicion cuenta lecturas salvo que se pida "dias".
+
+ALERTAS_DB = os.getenv("ALERTAS_DB", os.path.join(DATA_DIR, "alertas.db"))
+ALERTAS_ENFRIAMIENTO_S = float(os.getenv("ALERTAS_ENFRIAMIENTO_S", 6 * 3600))
+
+TIPOS = ("condicion", "racha_seca")
+UNIDADES = ("lecturas", "dias")
+COLUMNAS_ALERTA = ("valor", "completo_mediciones", "completo_umbral")
+OPERADORES = {"==": np.equal, "!=": np.not_equal, "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal}
+_CAMPOS_REGLA = ("id", "nombre", "estacion", "tipo", "columna", "operador", "umbral", "columna_umbral",
+                 "consecutivos", "destinatarios", "enfriamiento_s", "creado", "unidad")
+
+def _cumple(regla: dict, df: pd.DataFrame) -> np.ndarray:
+    operador = OPERADORES[regla["operador"]]
+    referencia = df[regla["columna_umbral"]].to_numpy() if regla["columna_umbral"] else regla["umbral"]
+    return operador(df[regla["columna"]].to_numpy(), referencia)
+
+def _evaluar_condicion(regla: dict, estado: dict, df: pd.DataFrame) -> list:
+    if regla["unidad"] == "dias":
+        return _evaluar_dias(regla, estado, df, _cumple(regla, df))
+    # Largo de la racha en cada fila, continuando la del estado; se dispara al llegar a N
+    cumple = _cumple(regla, df)
+    indices = np.arange(len(cumple))
+    ultimo_corte = np.maximum.accumulate(np.where(cumple, -1, indices))
+    racha = np.where(ultimo_corte < 0, estado.get("racha", 0) + indices + 1, indices - ultimo_corte)
+    estado["racha"] = int(racha[-1])
+    disparos = np.flatnonzero(racha == regla["consecutivos"])
+    fechas = df["fecha"].to_numpy()
+    return [(fechas[i], regla["consecutivos"]) for i in disparos]
+
+def _evaluar_racha_seca(regla: dict, estado: dict, df: pd.DataFrame) -> list:
+    # Un día es seco si todas sus lecturas son 0 (su suma es 0)
+    return _evaluar_dias(regla, estado, df, df["valor"].to_numpy() == 0)
+
+def _evaluar_dias(regla: dict, estado: dict, df: pd.DataFrame, cumple: np.ndarray) -> list:
+    # Recorrido por día (no por fila): un día cumple si todas sus lecturas cumplen. El día
+    # en curso cuenta mientras no haya una lectura que no cumpla, así una racha diaria
+    # avisa con su primera lectura
+    dias = df["fecha"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    unicos, inicios = np.unique(dias, return_index=True)
+    todos = np.logical_and.reduceat(cumple, inicios)
+    if "suma" in estado:  # estados guardados antes de la unidad explícita
+        estado["cumple"] = estado.pop("suma") == 0
+    disparos = []
+    for dia, cumple_dia in zip(unicos.tolist(), todos.tolist()):
+        if estado.get("dia") is None:
+            estado.update(dia=dia, cumple=True, previa=0, disparada=False)
+        if dia != estado["dia"]:
+            # Cierra el día anterior
+            racha = estado["previa"] + 1 if estado["cumple"] else 0
+            continua = dia == estado["dia"] + 1
+            estado["previa"] = racha if continua else 0
+            if not estado["cumple"] or not continua:
+                estado["disparada"] = False
+            estado.update(dia=dia, cumple=True)
+        estado["cumple"] = estado["cumple"] and cumple_dia
+        racha = estado["previa"] + (1 if estado["cumple"] else 0)
+        if racha >= regla["consecutivos"] and not estado["disparada"]:
+            estado["disparada"] = True
+            disparos.append((np.datetime64(dia, "D").astype("datetime64[ns]"), racha))
+    return disparos
+
+EVALUADORES = {"condicion": _evaluar_condicion, "racha_seca": _evaluar_racha_seca}
+
+class MotorAlertas:
+    def __init__(self, ruta_db: str = ALERTAS_DB, almacenes=almacen_estacion, bandeja=bandeja_salida):
+        self.ruta_db = ruta_db
+        self.almacenes = almacenes
+        self.bandeja = bandeja
+        self._db = None
+        self._reglas = None  # cache de la tabla reglas
+        self._estados = {}   # (regla, estación) -> estado
+        self._lock = threading.RLock()
+        self.contadores = {"evaluaciones": 0, "filas": 0, "segundos": 0.0, "disparos": 0, "enviadas": 0,
+                           "suprimidas": 0, "errores": 0}
+
+    def _abrir_db(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.ruta_db) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.ruta_db, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS reglas (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT, estacion TEXT, "
+                "tipo TEXT, columna TEXT, operador TEXT, umbral REAL, columna_umbral TEXT, consecutivos INTEGER, "
+                "destinatarios TEXT, enfriamiento_s REAL, creado REAL, unidad TEXT)"
+            )
+            if "unidad" not in {c[1] for c in self._db.execute("PRAGMA table_info(reglas)")}:
+                # Reglas creadas antes de la unidad explícita: la que usaba cada tipo
+                self._db.execute("ALTER TABLE reglas ADD COLUMN unidad TEXT")
+                self._db.execute("UPDATE reglas SET unidad = CASE tipo WHEN 'racha_seca' THEN 'dias' ELSE 'lecturas' END")
+            # Estado incremental por (regla, estación): sobrevive a reinicios sin recorrer la historia
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS estados (regla INTEGER, estacion TEXT, ultima INTEGER, estado TEXT, "
+                "ultimo_envio REAL, PRIMARY KEY (regla, estacion))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS alertas (id INTEGER PRIMARY KEY AUTOINCREMENT, regla INTEGER, estacion TEXT, "
+                "fecha TEXT, racha INTEGER, mensaje TEXT, id_correo TEXT, creado REAL, UNIQUE (regla, estacion, fecha))"
+            )
+            self._db.commit()
+        return self._db
+
+    # Reglas
+    def agregar(self, nombre: str, destinatarios, tipo: str = "racha_seca", estacion: str = None,
+                columna: str = "valor", operador: str = "==", umbral: float = None, columna_umbral: str = None,
+                consecutivos: int = 1, enfriamiento_s: float = ALERTAS_ENFRIAMIENTO_S, unidad: str = None) -> dict:
+        if tipo not in TIPOS:
+            raise ValueError(f"Tipo de regla desconocido: {tipo}. Opciones: {', '.join(TIPOS)}")
+        unidad = unidad or ("dias" if tipo == "racha_seca" else "lecturas")
+        if unidad not in UNIDADES:
+            raise ValueError(f"Unidad desconocida: {unidad}. Opciones: {', '.join(UNIDADES)}")
+        if tipo == "racha_seca" and unidad != "dias":
+            raise ValueError("racha_seca cuenta días: su unidad sólo puede ser dias.")
+        if consecutivos < 1:
+            raise ValueError("consecutivos debe ser al menos 1.")
+        destinatarios = [destinatarios] if isinstance(destinatarios, str) else list(dict.fromkeys(destinatarios))
+        if not destinatarios:
+            raise ValueError("La regla necesita al menos un destinatario.")
+        if tipo == "condicion":
+            if columna not in COLUMNAS_ALERTA or columna_umbral and columna_umbral not in COLUMNAS_ALERTA:
+                raise ValueError(f"Columna desconocida. Opciones: {', '.join(COLUMNAS_ALERTA)}")
+            if operador not in OPERADORES:
+                raise ValueError(f"Operador desconocido: {operador}. Opciones: {', '.join(OPERADORES)}")
+            if (umbral is None) == (columna_umbral is None):
+                raise ValueError("Indica umbral o columna_umbral (uno de los dos).")
+        else:
+            columna, operador, umbral, columna_umbral = "valor", None, None, None
+        codigo = registro_estaciones.obtener(estacion)["codigo"] if estacion else None  # None: todas
+        fila = (nombre, codigo, tipo, columna, operador, umbral, columna_umbral, int(consecutivos),
+                json.dumps(destinatarios), float(enfriamiento_s), time.time(), unidad)
+        with self._lock:
+            db = self._abrir_db()
+            id_regla = db.execute(
+                "INSERT INTO reglas (nombre, estacion, tipo, columna, operador, umbral, columna_umbral, consecutivos, "
+                "destinatarios, enfriamiento_s, creado, unidad) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", fila,
+            ).lastrowid
+            db.commit()
+            self._reglas = None
+        return dict(zip(_CAMPOS_REGLA, (id_regla, *fila[:8], destinatarios, *fila[9:])))
+
+    def eliminar(self, id_regla: int) -> bool:
+        with self._lock:
+            db = self._abrir_db()
+            borradas = db.execute("DELETE FROM reglas WHERE id = ?", (id_regla,)).rowcount
+            db.execute("DELETE FROM estados WHERE regla = ?", (id_regla,))
+            db.commit()
+            self._reglas = None
+            self._estados = {k: v for k, v in self._estados.items() if k[0] != id_regla}
+        return borradas > 0
+
+    def listar(self) -> list:
+        with self._lock:
+            if self._reglas is None:
+                filas = self._abrir_db().execute(f"SELECT {', '.join(_CAMPOS_REGLA)} FROM reglas ORDER BY id").fetchall()
+                self._reglas = [dict(zip(_CAMPOS_REGLA, fila), destinatarios=json.loads(fila[9])) for fila in filas]
+            return list(self._reglas)
+
+    # Evaluación
+    def _estado(self, regla: dict, estacion: str, primera) -> dict:
+        # Estado guardado o, la primera vez, cebado con la cola de la historia anterior a
+        # primera (N días como máximo) sin notificar: la racha en curso cuenta desde ya
+        clave = (regla["id"], estacion)
+        if clave not in self._estados:
+            fila = self._db.execute("SELECT ultima, estado, ultimo_envio FROM estados WHERE regla = ? AND estacion = ?",
+                                    clave).fetchone()
+            if fila:
+                self._estados[clave] = {**json.loads(fila[1]), "ultima": fila[0], "ultimo_envio": fila[2]}
+            else:
+                estado = {"ultima": None, "ultimo_envio": None}
+                cola = self.almacenes(estacion).leer(
+                    ["fecha", *self._columnas(regla)],
+                    desde=pd.Timestamp(primera) - pd.Timedelta(days=regla["consecutivos"] + 1),
+                    hasta=pd.Timestamp(primera) - pd.Timedelta(1, "ns"),
+                )
+                if len(cola):
+                    EVALUADORES[regla["tipo"]](regla, estado, cola)
+                    estado["ultima"] = int(cola["fecha"].to_numpy()[-1].astype(np.int64))
+                self._estados[clave] = estado
+        return self._estados[clave]
+
+    @staticmethod
+    def _columnas(regla: dict) -> list:
+        return [c for c in (regla["columna"], regla["columna_umbral"]) if c]
+
+    def evaluar(self, estacion: str, nuevas: pd.DataFrame) -> list:
+        # nuevas: filas recién anexadas al almacén, ordenadas por fecha. Las que no son
+        # posteriores a la última evaluada por una regla (reenvíos, reaplicación) se ignoran.
+        if len(nuevas) == 0:
+            return []
+        inicio = time.perf_counter()
+        disparadas = []
+        with self._lock:
+            db = self._abrir_db()
+            fechas_ns = nuevas["fecha"].to_numpy().astype(np.int64)
+            for regla in self.listar():
+                if regla["estacion"] not in (None, estacion) or not set(self._columnas(regla)) <= set(nuevas.columns):
+                    continue
+                estado = self._estado(regla, estacion, nuevas["fecha"].iloc[0])
+                desde = 0 if estado["ultima"] is None else int(np.searchsorted(fechas_ns, estado["ultima"], side="right"))
+                if desde == len(nuevas):
+                    continue
+                for fecha, racha in EVALUADORES[regla["tipo"]](regla, estado, nuevas.iloc[desde:]):
+                    disparadas.append(self._disparar(regla, estacion, estado, pd.Timestamp(fecha), racha))
+                estado["ultima"] = int(fechas_ns[-1])
+                variables = {k: v for k, v in estado.items() if k not in ("ultima", "ultimo_envio")}
+                db.execute("INSERT OR REPLACE INTO estados VALUES (?, ?, ?, ?, ?)",
+                           (regla["id"], estacion, estado["ultima"], json.dumps(variables), estado["ultimo_envio"]))
+            db.commit()
+        self.contadores["evaluaciones"] += 1
+        self.contadores["filas"] += len(nuevas)
+        self.contadores["segundos"] += time.perf_counter() - inicio
+        return disparadas
+
+    def _disparar(self, regla: dict, estacion: str, estado: dict, fecha: pd.Timestamp, racha: int) -> dict:
+        try:
+            nombre = registro_estaciones.obtener(estacion).get("nombre", estacion)
+        except KeyError:
+            nombre = estacion
+        if regla["tipo"] == "racha_seca":
+            mensaje = f"{nombre} ({estacion}) lleva {racha} días consecutivos sin lluvia al {fecha:%Y-%m-%d}."
+        else:
+            referencia = regla["columna_umbral"] or regla["umbral"]
+            if regla["unidad"] == "dias":
+                mensaje = (f"{nombre} ({estacion}): {regla['columna']} {regla['operador']} {referencia} en "
+                           f"{racha} días consecutivos al {fecha:%Y-%m-%d}.")
+            else:
+                mensaje = (f"{nombre} ({estacion}): {regla['columna']} {regla['operador']} {referencia} en "
+                           f"{racha} lecturas seguidas hasta {fecha:%Y-%m-%d %H:%M}.")
+        alerta = {"regla": regla["id"], "nombre": regla["nombre"], "estacion": estacion,
+                  "fecha": fecha.isoformat(), "racha": racha, "mensaje": mensaje, "id_correo": None}
+        nueva = self._db.execute(
+            "INSERT OR IGNORE INTO alertas (regla, estacion, fecha, racha, mensaje, creado) VALUES (?, ?, ?, ?, ?, ?)",
+            (regla["id"], estacion, alerta["fecha"], racha, mensaje, time.time()),
+        ).rowcount
+        if not nueva:
+            return alerta  # ya registrada (duplicado)
+        self.contadores["disparos"] += 1
+        ahora = time.time()
+        if estado["ultimo_envio"] is not None and ahora - estado["ultimo_envio"] < regla["enfriamiento_s"]:
+            # Dentro del enfriamiento: queda en el historial pero no se envía
+            self.contadores["suprimidas"] += 1
+            return alerta
+        try:
+            alerta["id_correo"] = self.bandeja.encolar(
+                regla["destinatarios"], asunto=f"Alerta de sequía - {regla['nombre']} - {nombre}", cuerpo=mensaje)
+        except Exception as e:
+            self.contadores["errores"] += 1
+            print(f"❌ Error al encolar la alerta {regla['nombre']} de {estacion}: {e}")
+            return alerta
+        estado["ultimo_envio"] = ahora
+        self._db.execute("UPDATE alertas SET id_correo = ? WHERE regla = ? AND estacion = ? AND fecha = ?",
+                         (alerta["id_correo"], regla["id"], estacion, alerta["fecha"]))
+        self.contadores["enviadas"] += 1
+        return alerta
+
+    def historial(self, estacion: str = None, limite: int = 50) -> list:
+        consulta, parametros = "SELECT a.regla, r.nombre, a.estacion, a.fecha, a.racha, a.mensaje, a.id_correo, a.creado " \
+                               "FROM alertas a LEFT JOIN reglas r ON r.id = a.regla", ()
+        if estacion:
+            consulta, parametros = consulta + " WHERE a.estacion = ?", (registro_estaciones.obtener(estacion)["codigo"],)
+        with self._lock:
+            filas = self._abrir_db().execute(consulta + " ORDER BY a.id DESC LIMIT ?", (*parametros, limite)).fetchall()
+        return [dict(zip(("regla", "nombre", "estacion", "fecha", "racha", "mensaje", "id_correo", "creado"), fila))
+                for fila in filas]
+
+    def estadisticas(self) -> dict:
+        return {**self.contadores, "reglas": len(self.listar()),
+                "us_por_fila": self.contadores["segundos"] / self.contadores["filas"] * 1e6 if self.contadores["filas"] else None}
+
+motor_alertas = MotorAlertas()
+
+# === Benchmark: python -m backend.alertas ===
+# Costo por fila nueva con 1, 10 y 30 años de historia (debe ser constante) y
+# comparación de los disparos incrementales con un recorrido completo de la serie.
+if __name__ == "__main__":
+    import tempfile
+    from backend.almacen import AlmacenColumnar, _generar_csv_sintetico
+
+    class BandejaRegistro:
+        # Sustituye a la bandeja SMTP: sólo registra lo que se encolaría
+        def __init__(self):
+            self.mensajes = []
+
+        def encolar(self, destinatarios, asunto, cuerpo, adjuntos=()):
+            self.mensajes.append((destinatarios, asunto, cuerpo))
+            return f"m{len(self.mensajes)}"
+
+    def rachas_completas(serie: pd.DataFrame, n: int) -> list:
+        # Referencia: días (con datos contiguos) en que la racha seca llega a n, recorriendo todo
+        diario = serie.set_index("fecha")["valor"].resample("D").sum(min_count=1)
+        disparos, racha = [], 0
+        for dia, suma in diario.items():
+            racha = racha + 1 if suma == 0 else 0
+            if racha == n:
+                disparos.append(dia)
+        return disparos
+
+    tmp = tempfile.mkdtemp()
+    rng = np.random.default_rng(1)
+    for anios in (1, 10, 30):
+        ruta_csv = os.path.join(tmp, f"H{anios}.csv")
+        _generar_csv_sintetico(ruta_csv, anios)
+        almacen = AlmacenColumnar(ruta_csv, os.path.join(tmp, "almacen", f"H{anios}"))
+        fin = almacen.rango()[1]
+        motor = MotorAlertas(os.path.join(tmp, f"alertas_{anios}.db"), almacenes=lambda codigo, a=almacen: a,
+                             bandeja=BandejaRegistro())
+        motor.agregar("racha 10 días", ["op@example.com"], "racha_seca", consecutivos=10, enfriamiento_s=0)
+        motor.agregar("completitud", ["op@example.com"], "condicion", columna="completo_mediciones",
+                      operador="<", columna_umbral="completo_umbral", consecutivos=3, enfriamiento_s=0)
+        motor.agregar("lectura en cero", ["op@example.com"], "condicion", columna="valor", operador="==",
+                      umbral=0, consecutivos=96, enfriamiento_s=0)
+        motor.agregar("10 días en cero", ["op@example.com"], "condicion", columna="valor", operador="==",
+                      umbral=0, consecutivos=10, enfriamiento_s=0, unidad="dias")
+        # Un año de lecturas cada 15 minutos posteriores a la historia, en lotes de 100
+        n = 96 * 365
+        fechas = pd.date_range(pd.Timestamp(fin).normalize() + pd.Timedelta(days=1), periods=n, freq="15min")
+        secos = np.repeat(rng.random(365) < 0.75, 96)  # días enteros sin lluvia
+        futuro = pd.DataFrame({"fecha": fechas, "valor": np.where(secos, 0.0, rng.gamma(0.8, 5, n).round(1) + 0.1),
+                               "completo_mediciones": rng.integers(18, 24, n), "completo_umbral": 20})
+        motor.evaluar("B01", futuro.iloc[:100])  # ceba el estado
+        inicio = time.perf_counter()
+        disparos = []
+        for desde in range(100, n, 100):
+            disparos += motor.evaluar("B01", futuro.iloc[desde:desde + 100])
+        duracion = time.perf_counter() - inicio
+        print(f"{anios:>2} años de historia ({len(almacen.leer(['fecha'])):>7,} filas): "
+              f"{duracion / (n - 100) * 1e6:5.1f} µs por fila nueva | {len(disparos)} alertas")
+
+        # Sólo lo evaluado (sin la historia ni el primer lote) para comparar con la referencia
+        esperados = [d for d in rachas_completas(pd.concat([almacen.leer(["fecha", "valor"]), futuro[["fecha", "valor"]]]), 10)
+                     if d >= futuro["fecha"].iloc[100].normalize()]
+        obtenidos = [pd.Timestamp(a["fecha"]) for a in disparos if a["nombre"] == "racha 10 días"]
+        assert obtenidos == esperados, (obtenidos[:5], esperados[:5])
+        # La misma condición contada en días (todas las lecturas del día en 0) coincide con la racha seca
+        assert [pd.Timestamp(a["fecha"]) for a in disparos if a["nombre"] == "10 días en cero"] == esperados
+
+    # Reenviar un lote ya evaluado no duplica alertas; el enfriamiento suprime el correo
+    repetidas = motor.evaluar("B01", futuro.iloc[-100:])
+    assert repetidas == [], repetidas
+    motor.agregar("con enfriamiento", ["op@example.com"], "condicion", umbral=0, consecutivos=1, enfriamiento_s=3600)
+    motor.evaluar("B01", futuro.assign(fecha=futuro["fecha"] + pd.DateOffset(years=1)).iloc[:2000])
+    print(f"✅ coincide con el recorrido completo; enfriamiento: {motor.contadores['suprimidas']} suprimidas, "
+          f"{motor.contadores['enviadas']} enviadas")
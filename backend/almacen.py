@@ -0,0 +1,476 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+
+# === Almacén columnar en disco, particionado por estación y año ===
+# Cada estación tiene su directorio y, dentro, una partición por año con un arreglo
+# NumPy por columna (.npy) de tipo explícito. Las lecturas abren con memory-map sólo
+# las particiones que intersectan el rango pedido: proyectar columnas o filtrar
+# fechas dentro de un año devuelve vistas sin copiar datos, y el costo de una
+# consulta no depende de cuántas estaciones o años haya en total.
+# Cada escritura publica una versión nueva y mueve el puntero ACTUAL; cada lectura usa
+# una sola versión. Se revalida contra el CSV (tamaño y mtime) y contra ACTUAL, que
+# también cambia cuando otro proceso anexa telemetría. anexar() agrega lecturas nuevas
+# reescribiendo sólo los años que tocan.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ALMACEN_DIR = os.getenv("ALMACEN_DIR", os.path.join(BASE_DIR, "almacen"))
+ALMACEN_RETENCION_S = float(os.getenv("ALMACEN_RETENCION_S", 30))  # vida de una versión reemplazada
+
+def _a_arreglo(serie: pd.Series) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.to_numpy(dtype="datetime64[ns]")
+    if pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_bool_dtype(serie):
+        return serie.to_numpy()
+    # Texto a ancho fijo: los arreglos de objetos no admiten memory-map
+    return serie.fillna("").astype(str).to_numpy(dtype=str)
+
+def _fecha_ns(valor) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(valor), "ns")
+
+class _Instantanea:
+    # Una versión publicada del almacén: su manifiesto y las columnas ya abiertas. Una
+    # lectura usa una sola instantánea de principio a fin, así nunca mezcla versiones.
+    def __init__(self, directorio: str, nombre: str, manifiesto: dict, puntero):
+        self.directorio = directorio  # directorio de la versión
+        self.nombre = nombre
+        self.manifiesto = manifiesto
+        self.puntero = puntero        # firma del puntero ACTUAL con que se leyó
+        self.columnas = {}            # (año, columna) -> memmap
+
+    def columna(self, anio: str, columna: str) -> np.ndarray:
+        # Cada columna de cada partición se abre una sola vez y sólo si se pide
+        clave = (anio, columna)
+        if clave not in self.columnas:
+            self.columnas[clave] = np.load(os.path.join(self.directorio, anio, f"{columna}.npy"), mmap_mode="r")
+        return self.columnas[clave]
+
+class AlmacenColumnar:
+    # Cada publicación es un directorio de versión nuevo (v<ns>_<pid>) y el archivo ACTUAL,
+    # reemplazado con os.replace, apunta a la vigente. Las versiones reemplazadas se borran
+    # pasados ALMACEN_RETENCION_S, para que una lectura en curso termine sobre la suya.
+    def __init__(self, ruta_csv, directorio: str):
+        self.ruta_csv = ruta_csv
+        self.directorio = directorio
+        self._instantanea = None
+        self._lock = threading.Lock()
+        self._lock_escritura = threading.RLock()  # anexar/ingerir: un escritor a la vez; siempre antes que _lock
+
+    def _firma_csv(self) -> dict:
+        if not self.ruta_csv:
+            return {}
+        estado = os.stat(self.ruta_csv)
+        return {"tamano": estado.st_size, "mtime_ns": estado.st_mtime_ns}
+
+    def _firma_puntero(self):
+        # os.replace crea un inodo nuevo: basta comparar inodo y mtime
+        try:
+            estado = os.stat(os.path.join(self.directorio, "ACTUAL"))
+        except OSError:
+            return None
+        return (estado.st_ino, estado.st_mtime_ns)
+
+    def _leer_actual(self):
+        # (firma del puntero, nombre de la versión, manifiesto) o (None, None, None) si no hay datos.
+        # Sin ACTUAL pero con manifiesto en la raíz es el formato anterior (sin versiones).
+        puntero = self._firma_puntero()
+        try:
+            with open(os.path.join(self.directorio, "ACTUAL"), encoding="utf-8") as f:
+                nombre = f.read().strip()
+        except OSError:
+            nombre = "."
+        try:
+            with open(os.path.join(self.directorio, nombre, "manifiesto.json"), encoding="utf-8") as f:
+                return puntero, nombre, json.load(f)
+        except (OSError, ValueError):
+            return None, None, None
+
+    def _publicar(self, temporal: str):
+        # La versión nueva queda completa en su directorio antes de cambiar el puntero
+        nombre = f"v{time.time_ns()}_{os.getpid()}"
+        os.replace(temporal, os.path.join(self.directorio, nombre))
+        puntero = os.path.join(self.directorio, f".ACTUAL_{nombre}")
+        with open(puntero, "w", encoding="utf-8") as f:
+            f.write(nombre)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(puntero, os.path.join(self.directorio, "ACTUAL"))
+        self._podar(nombre)
+
+    def _podar(self, vigente: str):
+        # Borra las versiones cuya sucesora se publicó hace más de ALMACEN_RETENCION_S
+        versiones = sorted((n for n in os.listdir(self.directorio) if n.startswith("v") and n != vigente),
+                           key=lambda n: int(n[1:].split("_")[0]))
+        sucesoras = [int(n[1:].split("_")[0]) for n in versiones[1:]] + [int(vigente[1:].split("_")[0])]
+        limite = time.time_ns() - int(ALMACEN_RETENCION_S * 1e9)
+        for nombre, reemplazo in zip(versiones, sucesoras):
+            if reemplazo < limite:
+                shutil.rmtree(os.path.join(self.directorio, nombre), ignore_errors=True)
+        # Formato anterior: particiones y manifiesto en la raíz
+        if os.path.exists(os.path.join(self.directorio, "manifiesto.json")):
+            os.remove(os.path.join(self.directorio, "manifiesto.json"))
+            for nombre in os.listdir(self.directorio):
+                if nombre.isdigit():
+                    shutil.rmtree(os.path.join(self.directorio, nombre), ignore_errors=True)
+
+    def _temporal(self) -> str:
+        os.makedirs(self.directorio, exist_ok=True)
+        return tempfile.mkdtemp(prefix=".tmp_", dir=self.directorio)
+
+    def _escribir_particion(self, temporal: str, anio: str, arreglos: dict) -> dict:
+        os.makedirs(os.path.join(temporal, anio))
+        for columna, arreglo in arreglos.items():
+            np.save(os.path.join(temporal, anio, f"{columna}.npy"), arreglo)
+        fechas = arreglos["fecha"]
+        return {"filas": int(len(fechas)), "desde": str(fechas[0]), "hasta": str(fechas[-1])}
+
+    def _cerrar(self, temporal: str, particiones: dict, columnas: dict, firma=None):
+        manifiesto = {
+            **(firma or {}),
+            "filas": sum(p["filas"] for p in particiones.values()),
+            "columnas": columnas,
+            "particiones": particiones,
+        }
+        with open(os.path.join(temporal, "manifiesto.json"), "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, ensure_ascii=False)
+        self._publicar(temporal)
+
+    def escribir(self, df: pd.DataFrame, firma=None):
+        df = df.sort_values(by="fecha", kind="stable")
+        arreglos = {columna: _a_arreglo(df[columna]) for columna in df.columns}
+        anios = df["fecha"].dt.year.to_numpy()
+        # Los datos están ordenados: los cortes entre años son los cambios en el arreglo de años
+        cortes = np.concatenate(([0], np.flatnonzero(np.diff(anios)) + 1, [len(anios)]))
+
+        temporal = self._temporal()
+        try:
+            particiones = {}
+            for inicio, fin in zip(cortes[:-1], cortes[1:]):
+                if inicio == fin:
+                    continue
+                anio = str(anios[inicio])
+                particiones[anio] = self._escribir_particion(
+                    temporal, anio, {columna: arreglo[inicio:fin] for columna, arreglo in arreglos.items()}
+                )
+            self._cerrar(temporal, particiones, {columna: arreglo.dtype.str for columna, arreglo in arreglos.items()}, firma)
+        except BaseException:
+            shutil.rmtree(temporal, ignore_errors=True)
+            raise
+
+    def escribir_bloques(self, bloques, firma=None):
+        # Escritura en streaming: cada bloque se reparte por año en archivos intermedios y al
+        # final cada año se ordena y se guarda por separado. La memoria queda acotada por el
+        # tamaño de un bloque más el de un año, sin importar el total de filas.
+        temporal = self._temporal()
+        intermedio = os.path.join(temporal, ".bloques")
+        columnas, trozos = None, {}  # trozos: año -> número de trozos escritos
+        try:
+            for bloque in bloques:
+                if len(bloque) == 0:
+                    continue
+                arreglos = {columna: _a_arreglo(bloque[columna]) for columna in bloque.columns}
+                if columnas is None:
+                    columnas = {columna: arreglo.dtype.str for columna, arreglo in arreglos.items()}
+                anios = bloque["fecha"].dt.year.to_numpy()
+                for anio in np.unique(anios):
+                    seleccion = anios == anio
+                    destino = os.path.join(intermedio, str(anio), str(trozos.get(str(anio), 0)))
+                    os.makedirs(destino)
+                    for columna, arreglo in arreglos.items():
+                        np.save(os.path.join(destino, f"{columna}.npy"), arreglo[seleccion])
+                    trozos[str(anio)] = trozos.get(str(anio), 0) + 1
+
+            particiones = {}
+            for anio in sorted(trozos):
+                partes = [os.path.join(intermedio, anio, str(i)) for i in range(trozos[anio])]
+                arreglos = {
+                    columna: np.concatenate([np.load(os.path.join(parte, f"{columna}.npy")) for parte in partes])
+                    for columna in columnas
+                }
+                orden = np.argsort(arreglos["fecha"], kind="stable")
+                particiones[anio] = self._escribir_particion(
+                    temporal, anio, {columna: arreglo[orden] for columna, arreglo in arreglos.items()}
+                )
+                shutil.rmtree(os.path.join(intermedio, anio))
+            shutil.rmtree(intermedio, ignore_errors=True)
+            self._cerrar(temporal, particiones, columnas or {}, firma)
+        except BaseException:
+            shutil.rmtree(temporal, ignore_errors=True)
+            raise
+
+    def ingerir(self):
+        # Bajo el lock de escritura: un anexar() concurrente publicaría filas que esta
+        # reconstrucción (hecha desde `previo`) perdería al publicar después
+        with self._lock_escritura:
+            firma = self._firma_csv()
+            df = pd.read_csv(self.ruta_csv, parse_dates=["fecha"])
+            _, nombre, previo = self._leer_actual()
+            if previo and previo.get("anexos") and len(df):
+                # Las lecturas anexadas en vivo posteriores al CSV se conservan al reconstruir
+                vivas = self._leer_crudo(os.path.join(self.directorio, nombre), previo,
+                                         posteriores_a=_fecha_ns(df["fecha"].max()))
+                if len(vivas):
+                    df = pd.concat([df, vivas[df.columns]], ignore_index=True)
+                    firma = {**firma, "anexos": previo["anexos"]}
+            self.escribir(df, firma)
+
+    def _leer_crudo(self, directorio: str, manifiesto: dict, posteriores_a) -> pd.DataFrame:
+        # Lectura directa de particiones de una versión, sólo filas con fecha > posteriores_a
+        partes = []
+        for anio, info in sorted(manifiesto["particiones"].items()):
+            if np.datetime64(info["hasta"], "ns") <= posteriores_a:
+                continue
+            arreglos = {c: np.load(os.path.join(directorio, anio, f"{c}.npy")) for c in manifiesto["columnas"]}
+            inicio = int(np.searchsorted(arreglos["fecha"], posteriores_a, side="right"))
+            partes.append(pd.DataFrame({c: a[inicio:] for c, a in arreglos.items()}))
+        return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+    def anexar(self, df: pd.DataFrame) -> tuple:
+        # Anexa filas reescribiendo sólo las particiones de los años afectados; el resto se
+        # enlaza (hard link) desde la versión vigente. Una fecha ya existente se reemplaza por
+        # la nueva lectura. Devuelve (filas realmente nuevas, reemplazadas) y publica una
+        # versión nueva como escribir(); el manifiesto conserva la firma del CSV.
+        with self._lock_escritura:
+            vigente = self._vigente()
+            manifiesto = vigente.manifiesto
+            columnas = manifiesto["columnas"]
+            df = df.sort_values(by="fecha", kind="stable").drop_duplicates("fecha", keep="last")
+            anios = df["fecha"].dt.year.to_numpy()
+            temporal = self._temporal()
+            try:
+                particiones, nuevas, reemplazadas = {}, [], 0
+                for anio in sorted(set(manifiesto["particiones"]) | {str(a) for a in np.unique(anios)}):
+                    seleccion = anios == int(anio)
+                    if not seleccion.any():
+                        # Año sin cambios: enlace a los mismos archivos
+                        os.makedirs(os.path.join(temporal, anio))
+                        for columna in columnas:
+                            origen = os.path.join(vigente.directorio, anio, f"{columna}.npy")
+                            try:
+                                os.link(origen, os.path.join(temporal, anio, f"{columna}.npy"))
+                            except OSError:
+                                shutil.copy2(origen, os.path.join(temporal, anio, f"{columna}.npy"))
+                        particiones[anio] = manifiesto["particiones"][anio]
+                        continue
+                    agregado = {c: df[c].to_numpy(dtype=np.dtype(t))[seleccion] for c, t in columnas.items()}
+                    if anio in manifiesto["particiones"]:
+                        existentes = {c: np.load(os.path.join(vigente.directorio, anio, f"{c}.npy")) for c in columnas}
+                        nuevas_anio = ~np.isin(agregado["fecha"], existentes["fecha"])
+                        conservar = ~np.isin(existentes["fecha"], agregado["fecha"])
+                        reemplazadas += int((~nuevas_anio).sum())
+                        combinado = {c: np.concatenate([existentes[c][conservar], agregado[c]]) for c in columnas}
+                    else:
+                        nuevas_anio = np.ones(len(agregado["fecha"]), dtype=bool)
+                        combinado = agregado
+                    nuevas.append(df[seleccion][nuevas_anio])
+                    orden = np.argsort(combinado["fecha"], kind="stable")
+                    particiones[anio] = self._escribir_particion(temporal, anio, {c: a[orden] for c, a in combinado.items()})
+                firma = {k: manifiesto[k] for k in ("tamano", "mtime_ns") if k in manifiesto}
+                firma["anexos"] = manifiesto.get("anexos", 0) + 1
+                self._cerrar(temporal, particiones, columnas, firma)
+            except BaseException:
+                shutil.rmtree(temporal, ignore_errors=True)
+                raise
+        return pd.concat(nuevas, ignore_index=True) if nuevas else df.iloc[:0], reemplazadas
+
+    def _vigente(self) -> _Instantanea:
+        # Revalida contra la firma del CSV y contra el puntero ACTUAL: otro proceso (el de la
+        # API compactando telemetría) puede haber publicado una versión nueva
+        firma = self._firma_csv()
+        puntero = self._firma_puntero()
+        instantanea = self._instantanea
+        if (instantanea and instantanea.puntero == puntero
+                and all(instantanea.manifiesto.get(k) == v for k, v in firma.items())):
+            return instantanea
+        with self._lock:
+            puntero, nombre, manifiesto = self._leer_actual()
+            reconstruir = self.ruta_csv and (not manifiesto or any(manifiesto.get(k) != v for k, v in firma.items()))
+            if not reconstruir:
+                return self._fijar(puntero, nombre, manifiesto)
+        # Reconstrucción con el mismo orden de locks que anexar() (escritura, luego _lock)
+        with self._lock_escritura, self._lock:
+            puntero, nombre, manifiesto = self._leer_actual()
+            if not manifiesto or any(manifiesto.get(k) != v for k, v in self._firma_csv().items()):
+                self.ingerir()
+                puntero, nombre, manifiesto = self._leer_actual()
+            return self._fijar(puntero, nombre, manifiesto)
+
+    def _fijar(self, puntero, nombre: str, manifiesto) -> _Instantanea:
+        # Llamar con self._lock tomado
+        if manifiesto is None:
+            raise FileNotFoundError(f"No hay datos en el almacén {self.directorio}")
+        if not (self._instantanea and self._instantanea.nombre == nombre and self._instantanea.puntero == puntero):
+            self._instantanea = _Instantanea(os.path.join(self.directorio, nombre), nombre, manifiesto, puntero)
+        return self._instantanea
+
+    def columnas(self) -> list:
+        return list(self._vigente().manifiesto["columnas"])
+
+    def version(self) -> str:
+        instantanea = self._vigente()
+        manifiesto = instantanea.manifiesto
+        return (f"{manifiesto.get('tamano')}-{manifiesto.get('mtime_ns')}-{manifiesto['filas']}-"
+                f"{manifiesto.get('anexos', 0)}-{instantanea.nombre}")
+
+    def rango(self) -> tuple:
+        particiones = self._vigente().manifiesto["particiones"]
+        if not particiones:
+            return None, None
+        anios = sorted(particiones)
+        return pd.Timestamp(particiones[anios[0]]["desde"]), pd.Timestamp(particiones[anios[-1]]["hasta"])
+
+    def anios(self) -> list:
+        return sorted(self._vigente().manifiesto["particiones"])
+
+    def leer_arreglos(self, columnas=None, desde=None, hasta=None) -> dict:
+        # Sólo se abren las particiones anuales que intersectan [desde, hasta]. Dentro de
+        # una partición el recorte es una vista; con varias particiones se concatenan.
+        try:
+            return self._leer_instantanea(self._vigente(), columnas, desde, hasta)
+        except FileNotFoundError:
+            # La versión se podó a mitad de la lectura (más de ALMACEN_RETENCION_S): otra vez con la vigente
+            self._instantanea = None
+            return self._leer_instantanea(self._vigente(), columnas, desde, hasta)
+
+    def _leer_instantanea(self, instantanea: _Instantanea, columnas, desde, hasta) -> dict:
+        manifiesto = instantanea.manifiesto
+        columnas = columnas or list(manifiesto["columnas"])
+        desde = _fecha_ns(desde) if desde is not None else None
+        hasta = _fecha_ns(hasta) if hasta is not None else None
+
+        trozos = {columna: [] for columna in columnas}
+        for anio, info in sorted(manifiesto["particiones"].items()):
+            if desde is not None and np.datetime64(info["hasta"], "ns") < desde:
+                continue
+            if hasta is not None and np.datetime64(info["desde"], "ns") > hasta:
+                continue
+            inicio, fin = 0, info["filas"]
+            if desde is not None or hasta is not None:
+                fechas = instantanea.columna(anio, "fecha")
+                if desde is not None:
+                    inicio = int(np.searchsorted(fechas, desde, side="left"))
+                if hasta is not None:
+                    fin = int(np.searchsorted(fechas, hasta, side="right"))
+            for columna in columnas:
+                trozos[columna].append(instantanea.columna(anio, columna)[inicio:fin])
+
+        resultado = {}
+        for columna in columnas:
+            if len(trozos[columna]) == 1:
+                resultado[columna] = trozos[columna][0]
+            elif trozos[columna]:
+                resultado[columna] = np.concatenate(trozos[columna])
+            else:
+                resultado[columna] = np.empty(0, dtype=np.dtype(manifiesto["columnas"][columna]))
+        return resultado
+
+    def leer(self, columnas=None, desde=None, hasta=None) -> pd.DataFrame:
+        arreglos = self.leer_arreglos(columnas, desde, hasta)
+        return pd.DataFrame(arreglos, copy=False)
+
+_almacenes = {}
+_lock_almacenes = threading.Lock()
+
+def almacen_para(ruta_csv: str, nombre: str = None) -> AlmacenColumnar:
+    ruta_csv = os.path.abspath(ruta_csv)
+    with _lock_almacenes:
+        if ruta_csv not in _almacenes:
+            if nombre is None:
+                base = os.path.splitext(os.path.basename(ruta_csv))[0]
+                nombre = f"{base}_{hashlib.sha1(ruta_csv.encode('utf-8')).hexdigest()[:8]}"
+            _almacenes[ruta_csv] = AlmacenColumnar(ruta_csv, os.path.join(ALMACEN_DIR, nombre))
+        return _almacenes[ruta_csv]
+
+def almacen_estacion(codigo: str = None) -> AlmacenColumnar:
+    from backend.estaciones import registro_estaciones
+    estacion = registro_estaciones.obtener(codigo)
+    return almacen_para(estacion["ruta_csv"], nombre=estacion["codigo"])
+
+def consultar(estacion: str = None, columnas=None, desde=None, hasta=None) -> pd.DataFrame:
+    return almacen_estacion(estacion).leer(columnas, desde, hasta)
+
+# === Benchmark: pd.read_csv vs almacén columnar, y latencia al crecer el número de estaciones ===
+def _generar_csv_sintetico(ruta, anios, semilla=0):
+    fechas = pd.date_range("1970-01-01", periods=anios * 365, freq="D")
+    rng = np.random.default_rng(semilla)
+    n = len(fechas)
+    pd.DataFrame({
+        "fecha": fechas.strftime("%Y-%m-%d"),
+        "valor": np.where(rng.random(n) < 0.4, 0, rng.gamma(0.8, 5, n)).round(1),
+        "completo_mediciones": rng.integers(18, 25, n),
+        "completo_umbral": 22,
+    }).to_csv(ruta, index=False)
+
+def _pico_rss_mb() -> float:
+    # VmHWM es propio del proceso; ru_maxrss en Linux se hereda del padre a través de exec
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmHWM:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _medir(modo, rutas_csv, directorio, cola):
+    base_mb = _pico_rss_mb()
+    inicio = time.perf_counter()
+    if modo == "csv":
+        total = sum(pd.read_csv(ruta, parse_dates=["fecha"])["valor"].sum() for ruta in rutas_csv)
+    elif modo == "almacen":
+        total = sum(
+            AlmacenColumnar(ruta, os.path.join(directorio, str(i))).leer()["valor"].sum()
+            for i, ruta in enumerate(rutas_csv)
+        )
+    else:
+        total = sum(
+            AlmacenColumnar(ruta, os.path.join(directorio, str(i)))
+            .leer_arreglos(["fecha", "valor"], desde="2000-01-01", hasta="2004-12-31")["valor"].sum()
+            for i, ruta in enumerate(rutas_csv)
+        )
+    duracion = time.perf_counter() - inicio
+    cola.put((modo, duracion, _pico_rss_mb() - base_mb, total))
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    estaciones = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    anios = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        directorio = os.path.join(tmp, "almacen")
+        rutas = []
+        for i in range(estaciones):
+            rutas.append(os.path.join(tmp, f"M{i:04d}.csv"))
+            _generar_csv_sintetico(rutas[-1], anios, semilla=i)
+            AlmacenColumnar(rutas[-1], os.path.join(directorio, str(i))).ingerir()
+        print(f"{estaciones} estaciones x {anios} años")
+
+        contexto = multiprocessing.get_context("spawn")
+        cola = contexto.Queue()
+        for modo in ("csv", "almacen", "rango"):
+            # Cada medición en un proceso nuevo para que el pico de RSS sea comparable
+            proceso = contexto.Process(target=_medir, args=(modo, rutas, directorio, cola))
+            proceso.start()
+            modo, duracion, pico_mb, _ = cola.get()
+            proceso.join()
+            print(f"{modo:>8} (en frío): {duracion * 1000:8.1f} ms | pico RSS +{pico_mb:7.1f} MB")
+
+        # Latencia de una consulta de un año sobre una estación a medida que crece el registro
+        almacenes = [AlmacenColumnar(ruta, os.path.join(directorio, str(i))) for i, ruta in enumerate(rutas)]
+        for cantidad in sorted({1, estaciones // 4 or 1, estaciones // 2 or 1, estaciones}):
+            activos = almacenes[:cantidad]
+            for almacen in activos:
+                almacen.leer_arreglos(["valor"], desde="2001-01-01", hasta="2001-12-31")
+            inicio = time.perf_counter()
+            for almacen in activos * (1000 // cantidad + 1):
+                almacen.leer_arreglos(["valor"], desde="2001-01-01", hasta="2001-12-31")
+            por_consulta = (time.perf_counter() - inicio) / (len(activos) * (1000 // cantidad + 1))
+            print(f"consulta 1 año con {cantidad:4d} estaciones registradas: {por_consulta * 1e6:7.1f} µs")
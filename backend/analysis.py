@@ -1,14 +1,22 @@
+import numpy as np
 import pandas as pd
+from backend.almacen import almacen_para, consultar
 
-def cargar_datos(ruta_csv: str) -> pd.DataFrame:
-    df = pd.read_csv(ruta_csv, parse_dates=["fecha"])
-    df.sort_values(by="fecha", inplace=True)
-    return df
+def cargar_datos(ruta_csv: str, columnas=None, desde=None, hasta=None) -> pd.DataFrame:
+    # El almacén columnar ingiere el CSV una vez (ya ordenado por fecha) y lo revalida por mtime
+    return almacen_para(ruta_csv).leer(columnas, desde, hasta)
+
+def cargar_estacion(estacion: str = None, desde=None, hasta=None, columnas=None) -> pd.DataFrame:
+    # Sólo se leen las particiones anuales de la estación que cubren el rango pedido
+    return consultar(estacion, columnas, desde, hasta)
 
 def calcular_indicadores(df: pd.DataFrame) -> dict:
-    dias_sin_agua = df[df["valor"] == 0].shape[0]
-    total_dias = df.shape[0]
-    fiabilidad = (df["completo_mediciones"] >= df["completo_umbral"]).sum() / total_dias
+    # Las lecturas se agrupan por fecha: con telemetría hay varias por día. Un día es
+    # sin agua si todas sus lecturas son 0 y es completo si alguna cumple el umbral.
+    dia = df["fecha"].dt.normalize()
+    dias_sin_agua = int((~(df["valor"] != 0).groupby(dia).any()).sum())
+    total_dias = int(dia.nunique())
+    fiabilidad = (df["completo_mediciones"] >= df["completo_umbral"]).groupby(dia).any().sum() / total_dias
 
     return {
         "total_dias": total_dias,
@@ -16,3 +24,346 @@ def calcular_indicadores(df: pd.DataFrame) -> dict:
         "porcentaje_sin_agua": dias_sin_agua / total_dias * 100,
         "fiabilidad": round(fiabilidad * 100, 2)
     }
+
+def indicadores_estacion(estacion: str = None, desde=None, hasta=None) -> dict:
+    # Se responde con los agregados del motor incremental, sin recorrer la historia
+    from backend.indicadores import motor_indicadores
+    return motor_indicadores.resumen(estacion, desde, hasta)
+
+# === Índices de sequía vectorizados ===
+# Trabajan sobre lecturas diarias (fecha, valor) de una o varias estaciones: si el
+# DataFrame trae la columna "estacion", cada estación se calcula por separado pero
+# en la misma pasada. Las series mensuales se organizan en una matriz meses x
+# estaciones y todo se resuelve con operaciones de arreglo (sumas acumuladas,
+# groupby por mes del calendario), sin recorrer filas en Python.
+
+ESCALAS_SPI = (1, 3, 6, 12)
+UMBRAL_DIA_SECO = 0.0  # Un día es seco si valor <= umbral (como "valor == 0" en calcular_indicadores)
+MIN_MESES_AJUSTE = 3   # Meses con lluvia necesarios para ajustar la gamma de un mes del calendario
+
+def cargar_estaciones(estaciones=None, desde=None, hasta=None, columnas=("fecha", "valor")) -> pd.DataFrame:
+    # Lecturas de varias estaciones en formato largo, agrupadas por estación. "estacion"
+    # es categórica para que los índices no tengan que factorizar texto en cada llamada.
+    from backend.estaciones import registro_estaciones
+    if estaciones is None:
+        estaciones = [e["codigo"] for e in registro_estaciones.listar()]
+    estaciones = list(dict.fromkeys(estaciones))
+    partes = [cargar_estacion(codigo, desde, hasta, list(columnas)) for codigo in estaciones]
+    if not partes:
+        return pd.DataFrame(columns=["estacion", *columnas])
+    df = pd.concat(partes, ignore_index=True)
+    codigos = np.repeat(np.arange(len(partes)), [len(parte) for parte in partes])
+    df.insert(0, "estacion", pd.Categorical.from_codes(codigos, categories=estaciones))
+    return df
+
+def _codigos_estacion(df: pd.DataFrame):
+    # Código entero por fila y etiquetas de estación (una sola "" si no hay columna "estacion")
+    if "estacion" not in df.columns:
+        return np.zeros(len(df), dtype=np.intp), pd.Index([""], name="estacion")
+    codigos, etiquetas = pd.factorize(df["estacion"], sort=True)
+    return codigos, pd.Index(np.asarray(etiquetas), name="estacion")
+
+def _matriz_mensual(df: pd.DataFrame) -> pd.DataFrame:
+    # Precipitación total por mes: filas = meses consecutivos, columnas = estaciones
+    codigos, etiquetas = _codigos_estacion(df)
+    if len(df) == 0:
+        # Sin lecturas: cero meses, pero con el mismo tipo de índice (PeriodIndex mensual)
+        return pd.DataFrame(index=pd.PeriodIndex([], freq="M", name="mes"), columns=etiquetas, dtype=float)
+    meses = df["fecha"].to_numpy(dtype="datetime64[ns]").astype("datetime64[M]").astype(np.int64)
+    primero = meses.min()
+    n_meses = meses.max() - primero + 1
+    celdas = (meses - primero) * len(etiquetas) + codigos
+    valores = df["valor"].to_numpy(dtype=float)
+    medidos = ~np.isnan(valores)
+    tamano = n_meses * len(etiquetas)
+    suma = np.bincount(celdas[medidos], weights=valores[medidos], minlength=tamano)
+    conteo = np.bincount(celdas[medidos], minlength=tamano)
+    matriz = np.where(conteo > 0, suma, np.nan).reshape(n_meses, len(etiquetas))
+    indice = pd.period_range(pd.Period(ordinal=int(primero), freq="M"), periods=n_meses, name="mes")
+    return pd.DataFrame(matriz, index=indice, columns=etiquetas)
+
+def _suma_movil(matriz: np.ndarray, k: int) -> np.ndarray:
+    # Suma de ventanas de k meses por columna; la ventana es NaN si le falta algún mes
+    ceros = np.zeros((1, matriz.shape[1]))
+    acumulada = np.concatenate((ceros, np.nancumsum(matriz, axis=0)))
+    validos = np.concatenate((ceros, np.cumsum(~np.isnan(matriz), axis=0)))
+    resultado = np.full(matriz.shape, np.nan)
+    if k <= matriz.shape[0]:
+        suma = acumulada[k:] - acumulada[:-k]
+        resultado[k - 1:] = np.where(validos[k:] - validos[:-k] == k, np.maximum(suma, 0), np.nan)
+    return resultado
+
+def _por_mes_calendario(valores: np.ndarray, meses: np.ndarray) -> np.ndarray:
+    # Suma por mes del calendario (12 x estaciones), devuelta alineada con las filas
+    sumas = np.zeros((12, valores.shape[1]))
+    np.add.at(sumas, meses - 1, valores)
+    return sumas[meses - 1]
+
+def _lgamma(a: np.ndarray) -> np.ndarray:
+    # Aproximación de Lanczos (g = 7); para a < 0.5 se usa lgamma(a) = lgamma(a + 1) - ln(a)
+    coef = np.array([
+        0.99999999999980993, 676.5203681218851, -1259.1392167224028, 771.32342877765313,
+        -176.61502916214059, 12.507343278686905, -0.13857109526572012,
+        9.9843695780195716e-6, 1.5056327351493116e-7,
+    ])
+    pequeno = a < 0.5
+    z = np.where(pequeno, a + 1, a) - 1
+    serie = coef[0] + np.sum(coef[1:] / (z[..., None] + np.arange(1, 9)), axis=-1)
+    t = z + 7.5
+    resultado = 0.5 * np.log(2 * np.pi) + (z + 0.5) * np.log(t) - t + np.log(serie)
+    return np.where(pequeno, resultado - np.log(a), resultado)
+
+def _gamma_inc(a: np.ndarray, x: np.ndarray, iteraciones: int = 200, eps: float = 1e-12) -> np.ndarray:
+    # Función gamma incompleta regularizada P(a, x): serie para x < a + 1 y fracción
+    # continua (Lentz) en el resto. Cada rama itera sobre términos, no sobre elementos,
+    # y sólo con los elementos que le corresponden.
+    a, x = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(x, dtype=float))
+    resultado = np.where(x <= 0, 0.0, np.nan)
+    validos = (a > 0) & (x > 0) & np.isfinite(a) & np.isfinite(x)
+    por_serie = validos & (x < a + 1)
+    por_fraccion = validos & ~por_serie
+
+    a_s, x_s = a[por_serie], x[por_serie]
+    termino = 1.0 / a_s
+    suma = termino.copy()
+    for n in range(1, iteraciones):
+        termino = termino * x_s / (a_s + n)
+        suma += termino
+        if np.all(np.abs(termino) < np.abs(suma) * eps):
+            break
+    resultado[por_serie] = suma * np.exp(a_s * np.log(x_s) - x_s - _lgamma(a_s))
+
+    diminuto = 1e-300
+    a_f, x_f = a[por_fraccion], x[por_fraccion]
+    b = x_f + 1 - a_f
+    c = np.full(b.shape, 1 / diminuto)
+    d = 1 / np.where(np.abs(b) < diminuto, diminuto, b)
+    h = d.copy()
+    for i in range(1, iteraciones):
+        an = -i * (i - a_f)
+        b = b + 2
+        d = an * d + b
+        d = 1 / np.where(np.abs(d) < diminuto, diminuto, d)
+        c = b + an / c
+        c = np.where(np.abs(c) < diminuto, diminuto, c)
+        delta = d * c
+        h *= delta
+        if np.all(np.abs(delta - 1) < eps):
+            break
+    resultado[por_fraccion] = 1 - h * np.exp(a_f * np.log(x_f) - x_f - _lgamma(a_f))
+    return np.clip(resultado, 0.0, 1.0)
+
+def _normal_inversa(p: np.ndarray) -> np.ndarray:
+    # Cuantil de la normal estándar (aproximación racional de Acklam, error relativo < 1.2e-9)
+    a = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+         1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00]
+    b = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+         6.680131188771972e+01, -1.328068155288572e+01]
+    c = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+         -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00]
+    d = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00]
+
+    p = np.asarray(p, dtype=float)
+    q = np.minimum(p, 1 - p)
+    cola = q < 0.02425
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = np.sqrt(-2 * np.log(q))
+        extremo = (((((c[0] * r + c[1]) * r + c[2]) * r + c[3]) * r + c[4]) * r + c[5]) / \
+                  ((((d[0] * r + d[1]) * r + d[2]) * r + d[3]) * r + 1)
+        extremo = np.where(p < 0.5, extremo, -extremo)
+        u = p - 0.5
+        s = u * u
+        central = (((((a[0] * s + a[1]) * s + a[2]) * s + a[3]) * s + a[4]) * s + a[5]) * u / \
+                  (((((b[0] * s + b[1]) * s + b[2]) * s + b[3]) * s + b[4]) * s + 1)
+    return np.where(cola, extremo, central)
+
+def _spi_matriz(suma: np.ndarray, meses: np.ndarray) -> np.ndarray:
+    # Ajuste gamma por (mes del calendario, estación) con la aproximación de máxima
+    # verosimilitud de Thom y probabilidad de cero: H(x) = q + (1 - q) G(x).
+    validos = ~np.isnan(suma)
+    positivos = validos & (suma > 0)
+    n = _por_mes_calendario(validos.astype(float), meses)
+    n_pos = _por_mes_calendario(positivos.astype(float), meses)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        media = _por_mes_calendario(np.where(positivos, suma, 0), meses) / n_pos
+        media_log = _por_mes_calendario(np.where(positivos, np.log(np.where(positivos, suma, 1)), 0), meses) / n_pos
+        A = np.log(media) - media_log
+        alfa = (1 + np.sqrt(1 + 4 * A / 3)) / (4 * A)
+        beta = media / alfa
+        q = (n - n_pos) / n
+
+    ajustable = (n_pos >= MIN_MESES_AJUSTE) & (A > 0) & np.isfinite(alfa)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        G = _gamma_inc(np.where(ajustable, alfa, 1.0), np.where(validos & ajustable, suma / beta, 0.0))
+    H = np.clip(q + (1 - q) * G, 1e-10, 1 - 1e-10)
+    return np.where(validos & ajustable, _normal_inversa(H), np.nan)
+
+def _a_largo(matrices: dict, mensual: pd.DataFrame) -> pd.DataFrame:
+    # {columna: matriz meses x estaciones} -> DataFrame indexado por (estacion, mes) o sólo por mes
+    if list(mensual.columns) == [""]:
+        return pd.DataFrame({nombre: m[:, 0] for nombre, m in matrices.items()}, index=mensual.index)
+    indice = pd.MultiIndex.from_product([mensual.columns, mensual.index], names=["estacion", "mes"])
+    return pd.DataFrame({nombre: m.T.ravel() for nombre, m in matrices.items()}, index=indice)
+
+def spi(df: pd.DataFrame, escalas=ESCALAS_SPI) -> pd.DataFrame:
+    # Índice Estandarizado de Precipitación (McKee et al., 1993) a escalas de k meses.
+    # La distribución se calibra con todo el período recibido.
+    mensual = _matriz_mensual(df)
+    if mensual.empty:
+        return _a_largo({f"spi_{k}": np.empty((0, len(mensual.columns))) for k in escalas}, mensual)
+    matriz = mensual.to_numpy(dtype=float)
+    meses = mensual.index.month.to_numpy()
+    return _a_largo({f"spi_{k}": _spi_matriz(_suma_movil(matriz, k), meses) for k in escalas}, mensual)
+
+def deficit_precipitacion(df: pd.DataFrame, escalas=ESCALAS_SPI) -> pd.DataFrame:
+    # Déficit móvil (mm) respecto a la normal del mismo mes del calendario: normal - observado.
+    # Positivo = llovió menos de lo normal en los últimos k meses.
+    mensual = _matriz_mensual(df)
+    if mensual.empty:
+        return _a_largo({f"deficit_{k}": np.empty((0, len(mensual.columns))) for k in escalas}, mensual)
+    matriz = mensual.to_numpy(dtype=float)
+    meses = mensual.index.month.to_numpy()
+    matrices = {}
+    for k in escalas:
+        suma = _suma_movil(matriz, k)
+        validos = ~np.isnan(suma)
+        with np.errstate(invalid="ignore"):
+            normal = _por_mes_calendario(np.where(validos, suma, 0), meses) / _por_mes_calendario(validos.astype(float), meses)
+        matrices[f"deficit_{k}"] = normal - suma
+    return _a_largo(matrices, mensual)
+
+def rachas_secas(df: pd.DataFrame, umbral: float = UMBRAL_DIA_SECO):
+    # Racha seca más larga en días (y su último día) y racha en curso al final del registro.
+    # Las lecturas se agrupan por fecha como en calcular_indicadores: un día es seco si todas
+    # sus lecturas son <= umbral, y una fecha sin lecturas corta la racha.
+    # Devuelve un DataFrame por estación, o una Serie si no hay columna "estacion".
+    codigos, etiquetas = _codigos_estacion(df)
+    fechas = df["fecha"].to_numpy(dtype="datetime64[ns]")
+    valores = df["valor"].to_numpy(dtype=float)
+    # Las lecturas del almacén ya vienen agrupadas y ordenadas: sólo se ordena si hace falta
+    if len(df) > 1 and not np.all((codigos[1:] > codigos[:-1]) | ((codigos[1:] == codigos[:-1]) & (fechas[1:] >= fechas[:-1]))):
+        orden = np.lexsort((fechas, codigos))
+        codigos, fechas, valores = codigos[orden], fechas[orden], valores[orden]
+
+    if len(codigos) == 0:
+        vacio = pd.DataFrame({"racha_seca_max": [], "fin_racha_seca_max": [], "racha_seca_actual": []}, index=etiquetas[:0])
+        return vacio if "estacion" in df.columns else pd.Series({c: None for c in vacio.columns}, dtype=object)
+    # Un elemento por (estación, fecha): seco si ninguna lectura del día supera el umbral
+    dias = fechas.astype("datetime64[D]").astype(np.int64)
+    nuevo_dia = np.ones(len(dias), dtype=bool)
+    nuevo_dia[1:] = (codigos[1:] != codigos[:-1]) | (dias[1:] != dias[:-1])
+    primeras = np.flatnonzero(nuevo_dia)
+    seco = np.minimum.reduceat((valores <= umbral).astype(np.int8), primeras).astype(bool)
+    codigos, dias = codigos[primeras], dias[primeras]
+
+    n = len(codigos)
+    inicio = np.ones(n, dtype=bool)
+    inicio[1:] = codigos[1:] != codigos[:-1]
+    bloques = np.flatnonzero(inicio)
+    fines = np.append(bloques[1:], n) - 1
+    # La racha vuelve a empezar al inicio de cada estación y después de un hueco de fechas
+    reinicio = inicio.copy()
+    reinicio[1:] |= dias[1:] - dias[:-1] > 1
+
+    # La longitud de la racha en i es la distancia al último día no seco (o al último reinicio)
+    posiciones = np.arange(n)
+    corte = np.where(~seco, posiciones, np.where(reinicio, posiciones - 1, -1))
+    longitud = posiciones - np.maximum.accumulate(corte)
+
+    maximo = np.maximum.reduceat(longitud, bloques)
+    # Primer día de cada estación en el que se alcanza su máximo
+    bloque = np.cumsum(inicio) - 1
+    candidatos = np.flatnonzero(longitud == maximo[bloque])
+    _, primeros = np.unique(bloque[candidatos], return_index=True)
+    fin_maximo = dias[candidatos[primeros]].astype("datetime64[D]").astype("datetime64[ns]")
+
+    rachas = pd.DataFrame({
+        "racha_seca_max": maximo,
+        "fin_racha_seca_max": pd.Series(fin_maximo).where(maximo > 0).to_numpy(),
+        "racha_seca_actual": longitud[fines],
+    }, index=etiquetas[codigos[bloques]])
+    return rachas if "estacion" in df.columns else rachas.iloc[0].rename(None)
+
+def _ultimo_valido(serie: pd.Series):
+    serie = serie.dropna()
+    return round(float(serie.iloc[-1]), 2) if len(serie) else None
+
+def indices_sequia(estaciones=None, desde=None, hasta=None, escalas=ESCALAS_SPI) -> dict:
+    # Resumen por estación con los últimos valores de SPI y déficit y las rachas secas
+    df = cargar_estaciones(estaciones, desde, hasta)
+    if df.empty:
+        return {}
+    indices = spi(df, escalas).join(deficit_precipitacion(df, escalas))
+    rachas = rachas_secas(df)
+    resultado = {}
+    for codigo, filas in indices.groupby(level="estacion", sort=False):
+        fin_max = rachas.at[codigo, "fin_racha_seca_max"]
+        resultado[codigo] = {
+            "mes": str(filas.index.get_level_values("mes")[-1]),
+            "spi": {str(k): _ultimo_valido(filas[f"spi_{k}"]) for k in escalas},
+            "deficit_mm": {str(k): _ultimo_valido(filas[f"deficit_{k}"]) for k in escalas},
+            "racha_seca_max": int(rachas.at[codigo, "racha_seca_max"]),
+            "fin_racha_seca_max": None if pd.isna(fin_max) else pd.Timestamp(fin_max).strftime("%Y-%m-%d"),
+            "racha_seca_actual": int(rachas.at[codigo, "racha_seca_actual"]),
+        }
+    return resultado
+
+# === Benchmark: escalamiento con años de historia y número de estaciones ===
+# python -m backend.analysis [max_estaciones] [max_años]
+def _lecturas_sinteticas(estaciones, anios, semilla=0):
+    rng = np.random.default_rng(semilla)
+    fechas = pd.date_range("1970-01-01", periods=anios * 365, freq="D")
+    n = len(fechas)
+    return pd.DataFrame({
+        "estacion": pd.Categorical.from_codes(np.repeat(np.arange(estaciones), n), [f"M{i:04d}" for i in range(estaciones)]),
+        "fecha": np.tile(fechas.to_numpy(), estaciones),
+        "valor": np.where(rng.random(n * estaciones) < 0.4, 0, rng.gamma(0.8, 5, n * estaciones)).round(1),
+    })
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    max_estaciones = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    max_anios = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+
+    # Verificación de las rachas contra un recorrido directo sobre datos pequeños: lecturas
+    # horarias (varias por día) y con fechas faltantes, que cortan la racha
+    muestra = _lecturas_sinteticas(3, 4)
+    muestra = muestra.loc[muestra.index.repeat(3)].reset_index(drop=True)
+    muestra["fecha"] += pd.to_timedelta(np.tile([0, 8, 16], len(muestra) // 3), unit="h")
+    muestra["valor"] = np.where(np.random.default_rng(1).random(len(muestra)) < 0.7, 0, muestra["valor"])
+    muestra = muestra[~muestra["fecha"].dt.day.isin([7, 21])]
+    rachas = rachas_secas(muestra)
+    for codigo, grupo in muestra.groupby("estacion", observed=True):
+        actual = maximo = 0
+        anterior = None
+        for dia, lecturas in grupo.groupby(grupo["fecha"].dt.normalize()):
+            if anterior is not None and dia - anterior > pd.Timedelta(days=1):
+                actual = 0
+            actual = actual + 1 if (lecturas["valor"] <= UMBRAL_DIA_SECO).all() else 0
+            maximo, anterior = max(maximo, actual), dia
+        assert (rachas.at[codigo, "racha_seca_max"], rachas.at[codigo, "racha_seca_actual"]) == (maximo, actual), codigo
+    indices = spi(_lecturas_sinteticas(5, 40))
+    assert np.allclose(indices.mean(), 0, atol=0.05) and np.allclose(indices.std(), 1, atol=0.05), "SPI no estandarizado"
+    # Un rango sin lecturas conserva el índice mensual (los gráficos llaman a to_timestamp)
+    for vacio in (muestra.iloc[:0].drop(columns="estacion"), muestra.iloc[:0]):
+        for indice in (spi(vacio), deficit_precipitacion(vacio)):
+            assert indice.empty and isinstance(indice.index.levels[-1] if indice.index.nlevels > 1 else indice.index, pd.PeriodIndex)
+    print("✅ Rachas y SPI verificados")
+
+    def medir(df):
+        inicio = time.perf_counter()
+        spi(df)
+        deficit_precipitacion(df)
+        rachas_secas(df)
+        return time.perf_counter() - inicio
+
+    medir(_lecturas_sinteticas(2, 2))
+    print(f"{'estaciones':>10} {'años':>5} {'filas':>11} {'tiempo':>10} {'ns/fila':>8}")
+    for estaciones, anios in sorted({(max_estaciones // 4 or 1, max_anios), (max_estaciones // 2 or 1, max_anios),
+                                     (max_estaciones, max_anios // 4 or 1), (max_estaciones, max_anios // 2 or 1),
+                                     (max_estaciones, max_anios)}):
+        df = _lecturas_sinteticas(estaciones, anios)
+        duracion = min(medir(df) for _ in range(3))
+        print(f"{estaciones:>10} {anios:>5} {len(df):>11,} {duracion * 1000:>8.1f}ms {duracion / len(df) * 1e9:>8.1f}")
@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict, Counter
+from difflib import SequenceMatcher
+
+# === Cache de respuestas del chatbot ===
+# Nivel 1: LRU en memoria con TTL. Nivel 2 (opcional): SQLite en disco, sobrevive reinicios.
+# La clave combina el prompt normalizado, el modelo y los parámetros de generación.
+# Coincidencia aproximada (umbral_similitud > 0): compara la pregunta sin el contexto
+# recuperado, que comparten casi todos los prompts aumentados. Un índice invertido de
+# palabras elige a lo sumo MAX_CANDIDATOS entradas y sólo esas se comparan con
+# SequenceMatcher, fuera del lock; desde corutinas se usa obtener_async (en un hilo).
+
+MAX_CANDIDATOS = 16
+
+def _palabras(texto: str) -> set:
+    return {p for p in re.findall(r"\w+", texto) if len(p) > 2}
+
+def normalizar_texto(texto: str) -> str:
+    texto = unicodedata.normalize("NFKC", texto).lower()
+    texto = re.sub(r"\s+", " ", texto)
+    return texto.strip(" ?¿!¡.")
+
+def clave_cache(prompt_normalizado: str, modelo: str, parametros: dict) -> str:
+    material = json.dumps([prompt_normalizado, modelo, parametros], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class CacheRespuestas:
+    def __init__(self, capacidad=512, ttl=3600, ruta_db=None, ttl_disco=7 * 24 * 3600, umbral_similitud=0.0):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.ttl_disco = ttl_disco
+        self.umbral_similitud = umbral_similitud
+        self._memoria = OrderedDict()  # clave -> (respuesta, expira, grupo, pregunta normalizada)
+        self._indice = {}              # palabra -> {clave}, para la coincidencia aproximada
+        self._lock = threading.Lock()
+        self._db = None
+        self.contadores = {"hits": 0, "hits_similares": 0, "hits_disco": 0, "misses": 0, "evictions": 0, "expirados": 0}
+
+        if ruta_db:
+            self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS respuestas (clave TEXT PRIMARY KEY, respuesta TEXT, creado REAL)"
+            )
+            self._db.commit()
+
+    def _quitar(self, clave):
+        _, _, _, pregunta = self._memoria.pop(clave)
+        for palabra in _palabras(pregunta):
+            claves = self._indice.get(palabra)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._indice[palabra]
+
+    def _guardar_memoria(self, clave, respuesta, grupo, pregunta):
+        if clave in self._memoria:
+            self._quitar(clave)
+        self._memoria[clave] = (respuesta, time.monotonic() + self.ttl, grupo, pregunta)
+        for palabra in _palabras(pregunta):
+            self._indice.setdefault(palabra, set()).add(clave)
+        while len(self._memoria) > self.capacidad:
+            self._quitar(next(iter(self._memoria)))
+            self.contadores["evictions"] += 1
+
+    def _candidatos(self, grupo, pregunta, ahora) -> list:
+        # Entradas vigentes del mismo modelo y parámetros que más palabras comparten con la
+        # pregunta. Las palabras presentes en más de un cuarto de las entradas no discriminan
+        # y no se recorren, así el costo no crece con la capacidad.
+        limite = max(MAX_CANDIDATOS, len(self._memoria) // 4)
+        compartidas = Counter()
+        for palabra in _palabras(pregunta):
+            claves = self._indice.get(palabra, ())
+            if len(claves) <= limite:
+                compartidas.update(claves)
+        candidatos = []
+        for clave, _ in compartidas.most_common():
+            _, expira, grupo_entrada, pregunta_entrada = self._memoria[clave]
+            if grupo_entrada == grupo and expira >= ahora:
+                candidatos.append((clave, pregunta_entrada))
+                if len(candidatos) == MAX_CANDIDATOS:
+                    break
+        return candidatos
+
+    def _mas_similar(self, pregunta, candidatos):
+        mejor, mejor_ratio = None, self.umbral_similitud
+        for clave, pregunta_entrada in candidatos:
+            comparador = SequenceMatcher(None, pregunta, pregunta_entrada)
+            if comparador.real_quick_ratio() < mejor_ratio or comparador.quick_ratio() < mejor_ratio:
+                continue
+            ratio = comparador.ratio()
+            if ratio >= mejor_ratio:
+                mejor, mejor_ratio = clave, ratio
+        return mejor
+
+    def _exacta(self, clave, ahora):
+        # Llamar con el lock tomado
+        entrada = self._memoria.get(clave)
+        if entrada is None:
+            return None
+        if entrada[1] < ahora:
+            self._quitar(clave)
+            self.contadores["expirados"] += 1
+            return None
+        self._memoria.move_to_end(clave)
+        self.contadores["hits"] += 1
+        return entrada[0]
+
+    def obtener(self, prompt: str, modelo: str, parametros: dict, pregunta: str = None):
+        # prompt: lo que se envía al modelo (con contexto recuperado); pregunta: lo que
+        # escribió el usuario, para la coincidencia aproximada (por omisión, el prompt)
+        texto = normalizar_texto(prompt)
+        pregunta = normalizar_texto(pregunta) if pregunta is not None else texto
+        grupo = clave_cache("", modelo, parametros)
+        clave = clave_cache(texto, modelo, parametros)
+        ahora = time.monotonic()
+
+        with self._lock:
+            respuesta = self._exacta(clave, ahora)
+            if respuesta is not None:
+                return respuesta
+
+            if self._db is not None:
+                fila = self._db.execute(
+                    "SELECT respuesta, creado FROM respuestas WHERE clave = ?", (clave,)
+                ).fetchone()
+                if fila and time.time() - fila[1] <= self.ttl_disco:
+                    self._guardar_memoria(clave, fila[0], grupo, pregunta)
+                    self.contadores["hits_disco"] += 1
+                    return fila[0]
+
+            candidatos = self._candidatos(grupo, pregunta, ahora) if self.umbral_similitud > 0 else []
+
+        # La comparación fina, sin bloquear a las demás consultas
+        similar = self._mas_similar(pregunta, candidatos) if candidatos else None
+        with self._lock:
+            entrada = self._memoria.get(similar) if similar is not None else None
+            if entrada is not None:
+                self._memoria.move_to_end(similar)
+                self.contadores["hits_similares"] += 1
+                return entrada[0]
+            self.contadores["misses"] += 1
+            return None
+
+    async def obtener_async(self, prompt: str, modelo: str, parametros: dict, pregunta: str = None):
+        # Un acierto exacto en memoria se responde en el event loop; disco y coincidencia
+        # aproximada van a un hilo
+        clave = clave_cache(normalizar_texto(prompt), modelo, parametros)
+        with self._lock:
+            respuesta = self._exacta(clave, time.monotonic())
+        if respuesta is not None:
+            return respuesta
+        if self._db is None and self.umbral_similitud <= 0:
+            with self._lock:
+                self.contadores["misses"] += 1
+            return None
+        return await asyncio.to_thread(self.obtener, prompt, modelo, parametros, pregunta)
+
+    def guardar(self, prompt: str, modelo: str, parametros: dict, respuesta: str, pregunta: str = None):
+        texto = normalizar_texto(prompt)
+        pregunta = normalizar_texto(pregunta) if pregunta is not None else texto
+        grupo = clave_cache("", modelo, parametros)
+        clave = clave_cache(texto, modelo, parametros)
+        with self._lock:
+            self._guardar_memoria(clave, respuesta, grupo, pregunta)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO respuestas (clave, respuesta, creado) VALUES (?, ?, ?)",
+                    (clave, respuesta, time.time()),
+                )
+                self._db.commit()
+
+    def limpiar(self):
+        with self._lock:
+            self._memoria.clear()
+            self._indice.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM respuestas")
+                self._db.commit()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            aciertos = self.contadores["hits"] + self.contadores["hits_similares"] + self.contadores["hits_disco"]
+            total = aciertos + self.contadores["misses"]
+            return {
+                **self.contadores,
+                "entradas_memoria": len(self._memoria),
+                "capacidad": self.capacidad,
+                "disco": self._db is not None,
+                "tasa_aciertos": round(aciertos / total, 4) if total else 0.0,
+            }
+
+cache_respuestas = CacheRespuestas(
+    capacidad=int(os.getenv("CHAT_CACHE_CAPACIDAD", 512)),
+    ttl=float(os.getenv("CHAT_CACHE_TTL", 3600)),
+    ruta_db=os.getenv("CHAT_CACHE_DB") or None,
+    umbral_similitud=float(os.getenv("CHAT_CACHE_SIMILITUD", 0)),
+)
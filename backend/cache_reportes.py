@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+
+# === Cache de reportes direccionada por contenido ===
+# Cada entrada vive en un directorio cuyo nombre es el hash de (datos, plantilla, modelo).
+# Si cambian los datos cambia la clave, así que las entradas viejas simplemente dejan
+# de usarse y la política LRU por tamaño las termina desalojando.
+
+class CacheReportes:
+    def __init__(self, directorio: str, max_bytes: int):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._hashes = {}  # (ruta, tamaño, mtime) -> sha256 del contenido
+        self._lock = threading.Lock()
+        self.contadores = {"hits": 0, "misses": 0}
+
+    def hash_archivo(self, ruta: str) -> str:
+        # Se recalcula sólo si cambia el tamaño o la fecha de modificación del archivo
+        estado = os.stat(ruta)
+        firma = (ruta, estado.st_size, estado.st_mtime_ns)
+        if firma not in self._hashes:
+            sha = hashlib.sha256()
+            with open(ruta, "rb") as f:
+                for bloque in iter(lambda: f.read(1 << 20), b""):
+                    sha.update(bloque)
+            self._hashes[firma] = sha.hexdigest()
+        return self._hashes[firma]
+
+    def clave(self, *partes) -> str:
+        material = json.dumps(partes, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, clave)
+
+    def obtener(self, clave: str):
+        # Otro proceso puede estar desalojando la entrada: si falta el manifiesto o alguno de
+        # sus archivos es un fallo. Quien copie los archivos igual debe tolerar un OSError.
+        ruta = self._ruta(clave)
+        try:
+            os.utime(ruta)  # marca de uso para la política LRU
+            with open(os.path.join(ruta, "manifiesto.json"), encoding="utf-8") as f:
+                manifiesto = json.load(f)
+            completa = all(os.path.exists(os.path.join(ruta, nombre)) for nombre in manifiesto["archivos"])
+        except (OSError, ValueError, KeyError):
+            completa = False
+        if not completa:
+            self.contadores["misses"] += 1
+            return None
+        self.contadores["hits"] += 1
+        manifiesto["directorio"] = ruta
+        return manifiesto
+
+    def guardar(self, clave: str, archivos: dict, metadatos: dict):
+        # archivos: nombre destino -> ruta origen o contenido en bytes. Se escribe en un directorio
+        # temporal y se renombra al final para que un lector nunca vea una entrada a medias.
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = tempfile.mkdtemp(prefix=".tmp_", dir=self.directorio)
+        try:
+            for nombre, origen in archivos.items():
+                if isinstance(origen, bytes):
+                    with open(os.path.join(temporal, nombre), "wb") as f:
+                        f.write(origen)
+                else:
+                    shutil.copyfile(origen, os.path.join(temporal, nombre))
+            with open(os.path.join(temporal, "manifiesto.json"), "w", encoding="utf-8") as f:
+                json.dump({**metadatos, "archivos": list(archivos), "creado": time.time()}, f, ensure_ascii=False)
+            os.replace(temporal, self._ruta(clave))
+        except OSError:
+            # Otro proceso guardó la misma clave primero
+            shutil.rmtree(temporal, ignore_errors=True)
+        self.desalojar()
+
+    def _tamano(self, ruta: str) -> int:
+        return sum(entrada.stat().st_size for entrada in os.scandir(ruta) if entrada.is_file())
+
+    def desalojar(self):
+        with self._lock:
+            entradas = []
+            for entrada in os.scandir(self.directorio):
+                if entrada.is_dir() and not entrada.name.startswith(".tmp_"):
+                    try:
+                        entradas.append((entrada.stat().st_mtime, entrada.path, self._tamano(entrada.path)))
+                    except OSError:
+                        continue  # la desalojó otro proceso
+            total = sum(tamano for _, _, tamano in entradas)
+            for _, ruta, tamano in sorted(entradas):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(ruta, ignore_errors=True)
+                total -= tamano
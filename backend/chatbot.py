@@ -1,85 +1,494 @@
 import os
+import json
+import time
+import asyncio
+import weakref
+import threading
+import functools
 import openai
 import requests
+import httpx
 from dotenv import load_dotenv
+from backend.cache import cache_respuestas
+from backend.enrutador import Enrutador, ErrorProveedor, SinProveedoresError
+from backend.modelo_local import modelo_local, PARAMETROS_LOCAL
+from backend.recuperacion import indice_recuperacion, RAG_ACTIVO
+from backend.contexto_llm import CARACTERES_POR_TOKEN
+from backend.metricas import registro, tramo, CUBOS_LENTOS
 
 load_dotenv()
 
 # === API Keys ===
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-HF_API_KEY = os.getenv("HF_API_KEY")
+HF_API_KEY = os.getenv("HF_API_KEY") or os.getenv("HF_API_TOKEN")  # HF_API_TOKEN: el nombre que usaba el reporte
+
+# === Endpoints (sobrescribibles para apuntar a un servidor LLM local de pruebas) ===
+OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
+HF_API_URL = os.getenv("HF_API_URL", "https://api-inference.huggingface.co/models/HuggingFaceH4/zephyr-7b-beta")
+
+# === Pool de conexiones y límites de concurrencia por proveedor ===
+LLM_MAX_CONEXIONES = int(os.getenv("LLM_MAX_CONEXIONES", 100))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", 20))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+LIMITES_PROVEEDOR = {
+    "openai": int(os.getenv("OPENAI_CONCURRENCIA", 16)),
+    "zephyr": int(os.getenv("HF_CONCURRENCIA", 8)),
+}
 
 # === OpenAI Config ===
 openai.api_key = OPENAI_API_KEY
 
+SISTEMA_OPENAI = (
+    "Eres un asistente técnico especializado en gestión de sequías y recursos hídricos. "
+    "Responde de manera clara, técnica y basada en datos científicos sobre la situación en Calderón."
+)
+
+SISTEMA_ZEPHYR = (
+    "Eres un experto asistente técnico en gestión de sequías y recursos hídricos. "
+    "Tu tarea es responder de manera clara, detallada y científica, enfocándote en la situación del suministro de agua en la parroquia de Calderón, Quito, Ecuador. "
+    "Proporciona respuestas basadas en datos y análisis científicos, evitando conjeturas no fundamentadas."
+)
+
+# Parámetros de generación por proveedor (también forman parte de la clave de cache)
+PARAMETROS = {
+    "openai": {
+        "model": "gpt-4o-mini",
+        "temperature": 0.3,
+        "max_tokens": 300,
+    },
+    "zephyr": {
+        "max_new_tokens": 300,
+        "temperature": 0.4,
+        "do_sample": True,
+        "top_p": 0.9,
+        "repetition_penalty": 1.1
+    },
+    "local": PARAMETROS_LOCAL,
+}
+
+def _mensajes_openai(prompt: str) -> list:
+    return [
+        {"role": "system", "content": SISTEMA_OPENAI},
+        {"role": "user", "content": prompt}
+    ]
+
+def _payload_zephyr(prompt: str) -> dict:
+    # Formato de entrada estilo chat
+    return {
+        "inputs": f"<|system|>{SISTEMA_ZEPHYR}<|user|>{prompt}<|assistant|>",
+        "parameters": PARAMETROS["zephyr"]
+    }
+
+def _extraer_zephyr(result) -> str:
+    generated_text = result[0]["generated_text"]
+    # Extraer solo la respuesta después del <|assistant|>
+    respuesta = generated_text.split("<|assistant|>")[-1].strip()
+    return respuesta or "Sin respuesta."
+
+# === Métricas por proveedor (GET /metrics) ===
+LLM_SEGUNDOS = registro.histograma(
+    "llm_solicitud_segundos", "Latencia de cada llamada a un proveedor LLM (reintentos incluidos por separado).",
+    ("proveedor", "resultado"), CUBOS_LENTOS,
+)
+LLM_PRIMER_TOKEN = registro.histograma(
+    "llm_primer_token_segundos", "Tiempo hasta el primer token en respuestas en streaming.", ("proveedor",), CUBOS_LENTOS,
+)
+LLM_TOKENS = registro.contador(
+    "llm_tokens_total", "Tokens de prompt y respuesta; OpenAI informa el uso real, el resto se estima por caracteres.",
+    ("proveedor", "tipo"),
+)
+LLM_ERRORES = registro.contador("llm_errores_total", "Errores de LLM devueltos como texto al usuario.", ("proveedor", "error"))
+
+def _estimar_tokens(texto) -> int:
+    if isinstance(texto, dict):
+        texto = list(texto.values())
+    if isinstance(texto, (list, tuple)):
+        return sum(_estimar_tokens(t) for t in texto)
+    return len(texto) // CARACTERES_POR_TOKEN + 1 if texto else 0
+
+def contar_tokens(proveedor: str, prompt, respuesta, uso: dict = None):
+    # uso: el "usage" de la API (prompt_tokens, completion_tokens) si lo hay
+    LLM_TOKENS.incrementar(proveedor, "prompt", valor=uso.get("prompt_tokens", 0) if uso else _estimar_tokens(prompt))
+    LLM_TOKENS.incrementar(proveedor, "respuesta", valor=uso.get("completion_tokens", 0) if uso else _estimar_tokens(respuesta))
+
+def medir_llm(proveedor: str, estimar_tokens: bool = True):
+    # Latencia, resultado y tokens de una función (sync o async) prompt(s) -> respuesta(s)
+    def decorador(funcion):
+        if asyncio.iscoroutinefunction(funcion):
+            @functools.wraps(funcion)
+            async def envoltura(prompt, *args, **kwargs):
+                inicio = time.perf_counter()
+                with tramo("llm", proveedor=proveedor):
+                    try:
+                        respuesta = await funcion(prompt, *args, **kwargs)
+                    except BaseException:
+                        LLM_SEGUNDOS.observar(time.perf_counter() - inicio, proveedor, "error")
+                        raise
+                LLM_SEGUNDOS.observar(time.perf_counter() - inicio, proveedor, "ok")
+                if estimar_tokens:
+                    contar_tokens(proveedor, prompt, respuesta)
+                return respuesta
+        else:
+            @functools.wraps(funcion)
+            def envoltura(prompt, *args, **kwargs):
+                inicio = time.perf_counter()
+                with tramo("llm", proveedor=proveedor):
+                    try:
+                        respuesta = funcion(prompt, *args, **kwargs)
+                    except BaseException:
+                        LLM_SEGUNDOS.observar(time.perf_counter() - inicio, proveedor, "error")
+                        raise
+                LLM_SEGUNDOS.observar(time.perf_counter() - inicio, proveedor, "ok")
+                if estimar_tokens:
+                    contar_tokens(proveedor, prompt, respuesta)
+                return respuesta
+        return envoltura
+    return decorador
+
+def _error(modelo: str, e: Exception) -> str:
+    LLM_ERRORES.incrementar(modelo, type(e).__name__)
+    if modelo == "zephyr":
+        return f"Error en la API Hugging Face: {e}"
+    if modelo == "local":
+        return f"Error en el modelo local: {e}"
+    return f"Error en la API OpenAI: {e}"
+
+def _con_contexto(pregunta: str) -> str:
+    # Antepone los fragmentos de datos/documentos más cercanos a la pregunta. El prompt
+    # aumentado es también la clave de cache: si cambian los datos, cambia la respuesta.
+    if not RAG_ACTIVO:
+        return pregunta
+    try:
+        contexto = indice_recuperacion.contexto(pregunta)
+    except Exception as e:
+        print(f"⚠️ Recuperación no disponible: {e}")
+        return pregunta
+    if not contexto:
+        return pregunta
+    return (
+        "Datos de referencia recuperados de los registros de las estaciones y documentos técnicos "
+        "(úsalos sólo si son pertinentes):\n"
+        f"{contexto}\n\nPregunta: {pregunta}"
+    )
+
 # === OpenAI GPT ===
+@medir_llm("openai", estimar_tokens=False)
+def _completar_openai_sync(prompt: str) -> str:
+    response = openai.ChatCompletion.create(
+        messages=_mensajes_openai(prompt),
+        **PARAMETROS["openai"],
+    )
+    respuesta = response.choices[0].message.content.strip()
+    contar_tokens("openai", prompt, respuesta, response.get("usage"))
+    return respuesta
+
 def generar_respuesta_openai(prompt: str) -> str:
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Eres un asistente técnico especializado en gestión de sequías y recursos hídricos. "
-                        "Responde de manera clara, técnica y basada en datos científicos sobre la situación en Calderón."
-                    )
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=300,
-        )
-        return response.choices[0].message.content.strip()
+        return _completar_openai_sync(prompt)
     except Exception as e:
-        return f"Error en la API OpenAI: {e}"
+        return _error("openai", e)
 
 # === Hugging Face Zephyr 7B ===
+@medir_llm("zephyr")
+def _completar_zephyr_sync(prompt: str) -> str:
+    headers = {
+        "Authorization": f"Bearer {HF_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    response = requests.post(HF_API_URL, headers=headers, json=_payload_zephyr(prompt))
+    if response.status_code != 200:
+        raise ErrorProveedor(response.status_code, response.text)
+    return _extraer_zephyr(response.json())
+
 def generar_respuesta_zephyr(prompt: str) -> str:
     try:
-        url = "https://api-inference.huggingface.co/models/HuggingFaceH4/zephyr-7b-beta"
-        headers = {
-            "Authorization": f"Bearer {HF_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        # Formato de entrada estilo chat
-        data = {
-            "inputs": (
-                "<|system|>"
-                "Eres un experto asistente técnico en gestión de sequías y recursos hídricos. "
-                "Tu tarea es responder de manera clara, detallada y científica, enfocándote en la situación del suministro de agua en la parroquia de Calderón, Quito, Ecuador. "
-                "Proporciona respuestas basadas en datos y análisis científicos, evitando conjeturas no fundamentadas."
-                "<|user|>"
-                f"{prompt}"
-                "<|assistant|>"
-            ),
-            "parameters": {
-                "max_new_tokens": 300,
-                "temperature": 0.4,
-                "do_sample": True,
-                "top_p": 0.9,
-                "repetition_penalty": 1.1
-            }
-        }
-
-        response = requests.post(url, headers=headers, json=data)
-
-        if response.status_code == 200:
-            result = response.json()
-            generated_text = result[0]["generated_text"]
-            # Extraer solo la respuesta después del <|assistant|>
-            respuesta = generated_text.split("<|assistant|>")[-1].strip()
-            return respuesta or "Sin respuesta."
-        else:
-            return f"Error Hugging Face API: {response.status_code} {response.text}"
+        return _completar_zephyr_sync(prompt)
     except Exception as e:
-        return f"Error en la API Hugging Face: {e}"
+        return _error("zephyr", e)
+
+# === Modelo local ===
+@medir_llm("local")
+def _completar_local_sync(prompt: str) -> str:
+    return modelo_local.generar(_mensajes_openai(prompt))
 
 # === Orquestador ===
-def responder_pregunta(pregunta: str, modelo: str = "openai") -> str:
+def _modelo(modelo: str) -> str:
     modelo = modelo.lower()
-    if modelo == "zephyr":
-        return generar_respuesta_zephyr(pregunta)
-    else:
-        return generar_respuesta_openai(pregunta)
+    if modelo in ("zephyr", "huggingface"):
+        return "zephyr"
+    return "local" if modelo == "local" else "openai"
+
+def responder_pregunta(pregunta: str, modelo: str = "openai", recuperar: bool = True) -> str:
+    modelo = _modelo(modelo)
+    original = pregunta  # la coincidencia aproximada de la cache compara la pregunta sin contexto
+    if recuperar:
+        pregunta = _con_contexto(pregunta)
+    cacheada = cache_respuestas.obtener(pregunta, modelo, PARAMETROS[modelo], original)
+    if cacheada is not None:
+        return cacheada
+    try:
+        if modelo == "zephyr":
+            respuesta = _completar_zephyr_sync(pregunta)
+        elif modelo == "local":
+            respuesta = _completar_local_sync(pregunta)
+        else:
+            respuesta = _completar_openai_sync(pregunta)
+    except Exception as e:
+        # Los errores no se guardan en cache
+        return _error(modelo, e)
+    cache_respuestas.guardar(pregunta, modelo, PARAMETROS[modelo], respuesta, original)
+    return respuesta
+
+# === Cliente asíncrono compartido ===
+# Un único httpx.AsyncClient por event loop: las conexiones TCP/TLS se reutilizan
+# (keep-alive) entre peticiones y proveedores en lugar de abrir una por llamada. El
+# del servidor es uno; el puente síncrono de los reportes (responder_lote) tiene el suyo.
+_clientes = weakref.WeakKeyDictionary()   # event loop -> cliente
+_semaforos = weakref.WeakKeyDictionary()  # event loop -> {proveedor: semáforo}
+
+def obtener_cliente() -> httpx.AsyncClient:
+    bucle = asyncio.get_running_loop()
+    cliente = _clientes.get(bucle)
+    if cliente is None or cliente.is_closed:
+        cliente = _clientes[bucle] = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONEXIONES,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                keepalive_expiry=30.0,
+            ),
+        )
+    return cliente
+
+async def cerrar_cliente():
+    bucle = asyncio.get_running_loop()
+    cliente = _clientes.pop(bucle, None)
+    if cliente is not None:
+        await cliente.aclose()
+    _semaforos.pop(bucle, None)
+
+def _limite(proveedor: str) -> asyncio.Semaphore:
+    # Limita las peticiones en vuelo por proveedor para no saturar su cuota
+    semaforos = _semaforos.setdefault(asyncio.get_running_loop(), {})
+    if proveedor not in semaforos:
+        semaforos[proveedor] = asyncio.Semaphore(LIMITES_PROVEEDOR.get(proveedor, 8))
+    return semaforos[proveedor]
+
+@medir_llm("openai", estimar_tokens=False)
+async def _completar_openai(prompt: str) -> str:
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
+    payload = {"messages": _mensajes_openai(prompt), **PARAMETROS["openai"]}
+    async with _limite("openai"):
+        response = await obtener_cliente().post(OPENAI_API_URL, headers=headers, json=payload)
+    response.raise_for_status()
+    datos = response.json()
+    respuesta = datos["choices"][0]["message"]["content"].strip()
+    contar_tokens("openai", prompt, respuesta, datos.get("usage"))
+    return respuesta
+
+@medir_llm("zephyr")
+async def _completar_zephyr(prompt: str) -> str:
+    headers = {"Authorization": f"Bearer {HF_API_KEY}"}
+    async with _limite("zephyr"):
+        response = await obtener_cliente().post(HF_API_URL, headers=headers, json=_payload_zephyr(prompt))
+    if response.status_code != 200:
+        raise ErrorProveedor(response.status_code, response.text)
+    return _extraer_zephyr(response.json())
+
+@medir_llm("local")
+async def _completar_local(prompt: str) -> str:
+    # Sin red: el prompt entra a la cola del lote dinámico del modelo en proceso
+    return await modelo_local.generar_async(_mensajes_openai(prompt))
+
+async def generar_respuesta_openai_async(prompt: str) -> str:
+    try:
+        return await _completar_openai(prompt)
+    except Exception as e:
+        return _error("openai", e)
+
+async def generar_respuesta_zephyr_async(prompt: str) -> str:
+    try:
+        return await _completar_zephyr(prompt)
+    except Exception as e:
+        return _error("zephyr", e)
+
+# Reintentos, circuit breaker y conmutación entre proveedores (ver backend/enrutador.py).
+# Las funciones se resuelven al llamar para que las URLs sobrescritas apliquen.
+enrutador = Enrutador({
+    "openai": lambda prompt: _completar_openai(prompt),
+    "zephyr": lambda prompt: _completar_zephyr(prompt),
+    "local": lambda prompt: _completar_local(prompt),
+}, respaldos=("openai", "zephyr") + (("local",) if os.getenv("MODELO_LOCAL_RESPALDO", "0") == "1" else ()))
+
+async def responder_pregunta_async(pregunta: str, modelo: str = "openai", recuperar: bool = True) -> str:
+    modelo = _modelo(modelo)
+    original = pregunta
+    if recuperar:
+        pregunta = await asyncio.to_thread(_con_contexto, pregunta)
+    cacheada = await cache_respuestas.obtener_async(pregunta, modelo, PARAMETROS[modelo], original)
+    if cacheada is not None:
+        return cacheada
+    try:
+        respuesta, proveedor = await enrutador.completar(pregunta, modelo)
+    except Exception as e:
+        return _error(modelo, e)
+    # Se guarda bajo el proveedor que respondió: un respaldo no ocupa la clave del pedido
+    cache_respuestas.guardar(pregunta, proveedor, PARAMETROS[proveedor], respuesta, original)
+    return respuesta
+
+# === Lotes de prompts ===
+# Hugging Face acepta una lista en "inputs": un lote de N prompts viaja en una sola
+# petición (o en ceil(N / HF_LOTE_MAX)). OpenAI no tiene lotes síncronos, así que los
+# prompts se envían en paralelo sobre el pool compartido. Los prompts repetidos o ya
+# cacheados no salen del proceso. Todo pasa por el enrutador: la llamada de lista con
+# sus reintentos y su circuit breaker y, si falla, cada prompt con conmutación.
+HF_LOTE_MAX = int(os.getenv("HF_LOTE_MAX", 16))
+
+def _payload_zephyr_lote(prompts: list) -> dict:
+    return {
+        "inputs": [_payload_zephyr(prompt)["inputs"] for prompt in prompts],
+        "parameters": PARAMETROS["zephyr"],
+    }
+
+def _extraer_zephyr_lote(result, cantidad: int) -> list:
+    # Cada elemento puede venir como {"generated_text": ...} o como [{"generated_text": ...}]
+    if not isinstance(result, list) or len(result) != cantidad:
+        raise RuntimeError(f"Respuesta de lote inesperada: {str(result)[:200]}")
+    return [_extraer_zephyr(item if isinstance(item, list) else [item]) for item in result]
+
+@medir_llm("zephyr")
+async def _completar_zephyr_lote(prompts: list) -> list:
+    headers = {"Authorization": f"Bearer {HF_API_KEY}"}
+    async with _limite("zephyr"):
+        response = await obtener_cliente().post(HF_API_URL, headers=headers, json=_payload_zephyr_lote(prompts))
+    if response.status_code != 200:
+        raise ErrorProveedor(response.status_code, response.text)
+    return _extraer_zephyr_lote(response.json(), len(prompts))
+
+LOTES = {"zephyr": lambda prompts: _completar_zephyr_lote(prompts)}
+
+async def responder_lote_async(prompts: dict, modelo: str = "openai") -> dict:
+    # prompts: {id: texto} -> {id: respuesta}; un error afecta sólo a su id
+    modelo = _modelo(modelo)
+    respuestas, pendientes = {}, []
+    for texto in dict.fromkeys(prompts.values()):
+        cacheada = await cache_respuestas.obtener_async(texto, modelo, PARAMETROS[modelo])
+        if cacheada is not None:
+            respuestas[texto] = cacheada
+        else:
+            pendientes.append(texto)
+
+    if pendientes:
+        # Los prompts locales concurrentes los agrupa el propio modelo en un lote
+        tamano = HF_LOTE_MAX if modelo == "zephyr" else len(pendientes)
+        grupos = await asyncio.gather(*(
+            enrutador.completar_lote(pendientes[inicio:inicio + tamano], modelo, LOTES)
+            for inicio in range(0, len(pendientes), tamano)
+        ))
+        for texto, resultado in zip(pendientes, (r for grupo in grupos for r in grupo)):
+            if isinstance(resultado, Exception):
+                respuestas[texto] = _error(modelo, resultado)
+                continue
+            respuesta, proveedor = resultado
+            respuestas[texto] = respuesta
+            # Bajo el proveedor que respondió, como en responder_pregunta_async
+            cache_respuestas.guardar(texto, proveedor, PARAMETROS[proveedor], respuesta)
+
+    return {clave: respuestas[texto] for clave, texto in prompts.items()}
+
+# === Puente síncrono ===
+# Los reportes corren en hilos (cola de trabajos, suscripciones): sus análisis usan el
+# mismo camino que /chatbot/batch sobre un event loop propio en un hilo dedicado.
+_bucle_sincrono = None
+_lock_bucle = threading.Lock()
+
+def _bucle() -> asyncio.AbstractEventLoop:
+    global _bucle_sincrono
+    with _lock_bucle:
+        if _bucle_sincrono is None:
+            _bucle_sincrono = asyncio.new_event_loop()
+            threading.Thread(target=_bucle_sincrono.run_forever, name="llm-sincrono", daemon=True).start()
+    return _bucle_sincrono
+
+def responder_lote(prompts: dict, modelo: str = "openai") -> dict:
+    return asyncio.run_coroutine_threadsafe(responder_lote_async(prompts, modelo), _bucle()).result()
+
+# === Streaming de tokens ===
+async def _stream_openai(prompt: str):
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
+    payload = {"messages": _mensajes_openai(prompt), "stream": True, **PARAMETROS["openai"]}
+    async with _limite("openai"):
+        async with obtener_cliente().stream("POST", OPENAI_API_URL, headers=headers, json=payload) as response:
+            if response.status_code != 200:
+                raise ErrorProveedor(response.status_code, (await response.aread()).decode())
+            async for linea in response.aiter_lines():
+                if not linea.startswith("data:"):
+                    continue
+                dato = linea[5:].strip()
+                if dato == "[DONE]":
+                    break
+                delta = json.loads(dato)["choices"][0].get("delta", {})
+                if delta.get("content"):
+                    yield delta["content"]
+
+async def _stream_zephyr(prompt: str):
+    headers = {"Authorization": f"Bearer {HF_API_KEY}"}
+    payload = {**_payload_zephyr(prompt), "stream": True}
+    async with _limite("zephyr"):
+        async with obtener_cliente().stream("POST", HF_API_URL, headers=headers, json=payload) as response:
+            if response.status_code != 200:
+                raise ErrorProveedor(response.status_code, (await response.aread()).decode())
+            async for linea in response.aiter_lines():
+                if not linea.startswith("data:"):
+                    continue
+                token = json.loads(linea[5:])["token"]
+                if not token.get("special"):
+                    yield token["text"]
+
+async def _stream_local(prompt: str):
+    # La generación local se entrega completa, como un único fragmento (medida por stream_respuesta)
+    yield await _completar_local.__wrapped__(prompt)
+
+async def stream_respuesta(pregunta: str, modelo: str = "openai", recuperar: bool = True):
+    modelo = _modelo(modelo)
+    original = pregunta
+    if recuperar:
+        pregunta = await asyncio.to_thread(_con_contexto, pregunta)
+    cacheada = await cache_respuestas.obtener_async(pregunta, modelo, PARAMETROS[modelo], original)
+    if cacheada is not None:
+        yield cacheada
+        return
+
+    # Se cambia de proveedor sólo si falla antes del primer token; a mitad de respuesta ya no
+    error = SinProveedoresError("Todos los proveedores tienen el circuito abierto.")
+    for proveedor in enrutador.orden(modelo):
+        estado = enrutador.estados[proveedor]
+        estado.iniciar()
+        fuente = {"zephyr": _stream_zephyr, "local": _stream_local}.get(proveedor, _stream_openai)(pregunta)
+        partes, inicio = [], time.perf_counter()
+        try:
+            async for token in fuente:
+                if not partes:
+                    LLM_PRIMER_TOKEN.observar(time.perf_counter() - inicio, proveedor)
+                partes.append(token)
+                yield token
+        except Exception as e:
+            LLM_SEGUNDOS.observar(time.perf_counter() - inicio, proveedor, "error")
+            estado.fallo()
+            error = e
+            if partes:
+                break
+            continue
+        except BaseException:
+            # Cliente desconectado: no cuenta para el circuito
+            LLM_SEGUNDOS.observar(time.perf_counter() - inicio, proveedor, "cancelado")
+            estado.cancelado()
+            raise
+        LLM_SEGUNDOS.observar(time.perf_counter() - inicio, proveedor, "ok")
+        contar_tokens(proveedor, pregunta, partes)
+        estado.exito()
+        respuesta = "".join(partes).strip()
+        if respuesta:
+            cache_respuestas.guardar(pregunta, proveedor, PARAMETROS[proveedor], respuesta, original)
+        return
+    yield _error(modelo, error)
@@ -0,0 +1,177 @@
+import os
+import numpy as np
+import pandas as pd
+
+# === Contexto compacto para prompts ===
+# En vez de pegar filas crudas, la serie se resume en un digesto estadístico de
+# tamaño fijo: período y cobertura, tendencia anual, anomalías estacionales, rachas
+# secas extremas y cambios de régimen. Todo se calcula con operaciones vectorizadas
+# y las secciones se agregan por prioridad hasta agotar el presupuesto, así que el
+# prompt mide lo mismo con un año de datos que con cien.
+
+PRESUPUESTO_TOKENS_CONTEXTO = int(os.getenv("PRESUPUESTO_TOKENS_CONTEXTO", 350))
+CARACTERES_POR_TOKEN = 4  # Estimación conservadora para texto en español con números
+MAX_CAMBIOS = 3
+MESES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+         "septiembre", "octubre", "noviembre", "diciembre"]
+
+def _num(valor, decimales=1) -> str:
+    return f"{valor:.{decimales}f}" if np.isfinite(valor) else "s/d"
+
+def _periodo(df: pd.DataFrame) -> list:
+    # Cobertura y días sin agua por fecha, no por lectura: con telemetría hay varias por día
+    fechas, valores = df["fecha"], df["valor"]
+    dia = fechas.dt.normalize()
+    dias = (fechas.iloc[-1].normalize() - fechas.iloc[0].normalize()).days + 1
+    con_lluvia = (valores != 0).groupby(dia).any()
+    return [
+        f"Período {fechas.iloc[0]:%Y-%m-%d} a {fechas.iloc[-1]:%Y-%m-%d}: {len(df)} registros "
+        f"(cobertura {len(con_lluvia) / dias * 100:.0f}%).",
+        f"Valor medio {_num(valores.mean(), 2)}, desviación {_num(valores.std(), 2)}, máximo {_num(valores.max())} "
+        f"({fechas.iloc[int(valores.to_numpy().argmax())]:%Y-%m-%d}), días sin agua {(~con_lluvia).mean() * 100:.1f}%.",
+    ]
+
+def _tendencia(anual: pd.Series) -> list:
+    # Pendiente de mínimos cuadrados de los totales anuales (sólo años con datos)
+    anual = anual.dropna()
+    if len(anual) < 3:
+        return []
+    pendiente, _ = np.polyfit(anual.index.to_numpy(dtype=float), anual.to_numpy(), 1)
+    relativa = pendiente / anual.mean() * 100 if anual.mean() else np.nan
+    return [
+        f"Tendencia del total anual: {_num(pendiente)} por año ({_num(relativa)}% de la media anual de {_num(anual.mean())}); "
+        f"año más seco {anual.idxmin()} ({_num(anual.min())}), más húmedo {anual.idxmax()} ({_num(anual.max())})."
+    ]
+
+def _estacionalidad(mensual: pd.Series) -> list:
+    # Anomalías de cada mes respecto a su climatología (z por mes del calendario)
+    mensual = mensual.dropna()
+    if len(mensual) < 24:
+        return []
+    meses = mensual.index.month
+    climatologia = mensual.groupby(meses).mean()
+    desviacion = mensual.groupby(meses).std().replace(0, np.nan)
+    z = (mensual - climatologia.reindex(meses).to_numpy()) / desviacion.reindex(meses).to_numpy()
+    humedo, seco = climatologia.idxmax(), climatologia.idxmin()
+    lineas = [f"Mes más lluvioso en promedio: {MESES[humedo - 1]} ({_num(climatologia[humedo])}); "
+              f"más seco: {MESES[seco - 1]} ({_num(climatologia[seco])})."]
+    extremos = z.dropna().abs().nlargest(3).index
+    if len(extremos):
+        lineas.append("Anomalías mensuales extremas: " + "; ".join(
+            f"{mes} {_num(mensual[mes])} (z={_num(z[mes])})" for mes in extremos
+        ) + ".")
+    ultimos = z.dropna().tail(12)
+    if len(ultimos):
+        lineas.append(f"Últimos {len(ultimos)} meses: {(ultimos < -1).sum()} muy por debajo de lo normal (z<-1), "
+                      f"{(ultimos > 1).sum()} muy por encima; z medio {_num(ultimos.mean(), 2)}.")
+    return lineas
+
+def _rachas(df: pd.DataFrame) -> list:
+    # Rachas de días sin agua (todas las lecturas del día en 0): las tres más largas y la
+    # racha en curso. Se cuentan fechas, no lecturas, y una fecha sin datos corta la racha.
+    seco_dia = (df["valor"] == 0).groupby(df["fecha"].dt.normalize()).all()
+    seco, fechas = seco_dia.to_numpy(), seco_dia.index.to_numpy()
+    if not seco.any():
+        return ["Sin días secos registrados."]
+    # continua[i]: el día i sigue la racha del día anterior (ambos secos y consecutivos)
+    continua = np.zeros(len(seco), dtype=bool)
+    continua[1:] = seco[1:] & seco[:-1] & (np.diff(fechas) == np.timedelta64(1, "D"))
+    inicios = np.flatnonzero(seco & ~continua)
+    fines = np.flatnonzero(seco & ~np.append(continua[1:], False))
+    largos = fines - inicios + 1
+    mayores = np.argsort(-largos, kind="stable")[:3]
+    detalle = "; ".join(
+        f"{largos[i]} días ({pd.Timestamp(fechas[inicios[i]]):%Y-%m-%d} a {pd.Timestamp(fechas[fines[i]]):%Y-%m-%d})"
+        for i in mayores
+    )
+    actual = largos[-1] if fines[-1] == len(seco) - 1 else 0
+    return [f"Rachas secas más largas: {detalle}. Racha actual: {actual} días. "
+            f"{len(largos)} rachas en total, mediana {_num(np.median(largos), 0)} días."]
+
+def _cambios_de_regimen(mensual: pd.Series) -> list:
+    # Segmentación binaria por cambio de media sobre las anomalías mensuales (sin el ciclo
+    # estacional): el corte k maximiza |media_izq - media_der| * sqrt(k (n - k) / n) / sigma,
+    # evaluado para todos los k a la vez con sumas acumuladas
+    serie = mensual.dropna()
+    serie = serie - serie.groupby(serie.index.month).transform("mean")
+    valores = serie.to_numpy()
+    if len(valores) < 24:
+        return []
+    sigma = valores.std() or 1.0
+    segmentos, cortes = [(0, len(valores))], []
+    while segmentos and len(cortes) < MAX_CAMBIOS:
+        mejor = None
+        for inicio, fin in segmentos:
+            tramo = valores[inicio:fin]
+            n = len(tramo)
+            if n < 24:
+                continue
+            k = np.arange(12, n - 11)
+            acumulado = np.cumsum(tramo)
+            izquierda = acumulado[k - 1] / k
+            derecha = (acumulado[-1] - acumulado[k - 1]) / (n - k)
+            estadistico = np.abs(izquierda - derecha) * np.sqrt(k * (n - k) / n) / sigma
+            i = int(np.argmax(estadistico))
+            if mejor is None or estadistico[i] > mejor[0]:
+                mejor = (estadistico[i], inicio, fin, inicio + k[i], izquierda[i], derecha[i])
+        # Umbral aproximado al 95% para el máximo de un puente browniano (~1.36)
+        if mejor is None or mejor[0] < 1.36:
+            break
+        _, inicio, fin, corte, antes, despues = mejor
+        cortes.append((corte, antes, despues))
+        segmentos.remove((inicio, fin))
+        segmentos += [(inicio, corte), (corte, fin)]
+    if not cortes:
+        return ["Sin cambios de régimen significativos en la media mensual."]
+    return ["Cambios de régimen (anomalía mensual media respecto a la climatología): " + "; ".join(
+        f"desde {serie.index[corte]} pasa de {antes:+.1f} a {despues:+.1f}" for corte, antes, despues in sorted(cortes)
+    ) + "."]
+
+def resumir_serie(df: pd.DataFrame, presupuesto_tokens: int = PRESUPUESTO_TOKENS_CONTEXTO) -> str:
+    # Digesto de una serie diaria (fecha, valor) con longitud acotada por presupuesto_tokens
+    df = df[["fecha", "valor"]].dropna()
+    if df.empty:
+        return "Sin datos en el período solicitado."
+    if not df["fecha"].is_monotonic_increasing:
+        df = df.sort_values("fecha", kind="stable")
+    indice = pd.DatetimeIndex(df["fecha"])
+    mensual = df["valor"].groupby(indice.to_period("M")).sum(min_count=1)
+    mensual = mensual.reindex(pd.period_range(mensual.index.min(), mensual.index.max(), freq="M"))
+    anual = df["valor"].groupby(indice.year).sum()
+
+    # Orden de prioridad: lo que no cabe en el presupuesto se omite entero
+    secciones = [_periodo(df), _rachas(df), _tendencia(anual), _cambios_de_regimen(mensual), _estacionalidad(mensual)]
+    limite = presupuesto_tokens * CARACTERES_POR_TOKEN
+    lineas, usados = [], 0
+    for linea in (linea for seccion in secciones for linea in seccion):
+        if usados + len(linea) + 1 > limite:
+            continue
+        lineas.append(linea)
+        usados += len(linea) + 1
+    return "\n".join(lineas)
+
+# 🧪 Prueba manual: el tamaño del digesto no crece con los datos
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    for anios in (1, 10, 50, 100):
+        fechas = pd.date_range("1920-01-01", periods=anios * 365, freq="D")
+        estacional = 1 + 0.8 * np.sin(2 * np.pi * fechas.dayofyear.to_numpy() / 365)
+        cambio = np.where(fechas.year >= 1920 + anios // 2, 0.6, 1.0)
+        valores = np.where(rng.random(len(fechas)) < 0.45, 0, rng.gamma(0.8, 5 * estacional * cambio)).round(1)
+        inicio = time.perf_counter()
+        texto = resumir_serie(pd.DataFrame({"fecha": fechas, "valor": valores}))
+        duracion = time.perf_counter() - inicio
+        assert len(texto) <= PRESUPUESTO_TOKENS_CONTEXTO * CARACTERES_POR_TOKEN
+        print(f"{anios:>3} años: {len(texto):>5} caracteres en {duracion * 1000:6.1f} ms")
+    print(texto)
+
+    # Con lecturas horarias las rachas se cuentan en días, y una fecha faltante las corta
+    fechas = pd.date_range("2024-01-01", periods=10 * 24, freq="h")
+    horaria = pd.DataFrame({"fecha": fechas, "valor": np.where(fechas.day == 4, 1.0, 0.0)})
+    horaria = horaria[horaria["fecha"].dt.day != 8]
+    rachas = _rachas(horaria)[0]
+    assert rachas.startswith("Rachas secas más largas: 3 días (2024-01-01 a 2024-01-03); 3 días (2024-01-05 a 2024-01-07)"), rachas
+    assert "Racha actual: 2 días" in rachas and "3 rachas en total" in rachas, rachas
+    print(rachas)
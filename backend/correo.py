@@ -0,0 +1,450 @@
+import os
+import ssl
+import json
+import time
+import uuid
+import random
+import sqlite3
+import smtplib
+import mimetypes
+import threading
+from email import policy
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from dotenv import load_dotenv
+from backend.estaciones import DATA_DIR
+
+load_dotenv()
+
+# === Bandeja de salida de correo ===
+# Enviar un correo sólo lo deja en la bandeja: el mensaje completo (con adjuntos) se
+# escribe a disco como .eml y su estado vive en SQLite, así que sobrevive reinicios.
+# Hilos de envío en segundo plano mantienen cada uno una conexión SMTP autenticada y
+# la reutilizan entre mensajes (se renueva tras CORREO_MENSAJES_POR_CONEXION envíos o
+# si quedó inactiva). Una lista de distribución se envía como un solo mensaje con los
+# destinatarios en el sobre, de a CORREO_DESTINATARIOS_POR_ENVIO por transacción.
+# Los errores transitorios (desconexión, 4xx) se reintentan con backoff exponencial.
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
+SMTP_SEGURIDAD = os.getenv("SMTP_SEGURIDAD", "ssl" if SMTP_PORT == 465 else "starttls")  # ssl | starttls | ninguna
+SMTP_USER = os.getenv("SMTP_USER") or os.getenv("EMAIL_SENDER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD") or os.getenv("EMAIL_PASSWORD")
+CORREO_REMITENTE = os.getenv("CORREO_REMITENTE") or SMTP_USER
+CORREO_DIR = os.getenv("CORREO_DIR", os.path.join(DATA_DIR, "bandeja_salida"))
+CORREO_CONEXIONES = int(os.getenv("CORREO_CONEXIONES", 2))
+CORREO_MENSAJES_POR_CONEXION = int(os.getenv("CORREO_MENSAJES_POR_CONEXION", 100))
+CORREO_DESTINATARIOS_POR_ENVIO = int(os.getenv("CORREO_DESTINATARIOS_POR_ENVIO", 50))
+CORREO_INACTIVIDAD = float(os.getenv("CORREO_INACTIVIDAD", 60))  # segundos antes de cerrar una conexión ociosa
+CORREO_REINTENTOS = int(os.getenv("CORREO_REINTENTOS", 6))
+CORREO_BACKOFF = float(os.getenv("CORREO_BACKOFF", 5))
+CORREO_RETENCION = float(os.getenv("CORREO_RETENCION", 7 * 24 * 3600))
+SMTP_TIMEOUT = 30
+
+PENDIENTE = "pendiente"
+ENVIANDO = "enviando"
+ENVIADO = "enviado"
+ERROR = "error"
+
+def es_transitorio(e: Exception) -> bool:
+    # 4xx, cortes de conexión y timeouts se reintentan; 5xx y autenticación no
+    if isinstance(e, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(e, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(e, smtplib.SMTPResponseException):
+        return 400 <= e.smtp_code < 500
+    return isinstance(e, OSError)
+
+def construir_mensaje(remitente: str, destinatarios: list, asunto: str, cuerpo: str, adjuntos=()) -> EmailMessage:
+    mensaje = EmailMessage()
+    mensaje["From"] = remitente
+    # Con varios destinatarios no se exponen las direcciones: sólo van en el sobre SMTP
+    mensaje["To"] = destinatarios[0] if len(destinatarios) == 1 else "undisclosed-recipients:;"
+    mensaje["Subject"] = asunto
+    mensaje["Date"] = formatdate(localtime=True)
+    mensaje["Message-ID"] = make_msgid()
+    mensaje.set_content(cuerpo)
+    for adjunto in adjuntos:
+        # Una ruta, o (nombre, bytes) para compartir un adjunto ya leído entre varios mensajes
+        if isinstance(adjunto, tuple):
+            nombre, contenido = adjunto
+        else:
+            nombre = os.path.basename(adjunto)
+            with open(adjunto, "rb") as f:
+                contenido = f.read()
+        tipo = mimetypes.guess_type(nombre)[0] or "application/octet-stream"
+        principal, secundario = tipo.split("/", 1)
+        mensaje.add_attachment(contenido, maintype=principal, subtype=secundario, filename=nombre)
+    return mensaje
+
+class ConexionSMTP:
+    # Una conexión autenticada que se reutiliza; la usa un solo hilo de envío
+    def __init__(self, host=SMTP_HOST, puerto=SMTP_PORT, seguridad=SMTP_SEGURIDAD, usuario=SMTP_USER,
+                 password=SMTP_PASSWORD, max_mensajes=CORREO_MENSAJES_POR_CONEXION, inactividad=CORREO_INACTIVIDAD):
+        self.host, self.puerto, self.seguridad = host, puerto, seguridad
+        self.usuario, self.password = usuario, password
+        self.max_mensajes = max_mensajes
+        self.inactividad = inactividad
+        self.smtp = None
+        self.mensajes = 0
+        self.ultimo_uso = 0.0
+        self.aperturas = 0
+
+    def abrir(self) -> smtplib.SMTP:
+        if self.seguridad == "ssl":
+            smtp = smtplib.SMTP_SSL(self.host, self.puerto, timeout=SMTP_TIMEOUT, context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.puerto, timeout=SMTP_TIMEOUT)
+            if self.seguridad == "starttls":
+                smtp.starttls(context=ssl.create_default_context())
+        try:
+            if self.usuario:
+                smtp.login(self.usuario, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.smtp, self.mensajes, self.ultimo_uso = smtp, 0, time.monotonic()
+        self.aperturas += 1
+        return smtp
+
+    def obtener(self) -> smtplib.SMTP:
+        if self.smtp is not None and (self.mensajes >= self.max_mensajes
+                                      or time.monotonic() - self.ultimo_uso > self.inactividad):
+            self.cerrar()
+        elif self.smtp is not None and time.monotonic() - self.ultimo_uso > 5:
+            # Tras unos segundos sin uso el servidor pudo haber cortado: NOOP antes de confiar en ella
+            try:
+                if self.smtp.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected()
+            except (smtplib.SMTPException, OSError):
+                self.descartar()
+        return self.smtp or self.abrir()
+
+    def usada(self):
+        self.mensajes += 1
+        self.ultimo_uso = time.monotonic()
+
+    def cerrar_si_inactiva(self):
+        if self.smtp is not None and time.monotonic() - self.ultimo_uso > self.inactividad:
+            self.cerrar()
+
+    def cerrar(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self.smtp.close()
+            self.smtp = None
+
+    def descartar(self):
+        # Tras un error de transporte la conexión no es confiable: se cierra sin QUIT
+        if self.smtp is not None:
+            self.smtp.close()
+            self.smtp = None
+
+class BandejaSalida:
+    def __init__(self, directorio: str = CORREO_DIR, remitente: str = CORREO_REMITENTE, hilos: int = CORREO_CONEXIONES,
+                 destinatarios_por_envio: int = CORREO_DESTINATARIOS_POR_ENVIO, reintentos: int = CORREO_REINTENTOS,
+                 backoff: float = CORREO_BACKOFF, retencion: float = CORREO_RETENCION, **conexion):
+        self.directorio = directorio
+        self.remitente = remitente
+        self.hilos = hilos
+        self.destinatarios_por_envio = destinatarios_por_envio
+        self.reintentos = reintentos
+        self.backoff = backoff
+        self.retencion = retencion
+        self.conexion = conexion  # argumentos de ConexionSMTP (host, puerto, seguridad, usuario, password...)
+        self._db = None
+        self._lock = threading.Lock()
+        self._aviso = threading.Condition(self._lock)
+        self._detener = False
+        self._trabajadores = []
+        self._conexiones = []
+        self.contadores = {"transacciones_smtp": 0, "reintentos": 0}
+
+    def _abrir_db(self):
+        if self._db is None:
+            os.makedirs(self.directorio, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.directorio, "bandeja.db"), check_same_thread=False)
+            # WAL: encolar no espera a que los hilos de envío terminen de escribir su estado
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS mensajes (id TEXT PRIMARY KEY, destinatarios TEXT, pendientes TEXT, "
+                "rechazados TEXT, asunto TEXT, estado TEXT, intentos INTEGER, proximo REAL, error TEXT, "
+                "creado REAL, enviado REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS mensajes_cola ON mensajes (estado, proximo)")
+            # Lo que quedó a medio enviar cuando se detuvo el proceso vuelve a la cola
+            self._db.execute("UPDATE mensajes SET estado = ? WHERE estado = ?", (PENDIENTE, ENVIANDO))
+            self._db.commit()
+        return self._db
+
+    def iniciar(self):
+        with self._lock:
+            if self._trabajadores:
+                return
+            self._abrir_db()
+            self._detener = False
+            for i in range(self.hilos):
+                conexion = ConexionSMTP(**self.conexion)
+                hilo = threading.Thread(target=self._atender, args=(conexion,), name=f"correo-{i}", daemon=True)
+                self._conexiones.append(conexion)
+                self._trabajadores.append(hilo)
+                hilo.start()
+
+    def encolar(self, destinatarios, asunto: str, cuerpo: str, adjuntos=()) -> str:
+        # Devuelve el id del mensaje en cuanto queda persistido; el envío ocurre en segundo plano
+        destinatarios = [destinatarios] if isinstance(destinatarios, str) else list(dict.fromkeys(destinatarios))
+        if not destinatarios:
+            raise ValueError("El correo necesita al menos un destinatario.")
+        if not self.remitente:
+            raise ValueError("No hay remitente: define CORREO_REMITENTE, SMTP_USER o EMAIL_SENDER.")
+        self.iniciar()
+        id_mensaje = uuid.uuid4().hex
+        mensaje = construir_mensaje(self.remitente, destinatarios, asunto, cuerpo, adjuntos)
+        temporal = os.path.join(self.directorio, f"{id_mensaje}.eml.tmp")
+        with open(temporal, "wb") as f:
+            # Ya con CRLF: sendmail no corrige los fines de línea de un mensaje en bytes
+            f.write(mensaje.as_bytes(policy=policy.SMTP))
+        os.replace(temporal, self._ruta(id_mensaje))
+        with self._aviso:
+            self._db.execute(
+                "INSERT INTO mensajes VALUES (?, ?, ?, '{}', ?, ?, 0, ?, NULL, ?, NULL)",
+                (id_mensaje, json.dumps(destinatarios), json.dumps(destinatarios), asunto, PENDIENTE, time.time(), time.time()),
+            )
+            self._db.commit()
+            self._aviso.notify()
+        return id_mensaje
+
+    def _ruta(self, id_mensaje: str) -> str:
+        return os.path.join(self.directorio, f"{id_mensaje}.eml")
+
+    def _reclamar(self):
+        # Toma el próximo mensaje vencido; si no hay, espera un aviso o hasta el próximo reintento
+        with self._aviso:
+            while not self._detener:
+                ahora = time.time()
+                fila = self._db.execute(
+                    "SELECT id, destinatarios, pendientes, rechazados, intentos FROM mensajes WHERE estado = ? AND proximo <= ? "
+                    "ORDER BY proximo LIMIT 1", (PENDIENTE, ahora),
+                ).fetchone()
+                if fila:
+                    self._db.execute("UPDATE mensajes SET estado = ? WHERE id = ?", (ENVIANDO, fila[0]))
+                    self._db.commit()
+                    return fila
+                proximo = self._db.execute("SELECT MIN(proximo) FROM mensajes WHERE estado = ?", (PENDIENTE,)).fetchone()[0]
+                espera = CORREO_INACTIVIDAD if proximo is None else min(max(proximo - ahora, 0.01), CORREO_INACTIVIDAD)
+                if not self._aviso.wait(espera):
+                    return None
+            return None
+
+    def _actualizar(self, id_mensaje: str, **campos):
+        with self._lock:
+            asignaciones = ", ".join(f"{campo} = ?" for campo in campos)
+            self._db.execute(f"UPDATE mensajes SET {asignaciones} WHERE id = ?", (*campos.values(), id_mensaje))
+            self._db.commit()
+
+    def _atender(self, conexion: ConexionSMTP):
+        while True:
+            fila = self._reclamar()
+            if self._detener:
+                return
+            if fila is None:
+                conexion.cerrar_si_inactiva()
+                self._purgar()
+                continue
+            self._entregar(conexion, *fila)
+
+    def _entregar(self, conexion: ConexionSMTP, id_mensaje: str, destinatarios: str, pendientes: str, rechazados: str,
+                  intentos: int):
+        destinatarios, pendientes, rechazados = json.loads(destinatarios), json.loads(pendientes), json.loads(rechazados)
+        try:
+            with open(self._ruta(id_mensaje), "rb") as f:
+                datos = f.read()
+            while pendientes:
+                grupo = pendientes[:self.destinatarios_por_envio]
+                smtp = conexion.obtener()
+                try:
+                    refusados = smtp.sendmail(self.remitente, grupo, datos)
+                except smtplib.SMTPRecipientsRefused as e:
+                    # Ningún destinatario del grupo fue aceptado: si es permanente, se registra y se sigue
+                    if any(400 <= codigo < 500 for codigo, _ in e.recipients.values()):
+                        raise smtplib.SMTPResponseException(451, "Destinatarios rechazados temporalmente.")
+                    refusados = e.recipients
+                    smtp.rset()
+                finally:
+                    conexion.usada()
+                self.contadores["transacciones_smtp"] += 1
+                rechazados.update({d: f"{codigo} {respuesta.decode(errors='replace') if isinstance(respuesta, bytes) else respuesta}"
+                                   for d, (codigo, respuesta) in refusados.items()})
+                # El avance se guarda por grupo: un reintento no reenvía a quien ya lo recibió
+                pendientes = pendientes[len(grupo):]
+                self._actualizar(id_mensaje, pendientes=json.dumps(pendientes), rechazados=json.dumps(rechazados))
+        except Exception as e:
+            if isinstance(e, (smtplib.SMTPServerDisconnected, OSError)):
+                conexion.descartar()
+            if es_transitorio(e) and intentos < self.reintentos:
+                self.contadores["reintentos"] += 1
+                # Backoff exponencial con jitter completo
+                espera = random.uniform(0, self.backoff * 2 ** intentos)
+                self._actualizar(id_mensaje, estado=PENDIENTE, intentos=intentos + 1, proximo=time.time() + espera, error=str(e))
+            else:
+                self._actualizar(id_mensaje, estado=ERROR, intentos=intentos + 1, error=str(e))
+            return
+        # Con que un destinatario lo haya aceptado el mensaje cuenta como enviado; los rechazos quedan registrados
+        self._actualizar(id_mensaje, estado=ERROR if len(rechazados) == len(destinatarios) else ENVIADO,
+                         intentos=intentos + 1, enviado=time.time(),
+                         error=f"Rechazados: {', '.join(rechazados)}" if rechazados else None)
+
+    def _purgar(self):
+        # Los mensajes terminados (entregados o en error definitivo) se conservan CORREO_RETENCION
+        # segundos (estado consultable) y luego se borran con su .eml. Un error sin entrega no tiene
+        # "enviado": cuenta desde el último intento programado (proximo) o desde su creación.
+        limite = time.time() - self.retencion
+        with self._lock:
+            ids = [fila[0] for fila in self._db.execute(
+                "SELECT id FROM mensajes WHERE estado IN (?, ?) AND COALESCE(enviado, proximo, creado) < ?",
+                (ENVIADO, ERROR, limite))]
+            for id_mensaje in ids:
+                if os.path.exists(self._ruta(id_mensaje)):
+                    os.remove(self._ruta(id_mensaje))
+                self._db.execute("DELETE FROM mensajes WHERE id = ?", (id_mensaje,))
+            self._db.commit()
+
+    def estado(self, id_mensaje: str):
+        with self._lock:
+            fila = self._abrir_db().execute(
+                "SELECT id, destinatarios, rechazados, asunto, estado, intentos, proximo, error, creado, enviado "
+                "FROM mensajes WHERE id = ?", (id_mensaje,),
+            ).fetchone()
+        if fila is None:
+            return None
+        claves = ("id", "destinatarios", "rechazados", "asunto", "estado", "intentos", "proximo", "error", "creado", "enviado")
+        resultado = dict(zip(claves, fila))
+        resultado["destinatarios"] = json.loads(resultado["destinatarios"])
+        resultado["rechazados"] = json.loads(resultado["rechazados"])
+        return resultado
+
+    def esperar(self, id_mensaje: str, timeout: float = 60) -> dict:
+        limite = time.monotonic() + timeout
+        while True:
+            resultado = self.estado(id_mensaje)
+            if resultado is None or resultado["estado"] in (ENVIADO, ERROR) or time.monotonic() > limite:
+                return resultado
+            time.sleep(0.02)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            por_estado = dict(self._abrir_db().execute("SELECT estado, COUNT(*) FROM mensajes GROUP BY estado").fetchall())
+        return {
+            **self.contadores,
+            "por_estado": por_estado,
+            "hilos": len(self._trabajadores),
+            "conexiones_abiertas": sum(1 for c in self._conexiones if c.smtp is not None),
+            "aperturas_conexion": sum(c.aperturas for c in self._conexiones),
+        }
+
+    def cerrar(self, timeout: float = 5):
+        with self._aviso:
+            self._detener = True
+            self._aviso.notify_all()
+        for hilo in self._trabajadores:
+            hilo.join(timeout)
+        for conexion in self._conexiones:
+            conexion.cerrar()
+        self._trabajadores, self._conexiones = [], []
+
+bandeja_salida = BandejaSalida()
+
+def enviar_correo_con_adjunto(destinatario, asunto, cuerpo, archivo_adjunto) -> str:
+    # Deja el correo en la bandeja de salida y devuelve su id; no espera al servidor SMTP
+    return bandeja_salida.encolar(destinatario, asunto, cuerpo, adjuntos=[archivo_adjunto])
+
+# === Verificación contra un SMTP local: pip install aiosmtpd; python -m backend.correo [mensajes] [saludo_ms] ===
+# Compara una conexión nueva por correo (el camino anterior) con la bandeja de salida,
+# envía una lista de distribución y comprueba los reintentos ante respuestas 451.
+# saludo_ms simula lo que cuesta abrir una sesión real (TCP + TLS + AUTH) en el EHLO.
+if __name__ == "__main__":
+    import sys
+    import asyncio
+    import tempfile
+    from aiosmtpd.controller import Controller
+
+    class Servidor:
+        # Cuenta conexiones (EHLO/HELO), transacciones y destinatarios; puede rechazar con 451
+        def __init__(self, saludo: float):
+            self.saludo = saludo
+            self.conexiones = self.transacciones = self.destinatarios = 0
+            self.fallar_proximas = 0
+
+        async def handle_EHLO(self, server, session, envelope, hostname, responses):
+            self.conexiones += 1
+            await asyncio.sleep(self.saludo)
+            session.host_name = hostname
+            return responses
+
+        async def handle_DATA(self, server, session, envelope):
+            if self.fallar_proximas:
+                self.fallar_proximas -= 1
+                return "451 4.3.0 Intente más tarde"
+            self.transacciones += 1
+            self.destinatarios += len(envelope.rcpt_tos)
+            return "250 OK"
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    servidor = Servidor(float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.15)
+    controlador = Controller(servidor, hostname="127.0.0.1", port=8025)
+    controlador.start()
+    smtp_local = {"host": "127.0.0.1", "puerto": 8025, "seguridad": "ninguna", "usuario": None}
+    adjunto = os.path.join(tempfile.mkdtemp(), "reporte_sequia.pdf")
+    with open(adjunto, "wb") as f:
+        f.write(b"%PDF-1.4\n" + os.urandom(150_000))
+
+    try:
+        # 1. Camino anterior: construir, conectar, enviar y cerrar dentro de la petición
+        latencias = []
+        inicio = time.perf_counter()
+        for i in range(n):
+            t = time.perf_counter()
+            mensaje = construir_mensaje("reportes@localhost", [f"u{i}@ejemplo.com"], "Reporte", "Adjunto", [adjunto])
+            with smtplib.SMTP("127.0.0.1", 8025) as smtp:
+                smtp.send_message(mensaje)
+            latencias.append(time.perf_counter() - t)
+        directo = time.perf_counter() - inicio
+        print(f"conexión por correo: petición p50 {sorted(latencias)[n // 2] * 1000:6.1f} ms | "
+              f"{n} entregados en {directo:.2f} s | {servidor.conexiones} conexiones")
+
+        # 2. Bandeja: encolar es lo que espera la petición; la entrega reutiliza conexiones
+        servidor.conexiones = servidor.transacciones = 0
+        bandeja = BandejaSalida(tempfile.mkdtemp(), "reportes@localhost", backoff=0.05, **smtp_local)
+        ids, latencias = [], []
+        inicio = time.perf_counter()
+        for i in range(n):
+            t = time.perf_counter()
+            ids.append(bandeja.encolar(f"u{i}@ejemplo.com", "Reporte", "Adjunto", [adjunto]))
+            latencias.append(time.perf_counter() - t)
+        estados = [bandeja.esperar(id_mensaje)["estado"] for id_mensaje in ids]
+        total = time.perf_counter() - inicio
+        assert estados.count(ENVIADO) == n, estados
+        print(f"bandeja de salida:   petición p50 {sorted(latencias)[n // 2] * 1000:6.1f} ms | "
+              f"{n} entregados en {total:.2f} s | {servidor.conexiones} conexiones")
+
+        # 3. Lista de distribución: un mensaje, destinatarios en el sobre por grupos
+        servidor.transacciones = servidor.destinatarios = 0
+        lista = [f"suscriptor{i}@ejemplo.com" for i in range(230)]
+        resultado = bandeja.esperar(bandeja.encolar(lista, "Boletín", "Adjunto", [adjunto]))
+        assert resultado["estado"] == ENVIADO and servidor.destinatarios == len(lista)
+        print(f"lista de {len(lista)}: {servidor.transacciones} transacciones SMTP "
+              f"({bandeja.destinatarios_por_envio} destinatarios por envío)")
+
+        # 4. Errores transitorios: dos 451 seguidos se reintentan con backoff y el correo sale
+        servidor.fallar_proximas = 2
+        resultado = bandeja.esperar(bandeja.encolar("reintento@ejemplo.com", "Reporte", "Adjunto"))
+        assert resultado["estado"] == ENVIADO and resultado["intentos"] == 3, resultado
+        print(f"451 x2: enviado al intento {resultado['intentos']}")
+        print(bandeja.estadisticas())
+        bandeja.cerrar()
+    finally:
+        controlador.stop()
@@ -0,0 +1,217 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+import httpx
+
+# === Enrutamiento entre proveedores LLM ===
+# Cada proveedor lleva una ventana de latencias y resultados recientes (p50/p95 y tasa
+# de error) y un circuit breaker: tras varios fallos seguidos deja de recibir tráfico
+# durante un enfriamiento y luego se prueba con una sola petición (semiabierto).
+# Una petición va primero al proveedor pedido, reintenta con backoff exponencial los
+# errores transitorios (timeouts, 429, 5xx) y, si no hay caso, pasa al otro proveedor.
+# Con la cobertura activa, si el primero tarda más que su p95 se lanza la misma
+# petición al segundo y gana la primera respuesta válida.
+# Un lote de prompts se intenta en una sola llamada de lista (si el proveedor la admite)
+# con los mismos reintentos y circuit breaker; si falla, cada prompt sigue el camino normal.
+
+ENRUTADOR_REINTENTOS = int(os.getenv("ENRUTADOR_REINTENTOS", 2))
+ENRUTADOR_BACKOFF = float(os.getenv("ENRUTADOR_BACKOFF", 0.25))
+ENRUTADOR_COBERTURA = os.getenv("ENRUTADOR_COBERTURA", "1") == "1"
+CIRCUITO_FALLOS = int(os.getenv("CIRCUITO_FALLOS", 5))
+CIRCUITO_ENFRIAMIENTO = float(os.getenv("CIRCUITO_ENFRIAMIENTO", 30))
+VENTANA_METRICAS = 200
+MIN_MUESTRAS_COBERTURA = 20
+
+CERRADO, ABIERTO, SEMIABIERTO = "cerrado", "abierto", "semiabierto"
+
+class ErrorProveedor(RuntimeError):
+    # Respuesta HTTP no exitosa de un proveedor; conserva el código para decidir si reintentar
+    def __init__(self, status: int, detalle: str):
+        super().__init__(f"{status} {detalle}")
+        self.status = status
+
+class SinProveedoresError(RuntimeError):
+    pass
+
+def es_transitorio(e: Exception) -> bool:
+    if isinstance(e, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    status = getattr(e, "status", None)
+    if status is None and isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+    return status is not None and (status == 429 or status >= 500)
+
+class EstadoProveedor:
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.latencias = deque(maxlen=VENTANA_METRICAS)   # segundos, sólo respuestas exitosas
+        self.resultados = deque(maxlen=VENTANA_METRICAS)  # True = éxito
+        self.fallos_seguidos = 0
+        self.circuito = CERRADO
+        self.abierto_hasta = 0.0
+        self.sonda_en_vuelo = False
+        self.contadores = {"exitos": 0, "errores": 0, "aperturas": 0, "coberturas": 0, "reintentos": 0,
+                           "lotes_fallidos": 0}
+
+    def percentil(self, q: float):
+        if not self.latencias:
+            return None
+        ordenadas = sorted(self.latencias)
+        return ordenadas[min(int(q * len(ordenadas)), len(ordenadas) - 1)]
+
+    def disponible(self) -> bool:
+        if self.circuito == ABIERTO and time.monotonic() >= self.abierto_hasta:
+            self.circuito = SEMIABIERTO
+        if self.circuito == SEMIABIERTO:
+            # Una sola petición de prueba a la vez
+            return not self.sonda_en_vuelo
+        return self.circuito == CERRADO
+
+    def iniciar(self):
+        if self.circuito == SEMIABIERTO:
+            self.sonda_en_vuelo = True
+
+    def exito(self, latencia: float = None):
+        if latencia is not None:
+            self.latencias.append(latencia)
+        self.resultados.append(True)
+        self.contadores["exitos"] += 1
+        self.fallos_seguidos = 0
+        self.circuito, self.sonda_en_vuelo = CERRADO, False
+
+    def fallo(self):
+        self.resultados.append(False)
+        self.contadores["errores"] += 1
+        self.fallos_seguidos += 1
+        if self.circuito == SEMIABIERTO or self.fallos_seguidos >= CIRCUITO_FALLOS:
+            if self.circuito != ABIERTO:
+                self.contadores["aperturas"] += 1
+            self.circuito, self.sonda_en_vuelo = ABIERTO, False
+            self.abierto_hasta = time.monotonic() + CIRCUITO_ENFRIAMIENTO
+
+    def cancelado(self):
+        # Petición abandonada (perdió la carrera de cobertura): no cuenta como éxito ni fallo
+        self.sonda_en_vuelo = False
+
+    def resumen(self) -> dict:
+        p50, p95 = self.percentil(0.5), self.percentil(0.95)
+        return {
+            "circuito": self.circuito,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "tasa_error": round(self.resultados.count(False) / len(self.resultados), 4) if self.resultados else 0.0,
+            "muestras": len(self.resultados),
+            **self.contadores,
+        }
+
+class Enrutador:
+    def __init__(self, proveedores: dict, reintentos: int = ENRUTADOR_REINTENTOS,
+                 backoff: float = ENRUTADOR_BACKOFF, cobertura: bool = ENRUTADOR_COBERTURA, respaldos=None):
+        self.proveedores = proveedores  # nombre -> async fn(prompt) -> str
+        self.respaldos = tuple(respaldos) if respaldos is not None else tuple(proveedores)  # a cuáles se conmuta
+        self.reintentos = reintentos
+        self.backoff = backoff
+        self.cobertura = cobertura
+        self.estados = {nombre: EstadoProveedor(nombre) for nombre in proveedores}
+
+    def orden(self, preferido: str) -> list:
+        # El preferido primero; los de circuito abierto quedan fuera
+        candidatos = [preferido] + [p for p in self.respaldos if p != preferido]
+        return [p for p in candidatos if self.estados[p].disponible()]
+
+    async def _llamar(self, proveedor: str, prompt, funcion=None):
+        # funcion: otra forma de llamar al mismo proveedor (p. ej. la de lista); cuenta para su circuito
+        estado = self.estados[proveedor]
+        estado.iniciar()
+        inicio = time.perf_counter()
+        try:
+            respuesta = await (funcion or self.proveedores[proveedor])(prompt)
+        except asyncio.CancelledError:
+            estado.cancelado()
+            raise
+        except Exception:
+            estado.fallo()
+            raise
+        # La latencia de un lote no es la de un prompt: no entra en p50/p95 (ni en la cobertura)
+        estado.exito(None if funcion else time.perf_counter() - inicio)
+        return respuesta
+
+    async def _con_reintentos(self, proveedor: str, prompt, funcion=None):
+        for intento in range(self.reintentos + 1):
+            try:
+                return await self._llamar(proveedor, prompt, funcion)
+            except Exception as e:
+                if not es_transitorio(e) or intento == self.reintentos or not self.estados[proveedor].disponible():
+                    raise
+            # Backoff exponencial con jitter completo
+            self.estados[proveedor].contadores["reintentos"] += 1
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** intento))
+
+    async def _con_cobertura(self, primero: str, segundo: str, prompt: str, intentados: set) -> tuple:
+        principal = asyncio.ensure_future(self._con_reintentos(primero, prompt))
+        origen, pendientes, error = {principal: primero}, {principal}, None
+        try:
+            hechos, pendientes = await asyncio.wait(pendientes, timeout=self.estados[primero].percentil(0.95))
+            if not hechos and self.estados[segundo].disponible():
+                # El primero ya superó su p95: se cubre con el segundo y gana la primera respuesta válida
+                self.estados[primero].contadores["coberturas"] += 1
+                intentados.add(segundo)
+                respaldo = asyncio.ensure_future(self._con_reintentos(segundo, prompt))
+                origen[respaldo] = segundo
+                pendientes.add(respaldo)
+            while True:
+                for tarea in hechos:
+                    if tarea.exception() is None:
+                        return tarea.result(), origen[tarea]
+                    error = error or tarea.exception()
+                if not pendientes:
+                    raise error
+                hechos, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
+
+    async def completar(self, prompt: str, preferido: str) -> tuple:
+        # Devuelve (respuesta, proveedor que respondió); si todos fallan, relanza el último error
+        orden = self.orden(preferido)
+        if not orden:
+            raise SinProveedoresError("Todos los proveedores tienen el circuito abierto.")
+        primero, resto = orden[0], orden[1:]
+        usar_cobertura = (self.cobertura and resto
+                          and len(self.estados[primero].latencias) >= MIN_MUESTRAS_COBERTURA)
+        error, intentados = None, {primero}
+        try:
+            if usar_cobertura:
+                return await self._con_cobertura(primero, resto[0], prompt, intentados)
+            return await self._con_reintentos(primero, prompt), primero
+        except Exception as e:
+            error = e
+        # Conmutación por error: los proveedores restantes, en orden
+        for proveedor in resto:
+            if proveedor in intentados or not self.estados[proveedor].disponible():
+                continue
+            try:
+                return await self._con_reintentos(proveedor, prompt), proveedor
+            except Exception as e:
+                error = e
+        raise error
+
+    async def completar_lote(self, prompts: list, preferido: str, lotes: dict = None) -> list:
+        # lotes: nombre -> async fn(lista de prompts) -> lista de respuestas, para los proveedores
+        # que aceptan listas. Devuelve [(respuesta, proveedor) o la excepción] en el orden de prompts.
+        lote = (lotes or {}).get(preferido)
+        if lote and len(prompts) > 1 and self.estados[preferido].disponible():
+            try:
+                return [(respuesta, preferido) for respuesta in await self._con_reintentos(preferido, prompts, lote)]
+            except Exception:
+                # El lote falló (o el endpoint no admite listas): reintentos y conmutación por prompt
+                self.estados[preferido].contadores["lotes_fallidos"] += 1
+        return await asyncio.gather(*(self.completar(p, preferido) for p in prompts), return_exceptions=True)
+
+    def estado(self) -> dict:
+        return {nombre: estado.resumen() for nombre, estado in self.estados.items()}
+
+    def reiniciar(self):
+        self.estados = {nombre: EstadoProveedor(nombre) for nombre in self.proveedores}
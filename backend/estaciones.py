@@ -0,0 +1,72 @@
+import os
+import re
+import json
+import threading
+
+# === Registro de estaciones ===
+# Las estaciones se descubren a partir de los CSV de data/ con la nomenclatura de INAMHI
+# "<código>-<nombre>_<variable>-<frecuencia>.csv" (p. ej. C20-Calderón_Precipitación-Diario.csv).
+# data/estaciones.json permite añadir metadatos o registrar archivos con otro nombre.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(BASE_DIR, "data"))
+ESTACION_PREDETERMINADA = os.getenv("ESTACION_PREDETERMINADA", "C20")
+
+_PATRON_ARCHIVO = re.compile(r"^(?P<codigo>[^-_]+)-(?P<nombre>[^_]+)_(?P<variable>[^-]+)-(?P<frecuencia>[^.]+)\.csv$")
+
+class EstacionNoEncontradaError(KeyError):
+    pass
+
+class RegistroEstaciones:
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        self._estaciones = {}
+        self._firma = None
+        self._lock = threading.Lock()
+
+    def _firma_directorio(self):
+        try:
+            return os.stat(self.directorio).st_mtime_ns
+        except OSError:
+            return None
+
+    def _descubrir(self) -> dict:
+        estaciones = {}
+        if os.path.isdir(self.directorio):
+            for archivo in sorted(os.listdir(self.directorio)):
+                coincidencia = _PATRON_ARCHIVO.match(archivo)
+                if coincidencia:
+                    datos = coincidencia.groupdict()
+                    datos["ruta_csv"] = os.path.join(self.directorio, archivo)
+                    estaciones[datos["codigo"]] = datos
+
+        ruta_json = os.path.join(self.directorio, "estaciones.json")
+        if os.path.exists(ruta_json):
+            with open(ruta_json, encoding="utf-8") as f:
+                for codigo, metadatos in json.load(f).items():
+                    entrada = estaciones.setdefault(codigo, {"codigo": codigo})
+                    entrada.update(metadatos)
+                    if not os.path.isabs(entrada.get("ruta_csv", "")):
+                        entrada["ruta_csv"] = os.path.join(self.directorio, entrada.get("ruta_csv", ""))
+        return estaciones
+
+    def _actualizar(self):
+        # Se vuelve a escanear sólo si cambió el contenido del directorio de datos
+        firma = self._firma_directorio()
+        with self._lock:
+            if firma != self._firma or not self._estaciones:
+                self._estaciones = self._descubrir()
+                self._firma = firma
+
+    def listar(self) -> list:
+        self._actualizar()
+        return list(self._estaciones.values())
+
+    def obtener(self, codigo: str = None) -> dict:
+        self._actualizar()
+        codigo = codigo or ESTACION_PREDETERMINADA
+        if codigo not in self._estaciones:
+            raise EstacionNoEncontradaError(f"Estación desconocida: {codigo}")
+        return self._estaciones[codigo]
+
+registro_estaciones = RegistroEstaciones(DATA_DIR)
@@ -1,192 +1,230 @@
-import pandas as pd
-import pdfkit
 import os
 from datetime import datetime
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import shutil
-import smtplib
-from email.message import EmailMessage
 from dotenv import load_dotenv
-import requests
+from backend.analysis import cargar_estacion, spi, rachas_secas
+from backend import contexto_llm, render_pdf
+from backend import graficos as modulo_graficos
+from backend.indicadores import motor_indicadores
+from backend.almacen import almacen_estacion
+from backend.estaciones import registro_estaciones
+from backend.cache_reportes import CacheReportes
+from backend.correo import enviar_correo_con_adjunto
+from backend.pipeline_reporte import Seccion, ejecutar_secciones, REPORTE_ETAPA_SEGUNDOS
+from backend.chatbot import responder_lote, HF_API_URL
+from backend.metricas import registro, cronometrar
 
 # Cargar variables de entorno
 load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_PATH = os.path.join(BASE_DIR, "data", "C20-Calderón_Precipitación-Diario.csv")
-WKHTMLTOPDF_PATH = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
 
-HF_API_TOKEN = os.getenv("HF_API_TOKEN")
-HF_API_URL = "https://api-inference.huggingface.co/models/HuggingFaceH4/zephyr-7b-beta"  # Cambia "tu-modelo" por el modelo que usas
+# Cache de artefactos (gráficos, análisis IA y PDF) por huella de datos + plantilla + modelo
+cache_reportes = CacheReportes(
+    os.getenv("REPORTES_CACHE_DIR", os.path.join(BASE_DIR, "cache_reportes")),
+    max_bytes=int(os.getenv("REPORTES_CACHE_MAX_MB", 200)) * 1024 * 1024,
+)
 
-headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
+REPORTES_TOTAL = registro.contador("reportes_total", "Reportes pedidos según cómo terminaron.", ("resultado",))
 
+# Los análisis pasan por el enrutador del chatbot (reintentos, circuit breaker y
+# conmutación de proveedor); el lote usa la llamada de lista de Hugging Face y, si
+# falla, cada prompt sigue por separado. Los errores vuelven como texto por sección.
 def analizar_grafico_con_huggingface(prompt):
-    payload = {"inputs": prompt}
+    return responder_lote({"analisis": prompt}, modelo="zephyr")["analisis"]
+
+def analizar_graficos_con_huggingface(prompts: dict) -> dict:
+    return responder_lote(prompts, modelo="zephyr")
+
+# === Secciones del reporte ===
+def _dias_sin_agua_por_anio(df):
+    return df[df["valor"] == 0].groupby(df["fecha"].dt.year.rename("año")).size()
+
+def _serie_temporal(df):
+    return df[["fecha", "valor"]]
+
+def _spi_3_12(df):
+    return spi(df, escalas=(3, 12))
+
+SECCIONES_PREDETERMINADAS = [
+    Seccion(
+        "dias_sin_agua_anio",
+        "🟦 Días sin disponibilidad de agua por año",
+        datos=_dias_sin_agua_por_anio,
+        grafico="dias_sin_agua_anio",
+        prompt=lambda serie, _, estacion: (
+            f"Analiza la siguiente información: número de días sin agua por año en {estacion.get('nombre', 'Calderón')}.\n"
+            f"{serie.tail(15).to_string()}"
+            + (f"\n(Últimos 15 de {len(serie)} años; media histórica {serie.mean():.1f} días por año.)" if len(serie) > 15 else "")
+        ),
+    ),
+    Seccion(
+        "variacion_disponibilidad",
+        "🟩 Variación de disponibilidad de agua en el tiempo",
+        datos=_serie_temporal,
+        grafico="variacion_temporal",
+        prompt=lambda serie, _, estacion: (
+            f"Analiza la siguiente serie temporal de disponibilidad de agua (valor del indicador) para {estacion.get('nombre', 'Calderón')}. "
+            f"Resumen estadístico de toda la serie:\n{contexto_llm.resumir_serie(serie)}"
+        ),
+    ),
+    Seccion(
+        "spi",
+        "🟥 Índice Estandarizado de Precipitación (SPI-3 y SPI-12)",
+        datos=_spi_3_12,
+        grafico="spi",
+        prompt=lambda indices, _, estacion: (
+            f"Analiza el SPI a 3 y 12 meses de {estacion.get('nombre', 'Calderón')} "
+            f"(valores <= -1 indican sequía moderada y <= -2 extrema).\n"
+            f"{indices.tail(12).round(2).to_string()}"
+        ),
+    ),
+]
+
+def generar_reporte_pdf(*args, **kwargs):
+    # Mismos parámetros que _generar_reporte_pdf; la generación completa es el tramo raíz "reporte"
+    with cronometrar(REPORTE_ETAPA_SEGUNDOS, "total", nombre_tramo="reporte"):
+        return _generar_reporte_pdf(*args, **kwargs)
+
+def _generar_reporte_pdf(nombre_archivo="reporte_sequia.pdf", correo_destino=None, directorio_trabajo=None, progreso=None,
+                         secciones=None, estacion=None, desde=None, hasta=None):
+    # progreso(porcentaje, etapa) permite a la cola de trabajos informar el avance
+    def avanzar(porcentaje, etapa):
+        if progreso:
+            progreso(porcentaje, etapa)
+
+    if directorio_trabajo and not os.path.isabs(nombre_archivo):
+        nombre_archivo = os.path.join(directorio_trabajo, nombre_archivo)
+    secciones = secciones or SECCIONES_PREDETERMINADAS
     try:
-        response = requests.post(HF_API_URL, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        # Según el modelo, la respuesta puede variar en formato:
-        # puede ser lista con dicts que contienen 'generated_text'
-        if isinstance(data, list) and len(data) > 0 and "generated_text" in data[0]:
-            return data[0]["generated_text"].strip()
-        elif isinstance(data, dict) and "generated_text" in data:
-            return data["generated_text"].strip()
-        else:
-            # Si es texto plano o diferente
-            return str(data).strip()
-    except Exception as e:
-        return f"⚠️ Error al generar análisis IA Hugging Face: {e}"
-
-def enviar_correo_con_adjunto(destinatario, asunto, cuerpo, archivo_adjunto):
-    remitente = os.getenv("EMAIL_SENDER")
-    password = os.getenv("EMAIL_PASSWORD")
-
-    if not remitente or not password:
-        print("❌ ERROR: No se encontró EMAIL_SENDER o EMAIL_PASSWORD en las variables de entorno.")
+        estacion = registro_estaciones.obtener(estacion)
+    except KeyError as e:
+        print(f"❌ {e}")
+        REPORTES_TOTAL.incrementar("error")
         return False
 
-    msg = EmailMessage()
-    msg["Subject"] = asunto
-    msg["From"] = remitente
-    msg["To"] = destinatario
-    msg.set_content(cuerpo)
-
-    try:
-        with open(archivo_adjunto, "rb") as f:
-            msg.add_attachment(f.read(), maintype="application", subtype="pdf", filename=os.path.basename(archivo_adjunto))
-    except Exception as e:
-        print(f"❌ Error al adjuntar archivo: {e}")
+    # El contenido se arma en este módulo, los gráficos en graficos y la plantilla en render_pdf: sus hashes invalidan la cache
+    clave = cache_reportes.clave(
+        estacion["codigo"],
+        cache_reportes.hash_archivo(estacion["ruta_csv"]) if os.path.exists(estacion["ruta_csv"]) else None,
+        almacen_estacion(estacion["codigo"]).version(),  # cambia con la telemetría anexada
+        str(desde), str(hasta),
+        cache_reportes.hash_archivo(os.path.abspath(__file__)),
+        cache_reportes.hash_archivo(os.path.abspath(modulo_graficos.__file__)),
+        cache_reportes.hash_archivo(os.path.abspath(render_pdf.__file__)),
+        render_pdf.REPORTE_PDF_MOTOR,
+        cache_reportes.hash_archivo(os.path.abspath(contexto_llm.__file__)),
+        contexto_llm.PRESUPUESTO_TOKENS_CONTEXTO,
+        HF_API_URL,
+        [(sec.id, sec.titulo) for sec in secciones],
+    )
+    en_cache = cache_reportes.obtener(clave)
+    if en_cache:
+        try:
+            with cronometrar(REPORTE_ETAPA_SEGUNDOS, "cache", nombre_tramo="reporte.cache"):
+                shutil.copyfile(os.path.join(en_cache["directorio"], "reporte.pdf"), nombre_archivo)
+        except OSError as e:
+            # La entrada se desalojó entre obtener() y la copia: se construye de nuevo
+            print(f"⚠️ Entrada de cache desalojada durante la lectura ({e}); se genera el reporte")
+            en_cache = None
+    if en_cache:
+        avanzar(80, "Reporte recuperado de la cache")
+        REPORTES_TOTAL.incrementar("cache")
+        print(f"✅ Reporte servido desde la cache: {nombre_archivo}")
+    elif not _construir_reporte(nombre_archivo, avanzar, clave, secciones, estacion, desde, hasta):
+        REPORTES_TOTAL.incrementar("error")
         return False
+    else:
+        REPORTES_TOTAL.incrementar("generado")
 
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(remitente, password)
-            smtp.send_message(msg)
-        print("✅ Correo enviado correctamente.")
-        return True
-    except smtplib.SMTPAuthenticationError as e:
-        error_msg = e.smtp_error.decode() if e.smtp_error else str(e)
-        print(f"❌ Error de autenticación SMTP: {e.smtp_code} - {error_msg}")
-        return False
-    except Exception as e:
-        print(f"❌ Error al enviar correo: {e}")
-        return False
+    if correo_destino:
+        avanzar(95, "Encolando correo")
+        try:
+            with cronometrar(REPORTE_ETAPA_SEGUNDOS, "correo", nombre_tramo="reporte.correo"):
+                id_correo = enviar_correo_con_adjunto(
+                    destinatario=correo_destino,
+                    asunto=f"Reporte de Sequía - {estacion.get('nombre', estacion['codigo'])}",
+                    cuerpo="Adjunto el reporte generado con análisis automático de los gráficos 📊",
+                    archivo_adjunto=nombre_archivo
+                )
+        except ValueError as e:
+            print(f"❌ {e}")
+            REPORTES_TOTAL.incrementar("error_correo")
+            return False
+        print(f"✅ Correo en la bandeja de salida: {id_correo}")
+
+    return True
 
-def generar_reporte_pdf(nombre_archivo="reporte_sequia.pdf", correo_destino=None):
+def _construir_reporte(nombre_archivo, avanzar, clave, secciones, estacion, desde, hasta):
+    avanzar(5, "Cargando datos")
     try:
-        df = pd.read_csv(DATA_PATH, parse_dates=["fecha"])
+        with cronometrar(REPORTE_ETAPA_SEGUNDOS, "carga", nombre_tramo="reporte.carga"):
+            df = cargar_estacion(estacion["codigo"], desde, hasta)
+            indicadores = motor_indicadores.resumen(estacion["codigo"], desde, hasta)
     except Exception as e:
         print(f"❌ Error al cargar el CSV: {e}")
         return False
+    if df.empty:
+        print("❌ No hay datos para la estación y el rango solicitados.")
+        return False
 
-    total_dias = len(df)
-    dias_sin_agua = len(df[df["valor"] == 0])
-    porcentaje_sin_agua = round((dias_sin_agua / total_dias) * 100, 2) if total_dias > 0 else 0
-    fiabilidad = 0
-    if "completo_mediciones" in df.columns and "completo_umbral" in df.columns:
-        fiabilidad = round((df["completo_mediciones"] >= df["completo_umbral"]).sum() / total_dias * 100, 2)
+    total_dias = indicadores["total_dias"]
+    dias_sin_agua = indicadores["dias_sin_agua"]
+    porcentaje_sin_agua = round(indicadores["porcentaje_sin_agua"], 2)
+    fiabilidad = indicadores["fiabilidad"] or 0
+    rachas = rachas_secas(df)
     fecha_inicio = df["fecha"].min().strftime("%Y-%m-%d")
     fecha_fin = df["fecha"].max().strftime("%Y-%m-%d")
 
-    # 📊 Gráficos
-    temp_dir = os.path.join(BASE_DIR, "temp_figs")
-    os.makedirs(temp_dir, exist_ok=True)
-
+    # 📊 Gráficos como PNG en memoria (vuelven del pool de procesos como bytes)
     try:
-        df["año"] = df["fecha"].dt.year
-        dias_sin_agua_por_año = df[df["valor"] == 0].groupby("año").size()
-
-        # Gráfico 1: barras
-        plt.figure(figsize=(8, 4))
-        dias_sin_agua_por_año.plot(kind="bar", color="darkblue")
-        plt.title("Días sin disponibilidad de agua por año")
-        plt.xlabel("Año")
-        plt.ylabel("Días sin agua")
-        plt.tight_layout()
-        grafico1_path = os.path.join(temp_dir, "dias_sin_agua_anio.png")
-        plt.savefig(grafico1_path)
-        plt.close()
-
-        analisis1 = analizar_grafico_con_huggingface(
-            "Analiza la siguiente información: número de días sin agua por año en la parroquia Calderón.\n"
-            f"{dias_sin_agua_por_año.to_string()}"
-        )
-
-        # Gráfico 2: línea de tiempo
-        plt.figure(figsize=(8, 4))
-        plt.plot(df["fecha"], df["valor"], color="green")
-        plt.title("Variación de disponibilidad de agua en el tiempo")
-        plt.xlabel("Fecha")
-        plt.ylabel("Valor indicador")
-        plt.tight_layout()
-        grafico2_path = os.path.join(temp_dir, "variacion_disponibilidad.png")
-        plt.savefig(grafico2_path)
-        plt.close()
-
-        analisis2 = analizar_grafico_con_huggingface(
-            "Analiza la siguiente serie temporal de disponibilidad de agua (valor del indicador) para Calderón.\n"
-            f"{df[['fecha','valor']].tail(20).to_string(index=False)}"
-        )
-
-        grafico1_url = f"file:///{os.path.abspath(grafico1_path).replace(os.sep, '/')}"
-        grafico2_url = f"file:///{os.path.abspath(grafico2_path).replace(os.sep, '/')}"
-
+        avanzar(15, "Generando gráficos y análisis IA")
+        with cronometrar(REPORTE_ETAPA_SEGUNDOS, "secciones", nombre_tramo="reporte.secciones"):
+            graficos, analisis = ejecutar_secciones(
+                secciones, df, analizar_grafico_con_huggingface,
+                progreso=lambda fraccion, etapa: avanzar(15 + int(fraccion * 60), etapa),
+                estacion=estacion,
+                analizar_lote=analizar_graficos_con_huggingface,
+            )
     except Exception as e:
         print(f"❌ Error generando gráficos: {e}")
         return False
 
-    # 📄 HTML del reporte
-    html = f"""<!DOCTYPE html>
-    <html lang="es">
-    <head><meta charset="UTF-8"><title>Reporte Sequía</title></head>
-    <body>
-    <h1>Reporte de Sequía - Parroquia Calderón 💧</h1>
-    <p><strong>Fecha:</strong> {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
-    <p><strong>Período:</strong> {fecha_inicio} a {fecha_fin}</p>
-    <h2>📌 Resumen</h2>
-    <ul>
-        <li>Total días: {total_dias}</li>
-        <li>Días sin agua: {dias_sin_agua}</li>
-        <li>Porcentaje sin agua: {porcentaje_sin_agua}%</li>
-        <li>Fiabilidad: {fiabilidad}%</li>
-    </ul>
-    <h2>📈 Gráficos y Análisis</h2>
-
-    <h3>🟦 Días sin disponibilidad de agua por año</h3>
-    <img src="{grafico1_url}" width="600"/>
-    <p><strong>Análisis IA:</strong> {analisis1}</p>
-
-    <h3>🟩 Variación de disponibilidad de agua en el tiempo</h3>
-    <img src="{grafico2_url}" width="600"/>
-    <p><strong>Análisis IA:</strong> {analisis2}</p>
-
-    </body>
-    </html>
-    """
-
-    config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
-    options = {"enable-local-file-access": '', 'quiet': ''}
-
+    contenido = {
+        "titulo": f"Reporte de Sequía - {estacion.get('nombre', estacion['codigo'])} ({estacion['codigo']}) 💧",
+        "metadatos": {
+            "Fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "Período": f"{fecha_inicio} a {fecha_fin}",
+        },
+        "resumen": [
+            f"Total días: {total_dias}",
+            f"Días sin agua: {dias_sin_agua}",
+            f"Porcentaje sin agua: {porcentaje_sin_agua}%",
+            f"Fiabilidad: {fiabilidad}%",
+            f"Racha seca más larga: {rachas['racha_seca_max']} días",
+            f"Racha seca actual: {rachas['racha_seca_actual']} días",
+        ],
+        "secciones": [
+            {"titulo": seccion.titulo, "png": graficos.get(seccion.id), "analisis": analisis.get(seccion.id)}
+            for seccion in secciones
+        ],
+    }
+
+    avanzar(80, "Generando PDF")
     try:
-        pdfkit.from_string(html, nombre_archivo, configuration=config, options=options)
+        with cronometrar(REPORTE_ETAPA_SEGUNDOS, "pdf", nombre_tramo="reporte.pdf"):
+            pdf = render_pdf.renderizar(contenido)
+            with open(nombre_archivo, "wb") as f:
+                f.write(pdf)
         print(f"✅ Reporte generado correctamente: {nombre_archivo}")
-        shutil.rmtree(temp_dir)
+        # No se guardan en cache reportes con análisis fallidos
+        if not any(a and a.startswith("⚠️ Error") for a in analisis.values()):
+            archivos = {f"{id_seccion}.png": png for id_seccion, png in graficos.items()}
+            cache_reportes.guardar(clave, {"reporte.pdf": pdf, **archivos}, {"analisis": analisis})
     except Exception as e:
         print(f"❌ Error al generar PDF: {e}")
         return False
 
-    if correo_destino:
-        return enviar_correo_con_adjunto(
-            destinatario=correo_destino,
-            asunto="Reporte de Sequía - Calderón",
-            cuerpo="Adjunto el reporte generado con análisis automático de los gráficos 📊",
-            archivo_adjunto=nombre_archivo
-        )
-
     return True
 
 # 🧪 Prueba manual
@@ -0,0 +1,240 @@
+import io
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import matplotlib.dates as mdates
+
+# === Gráficos en memoria con figuras reutilizables ===
+# Cada tipo de gráfico tiene una plantilla: figura, ejes, títulos, líneas de referencia
+# y artistas de datos se crean una sola vez por proceso. Para dibujar sólo se cambian
+# los datos de esos artistas (set_data, barras nuevas) y se escribe a un BytesIO en PNG
+# o SVG. Se usa la API orientada a objetos (sin pyplot), con un lock por plantilla.
+# Los resultados se memorizan por huella de los datos: el reporte y la API
+# (/graficos/{tipo}) comparten la cache y no redibujan un gráfico que no cambió.
+
+FORMATOS = {"png": "image/png", "svg": "image/svg+xml"}
+GRAFICOS_CACHE_MB = int(os.getenv("GRAFICOS_CACHE_MB", 64))
+TAMANO = (8, 4)
+DPI = 100
+
+class _Plantilla:
+    titulo = xlabel = ylabel = ""
+
+    def __init__(self):
+        self.figura = Figure(figsize=TAMANO, dpi=DPI)
+        FigureCanvasAgg(self.figura)
+        self.ejes = self.figura.add_subplot()
+        self.ejes.set_title(self.titulo)
+        self.ejes.set_xlabel(self.xlabel)
+        self.ejes.set_ylabel(self.ylabel)
+        self.figura.subplots_adjust(left=0.09, right=0.98, top=0.9, bottom=0.2)
+        self.lock = threading.Lock()
+        self.construir()
+
+    def construir(self):
+        pass
+
+    def actualizar(self, datos):
+        raise NotImplementedError
+
+    def renderizar(self, datos, formato: str = "png") -> bytes:
+        with self.lock:
+            self.actualizar(datos)
+            buffer = io.BytesIO()
+            self.figura.savefig(buffer, format=formato)
+            return buffer.getvalue()
+
+class DiasSinAguaPorAnio(_Plantilla):
+    titulo, xlabel, ylabel = "Días sin disponibilidad de agua por año", "Año", "Días sin agua"
+
+    def construir(self):
+        self.barras = None
+
+    def actualizar(self, serie: pd.Series):
+        # El número de barras cambia con los años: se reemplaza sólo el contenedor de barras
+        if self.barras is not None:
+            self.barras.remove()
+        posiciones = np.arange(len(serie))
+        self.barras = self.ejes.bar(posiciones, serie.to_numpy(), color="darkblue", width=0.5)
+        self.ejes.set_xticks(posiciones, [str(anio) for anio in serie.index], rotation=90)
+        self.ejes.set_xlim(-0.5, max(len(serie), 1) - 0.5)
+        self.ejes.relim()
+        self.ejes.autoscale_view(scalex=False)
+
+class VariacionTemporal(_Plantilla):
+    titulo, xlabel, ylabel = "Variación de disponibilidad de agua en el tiempo", "Fecha", "Valor indicador"
+
+    def construir(self):
+        self.ejes.xaxis_date()
+        (self.linea,) = self.ejes.plot([], [], color="green")
+
+    def actualizar(self, df: pd.DataFrame):
+        self.linea.set_data(mdates.date2num(df["fecha"].to_numpy(dtype="datetime64[ns]")), df["valor"].to_numpy(dtype=float))
+        self.ejes.relim()
+        self.ejes.autoscale_view()
+
+class IndiceSPI(_Plantilla):
+    titulo, xlabel, ylabel = "Índice Estandarizado de Precipitación (SPI)", "Fecha", "SPI"
+    COLORES = ("orange", "darkred", "purple", "black")
+
+    def construir(self):
+        self.ejes.xaxis_date()
+        self.ejes.axhline(0, color="gray", linewidth=0.8)
+        self.ejes.axhline(-1, color="red", linestyle="--", linewidth=0.8)
+        self.ejes.axhline(-2, color="darkred", linestyle=":", linewidth=0.8)
+        self.lineas = [self.ejes.plot([], [], color=color)[0] for color in self.COLORES]
+        self.etiquetas = None
+
+    def actualizar(self, spi_mensual: pd.DataFrame):
+        fechas = mdates.date2num(spi_mensual.index.to_timestamp().to_numpy())
+        columnas = list(spi_mensual.columns)[:len(self.lineas)]
+        for i, linea in enumerate(self.lineas):
+            visible = i < len(columnas)
+            linea.set_visible(visible)
+            if visible:
+                linea.set_data(fechas, spi_mensual[columnas[i]].to_numpy(dtype=float))
+                linea.set_label(columnas[i].replace("_", "-").upper())
+        # La leyenda sólo se rehace si cambian las series
+        if columnas != self.etiquetas:
+            self.ejes.legend(handles=self.lineas[:len(columnas)])
+            self.etiquetas = columnas
+        self.ejes.relim(visible_only=True)
+        self.ejes.autoscale_view()
+
+PLANTILLAS = {
+    "dias_sin_agua_anio": DiasSinAguaPorAnio,
+    "variacion_temporal": VariacionTemporal,
+    "spi": IndiceSPI,
+}
+
+_instancias = {}
+_lock_instancias = threading.Lock()
+
+def _plantilla(tipo: str) -> _Plantilla:
+    # Una instancia por tipo y por proceso (los workers del pool conservan las suyas)
+    with _lock_instancias:
+        if tipo not in _instancias:
+            _instancias[tipo] = PLANTILLAS[tipo]()
+        return _instancias[tipo]
+
+def dibujar(tipo: str, datos, formato: str = "png") -> bytes:
+    # Sin cache: es lo que corre en los procesos del pool
+    if tipo not in PLANTILLAS:
+        raise ValueError(f"Gráfico desconocido: {tipo}. Opciones: {', '.join(PLANTILLAS)}")
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato}. Opciones: {', '.join(FORMATOS)}")
+    return _plantilla(tipo).renderizar(datos, formato)
+
+def huella(tipo: str, datos, formato: str = "png") -> str:
+    sha = hashlib.sha256(f"{tipo}|{formato}|{TAMANO}|{DPI}".encode("utf-8"))
+    sha.update(pd.util.hash_pandas_object(datos, index=True).to_numpy().tobytes())
+    sha.update(repr(getattr(datos, "columns", getattr(datos, "name", None))).encode("utf-8"))
+    return sha.hexdigest()
+
+class CacheGraficos:
+    # LRU por bytes de imágenes ya dibujadas, indexada por huella de los datos
+    def __init__(self, max_bytes: int = GRAFICOS_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.contadores = {"hits": 0, "misses": 0}
+
+    def obtener(self, clave: str):
+        with self._lock:
+            imagen = self._entradas.get(clave)
+            if imagen is None:
+                self.contadores["misses"] += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.contadores["hits"] += 1
+            return imagen
+
+    def guardar(self, clave: str, imagen: bytes):
+        with self._lock:
+            if clave in self._entradas:
+                return
+            self._entradas[clave] = imagen
+            self._bytes += len(imagen)
+            while self._bytes > self.max_bytes and self._entradas:
+                self._bytes -= len(self._entradas.popitem(last=False)[1])
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {**self.contadores, "entradas": len(self._entradas), "bytes": self._bytes}
+
+cache_graficos = CacheGraficos()
+
+def renderizar(tipo: str, datos, formato: str = "png") -> tuple:
+    # Devuelve (huella, imagen); la huella sirve también como ETag
+    clave = huella(tipo, datos, formato)
+    imagen = cache_graficos.obtener(clave)
+    if imagen is None:
+        imagen = dibujar(tipo, datos, formato)
+        cache_graficos.guardar(clave, imagen)
+    return clave, imagen
+
+# === Benchmark: python -m backend.graficos [repeticiones] ===
+# Tiempo y memoria asignada por gráfico: figura nueva con pyplot (como antes) vs plantilla reutilizada
+if __name__ == "__main__":
+    import sys
+    import time
+    import tracemalloc
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from backend.analysis import spi
+
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = np.random.default_rng(0)
+    fechas = pd.date_range("1995-01-01", periods=30 * 365, freq="D")
+    df = pd.DataFrame({"fecha": fechas, "valor": np.where(rng.random(len(fechas)) < 0.4, 0, rng.gamma(0.8, 5, len(fechas)))})
+    casos = {
+        "dias_sin_agua_anio": df[df["valor"] == 0].groupby(df["fecha"].dt.year.rename("año")).size(),
+        "variacion_temporal": df[["fecha", "valor"]],
+        "spi": spi(df, escalas=(3, 12)),
+    }
+
+    def pyplot_nueva(tipo, datos, formato):
+        # El camino anterior: figura nueva por gráfico, tight_layout y cierre
+        plt.figure(figsize=TAMANO)
+        if tipo == "dias_sin_agua_anio":
+            datos.plot(kind="bar", color="darkblue")
+        elif tipo == "variacion_temporal":
+            plt.plot(datos["fecha"], datos["valor"], color="green")
+        else:
+            for columna in datos.columns:
+                plt.plot(datos.index.to_timestamp(), datos[columna], label=columna)
+            plt.legend()
+        plt.tight_layout()
+        buffer = io.BytesIO()
+        plt.savefig(buffer, format=formato)
+        plt.close()
+        return buffer.getvalue()
+
+    def medir(funcion, *args):
+        funcion(*args)  # Calentamiento (la plantilla se construye aquí)
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            imagen = funcion(*args)
+        duracion = (time.perf_counter() - inicio) / repeticiones
+        # La memoria se mide en una pasada aparte: tracemalloc distorsiona los tiempos
+        tracemalloc.start()
+        funcion(*args)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return duracion, pico, len(imagen)
+
+    print(f"{'gráfico':>20} {'formato':>7} | {'pyplot nueva':>22} | {'plantilla':>22} | {'memo':>9}")
+    for tipo, datos in casos.items():
+        for formato in FORMATOS:
+            nueva = medir(pyplot_nueva, tipo, datos, formato)
+            plantilla = medir(dibujar, tipo, datos, formato)
+            memo = medir(renderizar, tipo, datos, formato)
+            print(f"{tipo:>20} {formato:>7} | {nueva[0] * 1000:7.1f} ms {nueva[1] / 1e6:6.1f} MB pico | "
+                  f"{plantilla[0] * 1000:7.1f} ms {plantilla[1] / 1e6:6.1f} MB pico | {memo[0] * 1000:6.2f} ms")
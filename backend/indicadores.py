@@ -0,0 +1,212 @@
+import threading
+import numpy as np
+import pandas as pd
+from backend.almacen import almacen_estacion
+from backend.estaciones import ESTACION_PREDETERMINADA
+
+# === Motor incremental de indicadores ===
+# Mantiene por estación conteos enteros por (año, mes): total de días, días sin agua
+# y días con mediciones completas. Un día es una fecha, tenga una lectura (CSV diario)
+# o muchas (telemetría): es sin agua si todas sus lecturas son 0 y completo si alguna
+# cumple el umbral. Se guarda el estado de cada día para que las lecturas de un día ya
+# contado sólo corrijan sus marcas. Añadir lecturas cuesta O(filas nuevas) y los
+# resúmenes se responden sumando meses, sin volver a recorrer la historia. Como los
+# conteos son exactos, los resultados coinciden con calcular_indicadores.
+# Sólo los meses parcialmente cubiertos por un rango [desde, hasta] se leen del almacén.
+
+COLUMNAS = ["fecha", "valor", "completo_mediciones", "completo_umbral"]
+
+def _dias(df: pd.DataFrame) -> tuple:
+    # (día como entero desde 1970-01-01, seco, completo) por fecha distinta
+    dias, inverso = np.unique(
+        df["fecha"].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64), return_inverse=True
+    )
+    lluvia = np.bincount(inverso, weights=(df["valor"] != 0).to_numpy(), minlength=len(dias)) > 0
+    if {"completo_mediciones", "completo_umbral"}.issubset(df.columns):
+        cumple = (df["completo_mediciones"] >= df["completo_umbral"]).to_numpy()
+        completo = np.bincount(inverso, weights=cumple, minlength=len(dias)) > 0
+    else:
+        completo = np.zeros(len(dias), dtype=bool)
+    return dias, ~lluvia, completo
+
+def _mes(dia: int) -> tuple:
+    mes = int(np.datetime64(dia, "D").astype("datetime64[M]").astype(np.int64))
+    return mes // 12 + 1970, mes % 12 + 1
+
+def _conteos(dias: np.ndarray, secos: np.ndarray, completos: np.ndarray) -> dict:
+    # (año, mes) -> [total, sin_agua, completos] de días distintos
+    meses, inverso = np.unique(dias.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64), return_inverse=True)
+    totales = np.bincount(inverso, minlength=len(meses))
+    sin_agua = np.bincount(inverso, weights=secos, minlength=len(meses))
+    con_completos = np.bincount(inverso, weights=completos, minlength=len(meses))
+    return {
+        (int(m) // 12 + 1970, int(m) % 12 + 1): [int(t), int(s), int(c)]
+        for m, t, s, c in zip(meses, totales, sin_agua, con_completos)
+    }
+
+class _EstadoEstacion:
+    def __init__(self):
+        self.meses = {}  # (año, mes) -> [total, sin_agua, completos]
+        self.dias = {}   # día -> (seco, completo)
+        self.tiene_completitud = True
+        self.version = None
+
+    def sumar(self, df: pd.DataFrame):
+        if len(df) == 0:
+            return
+        if not {"completo_mediciones", "completo_umbral"}.issubset(df.columns):
+            self.tiene_completitud = False
+        dias, secos, completos = _dias(df)
+        conocidos = np.fromiter((d in self.dias for d in dias.tolist()), dtype=bool, count=len(dias))
+        # Días nuevos: conteo vectorizado por mes
+        nuevos = ~conocidos
+        for mes, (t, s, c) in _conteos(dias[nuevos], secos[nuevos], completos[nuevos]).items():
+            acumulado = self.meses.setdefault(mes, [0, 0, 0])
+            acumulado[0] += t
+            acumulado[1] += s
+            acumulado[2] += c
+        self.dias.update(zip(dias[nuevos].tolist(), zip(secos[nuevos].tolist(), completos[nuevos].tolist())))
+        # Días ya contados (más lecturas del mismo día): sólo cambian sus marcas
+        for dia, seco, completo in zip(dias[conocidos].tolist(), secos[conocidos].tolist(), completos[conocidos].tolist()):
+            seco_antes, completo_antes = self.dias[dia]
+            seco, completo = seco_antes and seco, completo_antes or completo
+            if (seco, completo) != (seco_antes, completo_antes):
+                acumulado = self.meses[_mes(dia)]
+                acumulado[1] += seco - seco_antes
+                acumulado[2] += completo - completo_antes
+                self.dias[dia] = (seco, completo)
+
+def _resumen(total, sin_agua, completos, tiene_completitud) -> dict:
+    if total == 0:
+        return {"total_dias": 0, "dias_sin_agua": 0, "porcentaje_sin_agua": 0.0, "fiabilidad": None}
+    return {
+        "total_dias": total,
+        "dias_sin_agua": sin_agua,
+        "porcentaje_sin_agua": sin_agua / total * 100,
+        # Mismo redondeo (el de NumPy) que calcular_indicadores para que coincidan exactamente
+        "fiabilidad": float(round(np.float64(completos / total) * 100, 2)) if tiene_completitud else None,
+    }
+
+class MotorIndicadores:
+    def __init__(self, almacenes=almacen_estacion):
+        self.almacenes = almacenes  # código -> AlmacenColumnar
+        self._estaciones = {}
+        self._lock = threading.Lock()
+
+    def _columnas(self, almacen):
+        return [c for c in COLUMNAS if c in almacen.columnas()]
+
+    def _estado(self, estacion: str) -> _EstadoEstacion:
+        # Se reconstruye (un recorrido completo) sólo si el almacén cambió por fuera de agregar()
+        estacion = estacion or ESTACION_PREDETERMINADA
+        almacen = self.almacenes(estacion)
+        version = almacen.version()
+        estado = self._estaciones.get(estacion)
+        if estado is None or estado.version != version:
+            estado = _EstadoEstacion()
+            estado.sumar(almacen.leer(self._columnas(almacen)))
+            estado.version = version
+            self._estaciones[estacion] = estado
+        return estado
+
+    def agregar(self, estacion: str, nuevas: pd.DataFrame, anterior: str, version: str):
+        # Suma lecturas recién anexadas al almacén (de la versión anterior a version) sin
+        # recorrer la historia. Si una consulta ya reconstruyó el estado con ellas, o el
+        # almacén cambió por otra vía, no se suman: la siguiente consulta decide.
+        estacion = estacion or ESTACION_PREDETERMINADA
+        with self._lock:
+            estado = self._estaciones.get(estacion)
+            if estado is None or estado.version != anterior:
+                return
+            estado.sumar(nuevas)
+            estado.version = version
+
+    def invalidar(self, estacion: str = None):
+        with self._lock:
+            if estacion is None:
+                self._estaciones.clear()
+            else:
+                self._estaciones.pop(estacion, None)
+
+    def resumen(self, estacion: str = None, desde=None, hasta=None) -> dict:
+        with self._lock:
+            estado = self._estado(estacion)
+            desde = pd.Timestamp(desde) if desde is not None else None
+            hasta = pd.Timestamp(hasta) if hasta is not None else None
+            mes_desde = (desde.year, desde.month) if desde is not None else None
+            mes_hasta = (hasta.year, hasta.month) if hasta is not None else None
+
+            total = sin_agua = completos = 0
+            parciales = []
+            for mes, (t, s, c) in estado.meses.items():
+                if mes_desde and mes < mes_desde or mes_hasta and mes > mes_hasta:
+                    continue
+                # Meses cortados por el rango: se recuentan desde el almacén
+                if mes == mes_desde and desde != desde.normalize().replace(day=1):
+                    parciales.append(mes)
+                    continue
+                if mes == mes_hasta and hasta < (hasta.normalize().replace(day=1) + pd.offsets.MonthBegin(1) - pd.Timedelta(1, "ns")):
+                    parciales.append(mes)
+                    continue
+                total, sin_agua, completos = total + t, sin_agua + s, completos + c
+
+            if parciales:
+                almacen = self.almacenes(estacion)
+                for anio, mes in parciales:
+                    inicio = max(pd.Timestamp(anio, mes, 1), desde) if desde is not None else pd.Timestamp(anio, mes, 1)
+                    fin_mes = pd.Timestamp(anio, mes, 1) + pd.offsets.MonthBegin(1) - pd.Timedelta(1, "ns")
+                    fin = min(fin_mes, hasta) if hasta is not None else fin_mes
+                    _, secos, con_completos = _dias(almacen.leer(self._columnas(almacen), inicio, fin))
+                    total += len(secos)
+                    sin_agua += int(secos.sum())
+                    completos += int(con_completos.sum())
+
+            return _resumen(total, sin_agua, completos, estado.tiene_completitud)
+
+    def por_anio(self, estacion: str = None) -> dict:
+        with self._lock:
+            estado = self._estado(estacion)
+            anios = {}
+            for (anio, _), (t, s, c) in sorted(estado.meses.items()):
+                acumulado = anios.setdefault(anio, [0, 0, 0])
+                acumulado[0] += t
+                acumulado[1] += s
+                acumulado[2] += c
+            return {anio: _resumen(t, s, c, estado.tiene_completitud) for anio, (t, s, c) in anios.items()}
+
+motor_indicadores = MotorIndicadores()
+
+# 🧪 Verificación: agregados incrementales vs recorrido completo de calcular_indicadores
+if __name__ == "__main__":
+    from backend.analysis import calcular_indicadores, cargar_estacion
+
+    df = cargar_estacion()
+    rng = np.random.default_rng(0)
+    cortes = np.sort(rng.choice(np.arange(1, len(df)), size=min(20, len(df) - 1), replace=False))
+
+    estado = _EstadoEstacion()
+    for parte in np.split(np.arange(len(df)), cortes):
+        estado.sumar(df.iloc[parte])
+        vistas = df.iloc[:parte[-1] + 1]
+        t, s, c = (sum(v[i] for v in estado.meses.values()) for i in range(3))
+        assert _resumen(t, s, c, True) == calcular_indicadores(vistas), "Los agregados no coinciden"
+
+    # Telemetría: varias lecturas por día, repartidas en lotes que cortan días por la mitad
+    horas = pd.date_range("2024-01-01", periods=24 * 90, freq="h")
+    subdiario = pd.DataFrame({
+        "fecha": horas,
+        "valor": np.where(rng.random(len(horas)) < 0.97, 0, 1.5),
+        "completo_mediciones": rng.integers(18, 25, len(horas)),
+        "completo_umbral": 24,
+    })
+    estado = _EstadoEstacion()
+    for parte in np.array_split(np.arange(len(subdiario)), 37):
+        estado.sumar(subdiario.iloc[parte])
+        t, s, c = (sum(v[i] for v in estado.meses.values()) for i in range(3))
+        assert _resumen(t, s, c, True) == calcular_indicadores(subdiario.iloc[:parte[-1] + 1]), "Los días no coinciden"
+    assert t == 90, t
+
+    for desde, hasta in [(None, None), ("2021-03-15", "2022-07-09"), ("2020-01-01", "2020-12-31"), ("2023-02-10", "2023-02-20")]:
+        completo = calcular_indicadores(cargar_estacion(None, desde, hasta))
+        assert motor_indicadores.resumen(None, desde, hasta) == completo, (desde, hasta)
+    print("✅ El motor incremental coincide con calcular_indicadores")
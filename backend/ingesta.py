@@ -0,0 +1,227 @@
+import os
+import time
+import uuid
+import shutil
+import numpy as np
+import pandas as pd
+from backend.almacen import AlmacenColumnar, ALMACEN_DIR
+
+# === Ingesta en streaming de CSV subidos por el usuario ===
+# El archivo se lee por bloques de texto, se valida el esquema con la cabecera y cada
+# bloque se convierte con tipos explícitos. Las filas inválidas se descartan y se
+# informan (número de línea y motivo), las estadísticas se acumulan bloque a bloque
+# y las filas válidas se escriben directo al almacén columnar. Ningún paso guarda el
+# archivo completo en memoria. Los almacenes de subidas se borran pasado SUBIDAS_TTL_S
+# o, si entre todos superan SUBIDAS_MAX_MB, empezando por los más antiguos.
+
+SUBIDAS_DIR = os.getenv("SUBIDAS_DIR", os.path.join(ALMACEN_DIR, "subidas"))
+FILAS_POR_BLOQUE = int(os.getenv("INGESTA_FILAS_POR_BLOQUE", 50_000))
+MAX_ERRORES_INFORME = 100
+SUBIDAS_TTL_S = float(os.getenv("SUBIDAS_TTL_S", 24 * 3600))
+SUBIDAS_MAX_MB = float(os.getenv("SUBIDAS_MAX_MB", 2048))
+SUBIDAS_VIDA_MINIMA_S = 600  # una subida más reciente puede estar escribiéndose
+
+OBLIGATORIAS = ("fecha", "valor")
+OPCIONALES = ("completo_mediciones", "completo_umbral")
+
+class ErrorEsquema(ValueError):
+    pass
+
+class Estadisticas:
+    # Conteo, media y varianza combinadas por bloques (fórmula de Chan et al.), extremos y ceros
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = None
+        self.maximo = None
+        self.ceros = 0
+        self.fecha_min = None
+        self.fecha_max = None
+
+    def actualizar(self, fechas: pd.Series, valores: np.ndarray):
+        n = len(valores)
+        if n == 0:
+            return
+        media = float(valores.mean())
+        m2 = float(((valores - media) ** 2).sum())
+        delta = media - self.media
+        total = self.n + n
+        self.media += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+        self.minimo = float(valores.min()) if self.minimo is None else min(self.minimo, float(valores.min()))
+        self.maximo = float(valores.max()) if self.maximo is None else max(self.maximo, float(valores.max()))
+        self.ceros += int((valores == 0).sum())
+        self.fecha_min = fechas.min() if self.fecha_min is None else min(self.fecha_min, fechas.min())
+        self.fecha_max = fechas.max() if self.fecha_max is None else max(self.fecha_max, fechas.max())
+
+    def a_dict(self) -> dict:
+        return {
+            "filas": self.n,
+            "media": round(self.media, 4) if self.n else None,
+            "desviacion": round((self.m2 / (self.n - 1)) ** 0.5, 4) if self.n > 1 else None,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+            "dias_sin_agua": self.ceros,
+            "porcentaje_sin_agua": round(self.ceros / self.n * 100, 2) if self.n else None,
+            "desde": self.fecha_min.strftime("%Y-%m-%d") if self.fecha_min is not None else None,
+            "hasta": self.fecha_max.strftime("%Y-%m-%d") if self.fecha_max is not None else None,
+        }
+
+def _validar_bloque(bloque: pd.DataFrame, primera_linea: int, opcionales: list):
+    # Convierte tipos de forma vectorizada; devuelve (filas válidas, [(línea, motivo), ...])
+    # ISO 8601: fechas (2024-01-31) o con hora (2024-01-31T10:15); con zona horaria se pasa a UTC sin zona
+    fechas = pd.to_datetime(bloque["fecha"], format="ISO8601", errors="coerce", utc=True).dt.tz_convert(None)
+    valores = pd.to_numeric(bloque["valor"], errors="coerce")
+    motivos = pd.Series(None, index=bloque.index, dtype=object)
+    motivos = motivos.mask(fechas.isna(), "fecha inválida")
+    motivos = motivos.mask(motivos.isna() & valores.isna(), "valor no numérico")
+    limpio = {"fecha": fechas, "valor": valores.astype("float64")}
+    for columna in opcionales:
+        numeros = pd.to_numeric(bloque[columna], errors="coerce")
+        invalido = numeros.isna() | (numeros < 0) | (numeros % 1 != 0)
+        motivos = motivos.mask(motivos.isna() & invalido, f"{columna} inválido")
+        limpio[columna] = numeros
+    validas = motivos.isna().to_numpy()
+    lineas = primera_linea + np.flatnonzero(~validas)
+    errores = list(zip(lineas.tolist(), motivos[~validas].tolist()))
+    df = pd.DataFrame(limpio)[validas]
+    for columna in opcionales:
+        df[columna] = df[columna].astype("int64")
+    return df, errores
+
+def _tamano_mb(directorio: str) -> float:
+    # Los archivos enlazados (hard links) entre versiones se cuentan una vez
+    inodos = {}
+    for raiz, _, archivos in os.walk(directorio):
+        for archivo in archivos:
+            try:
+                estado = os.stat(os.path.join(raiz, archivo))
+            except OSError:
+                continue
+            inodos[(estado.st_dev, estado.st_ino)] = estado.st_size
+    return sum(inodos.values()) / 1024 / 1024
+
+def purgar_subidas(ttl_s: float = SUBIDAS_TTL_S, max_mb: float = SUBIDAS_MAX_MB, directorio: str = SUBIDAS_DIR) -> int:
+    # Borra las subidas vencidas y, si aún se excede max_mb, las más antiguas. Devuelve cuántas borró.
+    try:
+        subidas = [(os.path.getmtime(os.path.join(directorio, n)), os.path.join(directorio, n))
+                   for n in os.listdir(directorio)]
+    except OSError:
+        return 0
+    ahora, borradas = time.time(), 0
+    vigentes = []
+    for modificado, ruta in sorted(subidas):
+        if ahora - modificado > ttl_s:
+            shutil.rmtree(ruta, ignore_errors=True)
+            borradas += 1
+        else:
+            vigentes.append((modificado, ruta, _tamano_mb(ruta)))
+    total = sum(tamano for _, _, tamano in vigentes)
+    for modificado, ruta, tamano in vigentes:
+        if total <= max_mb or ahora - modificado < SUBIDAS_VIDA_MINIMA_S:
+            break
+        shutil.rmtree(ruta, ignore_errors=True)
+        total -= tamano
+        borradas += 1
+    return borradas
+
+def ingerir_csv(archivo, nombre: str = None, filas_por_bloque: int = FILAS_POR_BLOQUE,
+                directorio: str = None) -> dict:
+    # archivo: ruta o binario tipo archivo. Devuelve el informe y el directorio del almacén.
+    if directorio is None:
+        purgar_subidas()
+    directorio = directorio or os.path.join(SUBIDAS_DIR, nombre or uuid.uuid4().hex)
+    # Todo se lee como texto y se convierte después, para poder señalar la fila y el motivo.
+    # Las filas con campos de menos se validan como vacías; las que tienen campos de más
+    # las descarta el parser (y desde ahí los números de línea informados se desplazan).
+    lector = pd.read_csv(archivo, dtype=str, chunksize=filas_por_bloque, keep_default_na=False,
+                         skipinitialspace=True, on_bad_lines="warn")
+    estadisticas = Estadisticas()
+    informe = {"filas_leidas": 0, "filas_invalidas": 0, "errores": []}
+
+    def bloques_validos():
+        primera_linea = 2  # La línea 1 es la cabecera
+        opcionales = None
+        for bloque in lector:
+            bloque.columns = [c.strip() for c in bloque.columns]
+            if opcionales is None:
+                faltantes = [c for c in OBLIGATORIAS if c not in bloque.columns]
+                if faltantes:
+                    raise ErrorEsquema(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+                opcionales = [c for c in OPCIONALES if c in bloque.columns]
+            validas, errores = _validar_bloque(bloque, primera_linea, opcionales)
+            primera_linea += len(bloque)
+            informe["filas_leidas"] += len(bloque)
+            informe["filas_invalidas"] += len(errores)
+            espacio = MAX_ERRORES_INFORME - len(informe["errores"])
+            informe["errores"].extend({"linea": l, "motivo": m} for l, m in errores[:max(espacio, 0)])
+            estadisticas.actualizar(validas["fecha"], validas["valor"].to_numpy())
+            yield validas
+
+    try:
+        AlmacenColumnar(None, directorio).escribir_bloques(bloques_validos())
+    finally:
+        lector.close()
+    informe["estadisticas"] = estadisticas.a_dict()
+    informe["directorio"] = directorio
+    return informe
+
+def almacen_subida(directorio: str) -> AlmacenColumnar:
+    return AlmacenColumnar(None, directorio)
+
+def directorio_subida(id_subida: str) -> str:
+    # Sólo identificadores generados por ingerir_csv (hex); KeyError si no existe o ya se purgó
+    if not id_subida.isalnum() or not os.path.isdir(os.path.join(SUBIDAS_DIR, id_subida)):
+        raise KeyError(f"Subida no encontrada: {id_subida}")
+    return os.path.join(SUBIDAS_DIR, id_subida)
+
+# === Benchmark: python -m backend.ingesta [filas] ===
+def _medir(modo, ruta, directorio, cola):
+    from backend.almacen import _pico_rss_mb
+    base_mb = _pico_rss_mb()
+    if modo == "read_csv":
+        df = pd.read_csv(ruta)
+        df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
+        resultado = {"filas": len(df)}
+    else:
+        resultado = ingerir_csv(ruta, directorio=directorio)
+    cola.put((modo, _pico_rss_mb() - base_mb, resultado))
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    import multiprocessing
+
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "subida.csv")
+        rng = np.random.default_rng(0)
+        fechas = pd.date_range("1970-01-01", periods=filas, freq="15min")
+        for inicio in range(0, filas, FILAS_POR_BLOQUE):
+            n = min(FILAS_POR_BLOQUE, filas - inicio)
+            valores = np.where(rng.random(n) < 0.4, 0, rng.gamma(0.8, 5, n)).round(1).astype(str)
+            valores[(inicio + np.arange(n)) % 10_000 == 0] = "N/D"
+            pd.DataFrame({
+                "fecha": fechas[inicio:inicio + n].strftime("%Y-%m-%dT%H:%M:%S"), "valor": valores,
+                "completo_mediciones": 22, "completo_umbral": 22,
+            }).to_csv(ruta, mode="a", header=inicio == 0, index=False)
+
+        contexto = multiprocessing.get_context("spawn")
+        cola = contexto.Queue()
+        for modo in ("read_csv", "ingesta"):
+            # Cada medición en un proceso nuevo para que el pico de RSS sea comparable
+            proceso = contexto.Process(target=_medir, args=(modo, ruta, os.path.join(tmp, "almacen"), cola))
+            proceso.start()
+            modo, pico_mb, resultado = cola.get()
+            proceso.join()
+            print(f"{modo:>9}: {filas:,} filas ({os.path.getsize(ruta) / 1e6:.0f} MB) | pico RSS +{pico_mb:.0f} MB")
+
+        informe = resultado
+        assert informe["filas_invalidas"] == len(range(0, filas, 10_000)), informe["filas_invalidas"]
+        assert informe["errores"][0] == {"linea": 2, "motivo": "valor no numérico"}
+        leido = almacen_subida(informe["directorio"]).leer(["fecha", "valor"])
+        assert len(leido) == informe["estadisticas"]["filas"] and leido["fecha"].is_monotonic_increasing
+        assert abs(leido["valor"].mean() - informe["estadisticas"]["media"]) < 1e-3
+        print(f"✅ {informe['estadisticas']['filas']:,} filas válidas en el almacén, {informe['filas_invalidas']} inválidas informadas")
@@ -1,11 +1,53 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from fastapi import FastAPI, HTTPException, Query, Header, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
-from backend.chatbot import responder_pregunta
-from backend.generar_reporte import generar_reporte_pdf, enviar_correo_con_adjunto
-from fastapi.responses import FileResponse
+import os
+import json
+import tempfile
+import asyncio
+import pandas as pd
+from backend.chatbot import responder_pregunta_async, responder_lote_async, stream_respuesta, cerrar_cliente, enrutador
+from backend.modelo_local import modelo_local
+from backend.recuperacion import indice_recuperacion, RAG_TOP_K
+from backend.cache import cache_respuestas
+from backend.generar_reporte import SECCIONES_PREDETERMINADAS, cache_reportes
+from backend.correo import bandeja_salida
+from backend.suscripciones import suscripciones, SUSCRIPCIONES_PROGRAMADOR
+from backend.alertas import motor_alertas, TIPOS as TIPOS_ALERTA, UNIDADES as UNIDADES_ALERTA, ALERTAS_ENFRIAMIENTO_S
+from backend.telemetria import ingesta_telemetria, ingerir_lote, FORMATOS as FORMATOS_TELEMETRIA
+from backend.ingesta import ErrorEsquema, ingerir_csv, almacen_subida, directorio_subida
+from backend.trabajos import gestor_trabajos, ColaLlenaError, COMPLETADO
+from backend.pipeline_reporte import cerrar_pool_procesos
+from backend.estaciones import registro_estaciones, EstacionNoEncontradaError
+from backend.analysis import indicadores_estacion, indices_sequia, cargar_estacion
+from backend import graficos
+from backend.muestreo import serie_almacen, etag_serie, serie_json, PUNTOS_GRAFICO, METODOS as METODOS_SERIE
+from backend.almacen import almacen_estacion
+from backend.contexto_llm import resumir_serie
+from backend.agregados import cache_agregados, coincide_etag, BINS_HISTOGRAMA
+from backend.metricas import registro, MiddlewareMetricas
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, PlainTextResponse
 
-app = FastAPI(title="Asistente Sequía Calderón")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if SUSCRIPCIONES_PROGRAMADOR:
+        suscripciones.iniciar()
+    # Reaplica lo que quedó en el WAL después del último checkpoint
+    ingesta_telemetria.iniciar()
+    yield
+    suscripciones.cerrar()
+    ingesta_telemetria.cerrar()
+    # Cerrar el pool de conexiones compartido con los proveedores LLM
+    await cerrar_cliente()
+    gestor_trabajos.cerrar()
+    cerrar_pool_procesos()
+    bandeja_salida.cerrar()
+
+app = FastAPI(title="Asistente Sequía Calderón", lifespan=lifespan)
+
+LOTE_MAX_PROMPTS = 64
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,50 +55,406 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Latencia por endpoint (plantilla de ruta, método y estado) para GET /metrics
+app.add_middleware(MiddlewareMetricas)
+
+# Lo que ya cuentan las caches, la bandeja, la telemetría y las alertas se lee al exportar
+def _consultas_caches() -> dict:
+    respuestas = cache_respuestas.contadores
+    consultas = {
+        ("respuestas", "acierto"): respuestas["hits"] + respuestas["hits_similares"] + respuestas["hits_disco"],
+        ("respuestas", "fallo"): respuestas["misses"],
+    }
+    for nombre, cache in (("graficos", graficos.cache_graficos), ("agregados", cache_agregados), ("reportes", cache_reportes)):
+        consultas[(nombre, "acierto")] = cache.contadores["hits"]
+        consultas[(nombre, "fallo")] = cache.contadores["misses"]
+    return consultas
+
+registro.observada("cache_consultas_total", "Consultas a las caches por resultado.", ("cache", "resultado"),
+                   _consultas_caches, tipo="counter")
+registro.observada("correo_mensajes", "Mensajes en la bandeja de salida por estado.", ("estado",),
+                   lambda: {(estado,): n for estado, n in bandeja_salida.estadisticas()["por_estado"].items()})
+registro.observada("telemetria_filas_total", "Filas de telemetría aceptadas en el WAL y compactadas al almacén.", ("etapa",),
+                   lambda: {("wal",): ingesta_telemetria.contadores["filas"],
+                            ("compactadas",): ingesta_telemetria.contadores["filas_compactadas"]}, tipo="counter")
+registro.observada("alertas_total", "Alertas disparadas según su destino.", ("resultado",),
+                   lambda: {(r,): motor_alertas.contadores[r] for r in ("enviadas", "suprimidas", "errores")}, tipo="counter")
 
 @app.get("/")
-def root():
+async def root():
     return {"mensaje": "API funcionando correctamente"}
 
+@app.get("/metrics")
+def exportar_metricas():
+    # Formato de texto de Prometheus
+    return PlainTextResponse(registro.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # 👇 Ahora aceptamos también el modelo a usar
 class PreguntaInput(BaseModel):
     pregunta: str
-    modelo: str = "openai"  # Por defecto usará OpenAI, pero puede cambiarse a huggingface
+    modelo: str = "openai"  # Por defecto usará OpenAI, pero puede cambiarse a huggingface o local (sin red)
+    recuperar: bool = True  # Anteponer datos de las estaciones relevantes a la pregunta
 
 @app.post("/chatbot")
-def chat_endpoint(input: PreguntaInput):
+async def chat_endpoint(input: PreguntaInput):
     try:
-        respuesta = responder_pregunta(input.pregunta, modelo=input.modelo)
+        respuesta = await responder_pregunta_async(input.pregunta, modelo=input.modelo, recuperar=input.recuperar)
         return {"respuesta": respuesta}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en chatbot: {e}")
 
+class LoteInput(BaseModel):
+    prompts: dict[str, str]  # id (p. ej. sección del reporte) -> prompt
+    modelo: str = "openai"
+
+@app.post("/chatbot/batch")
+async def chat_batch_endpoint(input: LoteInput):
+    # Un lote de prompts con el mínimo de viajes al proveedor; respuestas con las mismas claves
+    if len(input.prompts) > LOTE_MAX_PROMPTS:
+        raise HTTPException(status_code=413, detail=f"Máximo {LOTE_MAX_PROMPTS} prompts por lote.")
+    return {"respuestas": await responder_lote_async(input.prompts, modelo=input.modelo)}
+
+@app.post("/chatbot/stream")
+async def chat_stream_endpoint(input: PreguntaInput):
+    # Server-sent events: un evento por fragmento de texto y un evento final "fin"
+    async def eventos():
+        async for token in stream_respuesta(input.pregunta, modelo=input.modelo, recuperar=input.recuperar):
+            yield f"data: {json.dumps({'token': token}, ensure_ascii=False)}\n\n"
+        yield "event: fin\ndata: {}\n\n"
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/chatbot/cache")
+async def estadisticas_cache():
+    return cache_respuestas.estadisticas()
+
+@app.get("/chatbot/proveedores")
+async def estado_proveedores():
+    # Latencias p50/p95, tasa de error y estado del circuit breaker por proveedor
+    return enrutador.estado()
+
+@app.get("/chatbot/local")
+async def estado_modelo_local():
+    # Carga, lotes y tokens/s del modelo en proceso
+    return modelo_local.estadisticas()
+
+@app.get("/recuperacion")
+def buscar_fragmentos(q: str, k: int = Query(RAG_TOP_K, ge=1, le=50), estacion: str = None):
+    # Los fragmentos que se antepondrían a una pregunta, con su similitud
+    return {"resultados": indice_recuperacion.buscar(q, k, estacion), "indice": indice_recuperacion.estadisticas()}
+
+@app.delete("/chatbot/cache")
+async def limpiar_cache():
+    cache_respuestas.limpiar()
+    return {"mensaje": "Cache vaciada."}
+
+# === Estaciones e indicadores ===
+@app.get("/estaciones")
+def listar_estaciones():
+    return [
+        {k: v for k, v in estacion.items() if k != "ruta_csv"}
+        for estacion in registro_estaciones.listar()
+    ]
+
+@app.get("/indicadores")
+def obtener_indicadores(estacion: str = None, desde: date = None, hasta: date = None):
+    try:
+        return indicadores_estacion(estacion, desde, hasta)
+    except EstacionNoEncontradaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/indicadores/sequia")
+def obtener_indices_sequia(estaciones: list[str] = Query(None), desde: date = None, hasta: date = None):
+    # SPI (1/3/6/12 meses), déficit móvil y rachas secas; sin ?estaciones= se calculan todas
+    try:
+        return indices_sequia(estaciones, desde, hasta)
+    except EstacionNoEncontradaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/agregados/{tipo}")
+def obtener_agregado(tipo: str, estacion: str = None, desde: date = None, hasta: date = None,
+                     bins: int = Query(BINS_HISTOGRAMA, ge=1, le=500),
+                     if_none_match: str = Header(None)):
+    # registros_anio, histograma, resumen, rachas o contexto; precalculados por versión de los datos.
+    # Si el cliente ya tiene la versión vigente se responde 304 sin cuerpo.
+    parametros = {"bins": bins} if tipo == "histograma" else {}
+    try:
+        etag = cache_agregados.etag(tipo, estacion, desde, hasta, **parametros)
+        if coincide_etag(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        etag, resultado = cache_agregados.obtener(tipo, estacion, desde, hasta, **parametros)
+    except EstacionNoEncontradaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(resultado, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.post("/ingest")
+async def ingerir_telemetria(request: Request, estacion: str = None):
+    # Cuerpo NDJSON (una lectura por línea) o Arrow IPC; responde cuando el lote es durable en el WAL
+    tipo = request.headers.get("content-type", "application/x-ndjson").split(";")[0].strip()
+    if tipo not in FORMATOS_TELEMETRIA:
+        raise HTTPException(status_code=415, detail=f"Formato no soportado: {tipo}. Opciones: {', '.join(FORMATOS_TELEMETRIA)}")
+    cuerpo = await request.body()
+    try:
+        return await asyncio.to_thread(ingerir_lote, cuerpo, FORMATOS_TELEMETRIA[tipo], estacion)
+    except ErrorEsquema as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/ingest")
+def estado_telemetria():
+    return ingesta_telemetria.estadisticas()
+
+def _responder_serie(almacen, desde, hasta, puntos: int, metodo: str, if_none_match: str):
+    if metodo not in METODOS_SERIE:
+        raise HTTPException(status_code=400, detail=f"Método de reducción desconocido: {metodo}. Opciones: {', '.join(METODOS_SERIE)}")
+    etag = etag_serie(almacen, desde, hasta, puntos, metodo)
+    if coincide_etag(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    serie = serie_almacen(almacen, desde, hasta, puntos, metodo)
+    return JSONResponse(serie_json(serie), headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.get("/series")
+def obtener_serie(estacion: str = None, desde: datetime = None, hasta: datetime = None,
+                  puntos: int = Query(PUNTOS_GRAFICO, ge=3, le=20000), metodo: str = "lttb",
+                  if_none_match: str = Header(None)):
+    # Serie reducida a ~puntos puntos dentro del rango visible; al hacer zoom se pide un rango menor.
+    # Con el ETag vigente en If-None-Match se responde 304 sin leer ni reducir la serie.
+    try:
+        return _responder_serie(almacen_estacion(estacion), desde, hasta, puntos, metodo, if_none_match)
+    except EstacionNoEncontradaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# === CSV subidos por el usuario ===
+@app.post("/subidas", status_code=201)
+async def subir_csv(request: Request):
+    # Cuerpo: el CSV tal cual (text/csv). Se guarda en un archivo temporal por trozos y se
+    # ingiere por bloques en un hilo; se responde el informe, una muestra y el digesto para el LLM.
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as archivo:
+        async for trozo in request.stream():
+            archivo.write(trozo)
+        archivo.seek(0)
+        try:
+            informe = await asyncio.to_thread(ingerir_csv, archivo)
+        except ErrorEsquema as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except (ValueError, UnicodeDecodeError) as e:
+            raise HTTPException(status_code=400, detail=f"No se pudo leer el archivo: {e}")
+    directorio = informe.pop("directorio")
+    informe["id"] = os.path.basename(directorio)
+    if informe["estadisticas"]["filas"]:
+        almacen = almacen_subida(directorio)
+        muestra = await asyncio.to_thread(almacen.leer, None, None, pd.Timestamp(informe["estadisticas"]["desde"]) + pd.Timedelta(days=31))
+        muestra = muestra.head()
+        muestra["fecha"] = muestra["fecha"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+        informe["muestra"] = muestra.to_dict(orient="records")
+        informe["contexto"] = await asyncio.to_thread(lambda: resumir_serie(almacen.leer(["fecha", "valor"])))
+    return informe
+
+@app.get("/subidas/{id_subida}/series")
+def obtener_serie_subida(id_subida: str, desde: datetime = None, hasta: datetime = None,
+                         puntos: int = Query(PUNTOS_GRAFICO, ge=3, le=20000), metodo: str = "lttb",
+                         if_none_match: str = Header(None)):
+    try:
+        almacen = almacen_subida(directorio_subida(id_subida))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    return _responder_serie(almacen, desde, hasta, puntos, metodo, if_none_match)
+
+@app.get("/graficos")
+def estado_graficos():
+    return {"tipos": list(graficos.PLANTILLAS), "formatos": list(graficos.FORMATOS),
+            "cache": graficos.cache_graficos.estadisticas()}
+
+@app.get("/graficos/{tipo}")
+def obtener_grafico(tipo: str, estacion: str = None, desde: date = None, hasta: date = None,
+                    formato: str = "png", if_none_match: str = Header(None)):
+    # El mismo gráfico del reporte (PNG o SVG), memorizado por huella de los datos
+    seccion = next((s for s in SECCIONES_PREDETERMINADAS if s.grafico == tipo), None)
+    if seccion is None:
+        raise HTTPException(status_code=400, detail=f"Gráfico desconocido: {tipo}. Opciones: {', '.join(graficos.PLANTILLAS)}")
+    if formato not in graficos.FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato desconocido: {formato}. Opciones: {', '.join(graficos.FORMATOS)}")
+    try:
+        datos = seccion.datos(cargar_estacion(estacion, desde, hasta))
+    except EstacionNoEncontradaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    etag = f'"{graficos.huella(tipo, datos, formato)}"'
+    if coincide_etag(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    _, imagen = graficos.renderizar(tipo, datos, formato)
+    return Response(imagen, media_type=graficos.FORMATOS[formato], headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def _validar_estacion(estacion):
+    try:
+        registro_estaciones.obtener(estacion)
+    except EstacionNoEncontradaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def _generar_reporte_en_cola(estacion=None, desde=None, hasta=None):
+    # Los endpoints síncronos reutilizan la cola: pool acotado y directorio aislado por reporte
+    _validar_estacion(estacion)
+    try:
+        trabajo = gestor_trabajos.esperar(gestor_trabajos.enviar(estacion=estacion, desde=desde, hasta=hasta))
+    except ColaLlenaError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return trabajo
+
 @app.get("/reporte")
-def descargar_reporte():
-    nombre_pdf = "reporte_sequia.pdf"
-    exito = generar_reporte_pdf(nombre_pdf)
-    if not exito:
+def descargar_reporte(estacion: str = None, desde: date = None, hasta: date = None):
+    trabajo = _generar_reporte_en_cola(estacion, desde, hasta)
+    if trabajo.estado != COMPLETADO:
         raise HTTPException(status_code=500, detail="Error al generar el reporte")
-    return FileResponse(path=nombre_pdf, filename=nombre_pdf, media_type='application/pdf')
+    return FileResponse(path=trabajo.ruta_pdf, filename="reporte_sequia.pdf", media_type='application/pdf')
+
+# === Trabajos de reporte en segundo plano ===
+@app.post("/reporte/trabajos", status_code=202)
+def crear_trabajo_reporte(estacion: str = None, desde: date = None, hasta: date = None):
+    _validar_estacion(estacion)
+    try:
+        trabajo = gestor_trabajos.enviar(estacion=estacion, desde=desde, hasta=hasta)
+    except ColaLlenaError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return trabajo.a_dict()
+
+def _obtener_trabajo(id_trabajo: str):
+    trabajo = gestor_trabajos.obtener(id_trabajo)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    return trabajo
+
+@app.get("/reporte/trabajos/{id_trabajo}")
+def estado_trabajo_reporte(id_trabajo: str):
+    return _obtener_trabajo(id_trabajo).a_dict()
+
+@app.get("/reporte/trabajos/{id_trabajo}/pdf")
+def descargar_trabajo_reporte(id_trabajo: str):
+    trabajo = _obtener_trabajo(id_trabajo)
+    if trabajo.estado != COMPLETADO:
+        raise HTTPException(status_code=409, detail=f"El reporte aún no está listo ({trabajo.estado}).")
+    return FileResponse(path=trabajo.ruta_pdf, filename="reporte_sequia.pdf", media_type='application/pdf')
 
 class EmailRequest(BaseModel):
     destinatario: EmailStr
+    destinatarios: list[EmailStr] = []  # lista de distribución adicional: un solo mensaje, destinatarios en el sobre
+    estacion: str = None
+    desde: date = None
+    hasta: date = None
 
-@app.post("/reporte/enviar")
+@app.post("/reporte/enviar", status_code=202)
 def generar_y_enviar_reporte(request: EmailRequest):
-    nombre_pdf = "reporte_sequia.pdf"
-    exito = generar_reporte_pdf(nombre_pdf)
-    if not exito:
-        raise HTTPException(status_code=500, detail="No se pudo generar el PDF.")
-
-    enviado = enviar_correo_con_adjunto(
-        destinatario=request.destinatario,
-        asunto="Reporte de Sequía - Calderón",
-        cuerpo="Adjunto encontrarás el reporte de sequía para el sector de Calderón.",
-        archivo_adjunto=nombre_pdf
-    )
+    # Responde en cuanto el trabajo queda en cola; al terminar el PDF, el mismo worker deja el
+    # correo en la bandeja de salida. El id_correo aparece en GET /reporte/trabajos/{id}.
+    _validar_estacion(request.estacion)
+    destinatarios = [request.destinatario, *request.destinatarios]
+
+    def encolar_correo(trabajo):
+        trabajo.actualizar(95, "Encolando correo")
+        trabajo.id_correo = bandeja_salida.encolar(
+            destinatarios,
+            asunto="Reporte de Sequía - Calderón",
+            cuerpo="Adjunto encontrarás el reporte de sequía para el sector de Calderón.",
+            adjuntos=[trabajo.ruta_pdf],
+        )
+
+    try:
+        trabajo = gestor_trabajos.enviar(
+            al_terminar=encolar_correo, estacion=request.estacion, desde=request.desde, hasta=request.hasta
+        )
+    except ColaLlenaError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {
+        "mensaje": "Reporte en cola; el correo se encola al terminar.",
+        **trabajo.a_dict(),
+        "estado_url": f"/reporte/trabajos/{trabajo.id}",
+    }
+
+class SuscripcionInput(BaseModel):
+    correo: EmailStr
+    estacion: str = None
+    frecuencia: str = "semanal"  # diaria | semanal | mensual
+
+@app.post("/suscripciones", status_code=201)
+def crear_suscripcion(request: SuscripcionInput):
+    try:
+        return suscripciones.agregar(request.correo, request.estacion, request.frecuencia)
+    except EstacionNoEncontradaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/suscripciones")
+def listar_suscripciones(estacion: str = None):
+    try:
+        return suscripciones.listar(estacion)
+    except EstacionNoEncontradaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.delete("/suscripciones/{id_suscripcion}")
+def eliminar_suscripcion(id_suscripcion: int):
+    if not suscripciones.eliminar(id_suscripcion):
+        raise HTTPException(status_code=404, detail="Suscripción no encontrada.")
+    return {"mensaje": "Suscripción eliminada."}
+
+@app.get("/suscripciones/envios")
+def historial_envios(limite: int = Query(50, ge=1, le=1000)):
+    return {"estadisticas": suscripciones.estadisticas(), "envios": suscripciones.envios(limite)}
+
+@app.post("/suscripciones/ejecutar")
+def ejecutar_suscripciones():
+    # Distribuye ya lo pendiente del período vigente, sin esperar al programador ni a SUSCRIPCIONES_HORA
+    return suscripciones.ejecutar(forzar=True)
+
+class ReglaAlertaInput(BaseModel):
+    nombre: str
+    destinatarios: list[EmailStr]
+    tipo: str = "racha_seca"  # racha_seca | condicion
+    estacion: str = None  # None: todas las estaciones
+    columna: str = "valor"
+    operador: str = "=="
+    umbral: float = None
+    columna_umbral: str = None  # comparar contra otra columna, p. ej. completo_umbral
+    consecutivos: int = 1  # en la unidad de la regla
+    unidad: str = None  # lecturas | dias; por omisión dias (racha_seca) o lecturas (condicion)
+    enfriamiento_s: float = ALERTAS_ENFRIAMIENTO_S
+
+@app.post("/alertas/reglas", status_code=201)
+def crear_regla_alerta(request: ReglaAlertaInput):
+    try:
+        return motor_alertas.agregar(**request.model_dump())
+    except EstacionNoEncontradaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/alertas/reglas")
+def listar_reglas_alerta():
+    return {"tipos": TIPOS_ALERTA, "unidades": UNIDADES_ALERTA, "reglas": motor_alertas.listar()}
+
+@app.delete("/alertas/reglas/{id_regla}")
+def eliminar_regla_alerta(id_regla: int):
+    if not motor_alertas.eliminar(id_regla):
+        raise HTTPException(status_code=404, detail="Regla no encontrada.")
+    return {"mensaje": "Regla eliminada."}
+
+@app.get("/alertas")
+def historial_alertas(estacion: str = None, limite: int = Query(50, ge=1, le=1000)):
+    try:
+        return {"estadisticas": motor_alertas.estadisticas(), "alertas": motor_alertas.historial(estacion, limite)}
+    except EstacionNoEncontradaError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/correo")
+def estado_bandeja_salida():
+    return bandeja_salida.estadisticas()
 
-    if not enviado:
-        raise HTTPException(status_code=500, detail="No se pudo enviar el correo.")
-    
-    return {"mensaje": "Correo enviado correctamente."}
+@app.get("/correo/{id_correo}")
+def estado_correo(id_correo: str):
+    estado = bandeja_salida.estado(id_correo)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Correo no encontrado.")
+    return estado
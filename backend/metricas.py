@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+import itertools
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+# === Métricas y trazas del proceso ===
+# Contadores e histogramas en memoria, exportados en el formato de texto de Prometheus
+# (GET /metrics). Registrar una observación cuesta un bisect y un lock, sin E/S: se
+# puede dejar en el camino caliente. Los contadores que ya llevan las caches y colas
+# se leen sólo al exportar (observada), sin tocar su código.
+#
+# Trazas: con METRICAS_TRAZAS=ruta.jsonl cada tramo() escribe una línea JSON con su
+# traza, padre y duración; sin la variable, tramo() no hace nada. El tramo en curso
+# viaja en un contextvar, así que se hereda en corutinas y en asyncio.to_thread.
+
+METRICAS_TRAZAS = os.getenv("METRICAS_TRAZAS") or None
+CUBOS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CUBOS_LENTOS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)  # LLM, reportes
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _etiquetas(nombres, valores, extra="") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+def _numero(valor) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class _Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._series = {}  # tupla de valores de etiquetas -> valor
+        self._lock = threading.Lock()
+
+    def exportar(self) -> list:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}", *self._muestras()]
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def incrementar(self, *etiquetas, valor=1):
+        with self._lock:
+            self._series[etiquetas] = self._series.get(etiquetas, 0) + valor
+
+    def valor(self, *etiquetas):
+        return self._series.get(etiquetas, 0)
+
+    def _muestras(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, e)} {_numero(v)}" for e, v in series]
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas=(), cubos=CUBOS_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.cubos = tuple(sorted(cubos))
+
+    def observar(self, valor: float, *etiquetas):
+        indice = bisect.bisect_left(self.cubos, valor)  # primer cubo con le >= valor
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                # Conteo por cubo (el último es +Inf) y la suma al final
+                serie = self._series[etiquetas] = [0] * (len(self.cubos) + 1) + [0.0]
+            serie[indice] += 1
+            serie[-1] += valor
+
+    def medir(self, *etiquetas):
+        return _Cronometro(self, etiquetas)
+
+    def resumen(self, *etiquetas) -> dict:
+        serie = self._series.get(etiquetas)
+        if serie is None:
+            return {"cantidad": 0, "suma": 0.0}
+        return {"cantidad": sum(serie[:-1]), "suma": serie[-1]}
+
+    def _muestras(self):
+        with self._lock:
+            series = sorted((e, list(s)) for e, s in self._series.items())
+        lineas = []
+        for etiquetas, serie in series:
+            acumulado = 0
+            for limite, conteo in zip((*self.cubos, "+Inf"), serie[:-1]):
+                acumulado += conteo
+                le = f'le="{limite}"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, etiquetas, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, etiquetas)} {_numero(serie[-1])}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, etiquetas)} {acumulado}")
+        return lineas
+
+class Observada(_Metrica):
+    # Valores leídos al exportar: funcion() -> {tupla de etiquetas: valor}
+    def __init__(self, nombre: str, ayuda: str, etiquetas, funcion, tipo: str = "gauge"):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+        self.tipo = tipo
+
+    def _muestras(self):
+        try:
+            series = sorted(self.funcion().items())
+        except Exception as e:
+            print(f"❌ Error al leer la métrica {self.nombre}: {e}")
+            return []
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, e)} {_numero(v)}" for e, v in series if v is not None]
+
+class Registro:
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _agregar(self, metrica):
+        # Idempotente por nombre: volver a importar un módulo no duplica la métrica
+        with self._lock:
+            return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def contador(self, nombre: str, ayuda: str, etiquetas=()) -> Contador:
+        return self._agregar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas=(), cubos=CUBOS_SEGUNDOS) -> Histograma:
+        return self._agregar(Histograma(nombre, ayuda, etiquetas, cubos))
+
+    def observada(self, nombre: str, ayuda: str, etiquetas, funcion, tipo: str = "gauge") -> Observada:
+        metrica = Observada(nombre, ayuda, etiquetas, funcion, tipo)
+        with self._lock:
+            self._metricas[nombre] = metrica  # la última función registrada manda
+        return metrica
+
+    def exportar(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas.values())
+        return "\n".join(linea for m in metricas for linea in m.exportar()) + "\n"
+
+registro = Registro()
+
+# === Trazas ===
+_tramo_actual = contextvars.ContextVar("tramo_actual", default=None)
+_ids_tramo = itertools.count(1)
+_prefijo_tramo = uuid.uuid4().hex[:8]
+_archivo_trazas = None
+_lock_trazas = threading.Lock()
+
+def _escribir_tramo(datos: dict):
+    global _archivo_trazas
+    linea = json.dumps(datos, ensure_ascii=False, default=str) + "\n"
+    with _lock_trazas:
+        if _archivo_trazas is None:
+            os.makedirs(os.path.dirname(os.path.abspath(METRICAS_TRAZAS)), exist_ok=True)
+            _archivo_trazas = open(METRICAS_TRAZAS, "a", encoding="utf-8", buffering=1)
+        _archivo_trazas.write(linea)
+
+_SIN_TRAMO = nullcontext()
+
+def tramo(nombre: str, **atributos):
+    # Sin trazas devuelve un contexto vacío compartido: el costo es una llamada
+    if not METRICAS_TRAZAS:
+        return _SIN_TRAMO
+    return _tramo(nombre, atributos)
+
+@contextmanager
+def _tramo(nombre: str, atributos: dict):
+    padre = _tramo_actual.get()
+    datos = {
+        "traza": padre["traza"] if padre else uuid.uuid4().hex[:16],
+        "id": f"{_prefijo_tramo}-{next(_ids_tramo)}",
+        "padre": padre["id"] if padre else None,
+        "nombre": nombre,
+        "inicio": time.time(),
+        **atributos,
+    }
+    token = _tramo_actual.set(datos)
+    inicio = time.perf_counter()
+    try:
+        yield datos
+    except BaseException as e:
+        datos["error"] = type(e).__name__
+        raise
+    finally:
+        datos["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+        _tramo_actual.reset(token)
+        _escribir_tramo(datos)
+
+class _Cronometro:
+    # Context manager de clase (no generador): es el que va en el camino caliente
+    __slots__ = ("histograma", "etiquetas", "tramo", "inicio")
+
+    def __init__(self, histograma, etiquetas, tramo_=_SIN_TRAMO):
+        self.histograma = histograma
+        self.etiquetas = etiquetas
+        self.tramo = tramo_
+
+    def __enter__(self):
+        datos = self.tramo.__enter__()
+        self.inicio = time.perf_counter()
+        return datos
+
+    def __exit__(self, *excepcion):
+        self.histograma.observar(time.perf_counter() - self.inicio, *self.etiquetas)
+        return self.tramo.__exit__(*excepcion)
+
+def cronometrar(histograma: Histograma, *etiquetas, nombre_tramo: str = None, **atributos) -> _Cronometro:
+    # Observa la duración en el histograma y, si hay trazas, abre un tramo con el mismo nombre
+    return _Cronometro(histograma, etiquetas, tramo(nombre_tramo or histograma.nombre, **atributos))
+
+# === Middleware ASGI: latencia por endpoint ===
+HTTP_SEGUNDOS = registro.histograma(
+    "http_solicitud_segundos", "Duración de las solicitudes HTTP hasta enviar la respuesta completa.",
+    ("metodo", "ruta", "estado"),
+)
+
+class MiddlewareMetricas:
+    # ASGI puro (sin BaseHTTPMiddleware): no envuelve el cuerpo ni rompe el streaming.
+    # La ruta es la plantilla del endpoint (/trabajos/{id}), no la URL, para acotar las series.
+    def __init__(self, app, histograma: Histograma = HTTP_SEGUNDOS, excluir=("/metrics",)):
+        self.app = app
+        self.histograma = histograma
+        self.excluir = set(excluir)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluir:
+            return await self.app(scope, receive, send)
+        estado = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        try:
+            with tramo("http", metodo=scope["method"], url=scope["path"]) as datos:
+                await self.app(scope, receive, enviar)
+                if datos is not None:
+                    datos["estado"] = estado[0]
+        finally:
+            ruta = getattr(scope.get("route"), "path", None) or "sin_ruta"
+            self.histograma.observar(time.perf_counter() - inicio, scope["method"], ruta, str(estado[0]))
+
+# === Benchmark: python -m backend.metricas ===
+# Costo por observación, por incremento y por tramo (con y sin trazas) y una muestra del formato.
+if __name__ == "__main__":
+    import tempfile
+    n = 200_000
+    prueba = Registro()
+    histograma = prueba.histograma("prueba_segundos", "Prueba.", ("etapa",))
+    contador = prueba.contador("prueba_total", "Prueba.", ("resultado",))
+
+    def costo(funcion) -> float:
+        inicio = time.perf_counter()
+        for _ in range(n):
+            funcion()
+        return (time.perf_counter() - inicio) / n * 1e9
+
+    def con_cronometro():
+        with cronometrar(histograma, "carga"):
+            pass
+
+    def con_tramo():
+        with tramo("prueba"):
+            pass
+
+    print(f"histograma.observar:        {costo(lambda: histograma.observar(0.02, 'carga')):6.0f} ns")
+    print(f"contador.incrementar:       {costo(lambda: contador.incrementar('ok')):6.0f} ns")
+    print(f"cronometrar (sin trazas):   {costo(con_cronometro):6.0f} ns")
+    print(f"tramo (sin trazas):         {costo(con_tramo):6.0f} ns")
+    METRICAS_TRAZAS = os.path.join(tempfile.mkdtemp(), "trazas.jsonl")
+    n = 20_000
+    print(f"tramo (con trazas a disco): {costo(con_tramo):6.0f} ns")
+    print(prueba.exportar())
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+import uvicorn
+
+# Servidor LLM simulado para medir el backend sin depender de OpenAI ni Hugging Face.
+# Imita las rutas y formatos de respuesta de ambas APIs con una latencia configurable.
+
+MOCK_LATENCIA = float(os.getenv("MOCK_LLM_LATENCIA", 0.2))
+RESPUESTA_MOCK = "Respuesta simulada sobre la sequía en Calderón."
+
+app = FastAPI(title="LLM simulado")
+peticiones_recibidas = {"openai": 0, "zephyr": 0}  # Para verificar cuántos viajes hace un lote
+
+# Inyección de fallas por proveedor: probabilidad de error 500, probabilidad de respuesta
+# lenta (cola de latencia) y cantidad de 503 iniciales que imitan el arranque en frío de HF
+FALLAS = {proveedor: {"error": 0.0, "lento": 0.0, "latencia_lenta": 2.0, "arranque_frio": 0}
+          for proveedor in ("openai", "zephyr")}
+_azar = random.Random(0)
+
+async def _inyectar_falla(proveedor):
+    # Devuelve una respuesta de error, o None si la petición debe seguir normalmente
+    falla = FALLAS[proveedor]
+    if falla["arranque_frio"] > 0:
+        falla["arranque_frio"] -= 1
+        return JSONResponse({"error": "Model is currently loading", "estimated_time": 20.0}, status_code=503)
+    if _azar.random() < falla["error"]:
+        await asyncio.sleep(MOCK_LATENCIA / 4)
+        return JSONResponse({"error": "Internal Server Error"}, status_code=500)
+    if _azar.random() < falla["lento"]:
+        await asyncio.sleep(falla["latencia_lenta"])
+    return None
+
+async def _tokens_sse(formato):
+    # Reparte la latencia simulada entre los tokens para imitar la generación incremental
+    palabras = RESPUESTA_MOCK.split(" ")
+    for i, palabra in enumerate(palabras):
+        await asyncio.sleep(MOCK_LATENCIA / len(palabras))
+        texto = palabra if i == 0 else f" {palabra}"
+        yield f"data: {json.dumps(formato(texto), ensure_ascii=False)}\n\n"
+
+@app.post("/v1/chat/completions")
+async def openai_simulado(request: Request):
+    data = await request.json()
+    peticiones_recibidas["openai"] += 1
+    falla = await _inyectar_falla("openai")
+    if falla:
+        return falla
+    if data.get("stream"):
+        async def eventos():
+            async for evento in _tokens_sse(lambda t: {"choices": [{"delta": {"content": t}}]}):
+                yield evento
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(eventos(), media_type="text/event-stream")
+    await asyncio.sleep(MOCK_LATENCIA)
+    return {"choices": [{"message": {"role": "assistant", "content": RESPUESTA_MOCK}}]}
+
+@app.post("/models/{modelo:path}")
+async def huggingface_simulado(modelo: str, request: Request):
+    data = await request.json()
+    falla = await _inyectar_falla("zephyr")
+    if falla:
+        peticiones_recibidas["zephyr"] += 1
+        return falla
+    if data.get("stream"):
+        peticiones_recibidas["zephyr"] += 1
+        formato = lambda t: {"token": {"text": t, "special": False}, "generated_text": None}
+        return StreamingResponse(_tokens_sse(formato), media_type="text/event-stream")
+    peticiones_recibidas["zephyr"] += 1
+    await asyncio.sleep(MOCK_LATENCIA)
+    if isinstance(data["inputs"], list):
+        # Lote: una lista de resultados en el mismo orden que los inputs
+        return [[{"generated_text": f"{entrada}{RESPUESTA_MOCK} [{i}]"}] for i, entrada in enumerate(data["inputs"])]
+    return [{"generated_text": f"{data['inputs']}{RESPUESTA_MOCK}"}]
+
+def iniciar_en_hilo(puerto: int) -> threading.Thread:
+    config = uvicorn.Config(app, host="127.0.0.1", port=puerto, log_level="warning")
+    servidor = uvicorn.Server(config)
+    hilo = threading.Thread(target=servidor.run, daemon=True)
+    hilo.start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return hilo
+
+# === Benchmark: ruta síncrona (un hilo y una conexión por petición) vs asíncrona con pool ===
+def benchmark(puerto: int, peticiones: int, concurrencia: int):
+    from backend import chatbot
+
+    iniciar_en_hilo(puerto)
+    chatbot.HF_API_URL = f"http://127.0.0.1:{puerto}/models/HuggingFaceH4/zephyr-7b-beta"
+    chatbot.OPENAI_API_URL = f"http://127.0.0.1:{puerto}/v1/chat/completions"
+    chatbot.LIMITES_PROVEEDOR["zephyr"] = concurrencia
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(chatbot.generar_respuesta_zephyr, ["¿Cómo está la sequía?"] * peticiones))
+    duracion_sync = time.perf_counter() - inicio
+
+    async def lote():
+        tareas = [chatbot.generar_respuesta_zephyr_async("¿Cómo está la sequía?") for _ in range(peticiones)]
+        await asyncio.gather(*tareas)
+        await chatbot.cerrar_cliente()
+
+    inicio = time.perf_counter()
+    asyncio.run(lote())
+    duracion_async = time.perf_counter() - inicio
+
+    print(f"Peticiones: {peticiones} | concurrencia: {concurrencia} | latencia simulada: {MOCK_LATENCIA}s")
+    print(f"Síncrono (hilos): {peticiones / duracion_sync:.1f} req/s")
+    print(f"Asíncrono (pool): {peticiones / duracion_async:.1f} req/s")
+
+# === Verificación de lotes: un viaje por lote, claves intactas y caída a peticiones sueltas ===
+def verificar_lote(puerto: int):
+    from backend import chatbot
+    from backend.cache import CacheRespuestas
+
+    iniciar_en_hilo(puerto)
+    chatbot.HF_API_URL = f"http://127.0.0.1:{puerto}/models/HuggingFaceH4/zephyr-7b-beta"
+    chatbot.OPENAI_API_URL = f"http://127.0.0.1:{puerto}/v1/chat/completions"
+    peticiones_recibidas.update(openai=0, zephyr=0)
+    prompts = {seccion: f"Analiza la sección {seccion}." for seccion in ("registros", "tendencia", "dispersion", "histograma")}
+    prompts["repetido"] = prompts["registros"]
+
+    async def correr(modelo):
+        chatbot.cache_respuestas = CacheRespuestas()  # Cache vacía en memoria: cada corrida llega al servidor
+        try:
+            return await chatbot.responder_lote_async(prompts, modelo)
+        finally:
+            await chatbot.cerrar_cliente()
+
+    respuestas = asyncio.run(correr("zephyr"))
+    assert peticiones_recibidas["zephyr"] == 1, peticiones_recibidas
+    assert list(respuestas) == list(prompts)
+    for i, seccion in enumerate(("registros", "tendencia", "dispersion", "histograma")):
+        assert respuestas[seccion].endswith(f"[{i}]"), respuestas[seccion]
+    assert respuestas["repetido"] == respuestas["registros"]
+
+    respuestas = asyncio.run(correr("openai"))
+    assert peticiones_recibidas["openai"] == 4 and set(respuestas.values()) == {RESPUESTA_MOCK}, peticiones_recibidas
+
+    # Un endpoint que no acepta listas: cada prompt se reintenta por separado
+    extraer = chatbot._extraer_zephyr_lote
+    chatbot._extraer_zephyr_lote = lambda *_: (_ for _ in ()).throw(RuntimeError("sin lotes"))
+    peticiones_recibidas["zephyr"] = 0
+    respuestas = asyncio.run(correr("zephyr"))
+    chatbot._extraer_zephyr_lote = extraer
+    assert peticiones_recibidas["zephyr"] == 1 + 4 and all(RESPUESTA_MOCK in r for r in respuestas.values())
+    print("✅ Lote zephyr en 1 petición, OpenAI en paralelo y caída a peticiones individuales")
+
+# === Latencia de cola con fallas inyectadas: proveedor directo vs enrutador ===
+def _percentil(valores, q):
+    ordenados = sorted(valores)
+    return ordenados[min(int(q * len(ordenados)), len(ordenados) - 1)]
+
+def cola_latencia(puerto: int, peticiones: int, concurrencia: int, fallas: dict):
+    from backend import chatbot
+
+    iniciar_en_hilo(puerto)
+    chatbot.HF_API_URL = f"http://127.0.0.1:{puerto}/models/HuggingFaceH4/zephyr-7b-beta"
+    chatbot.OPENAI_API_URL = f"http://127.0.0.1:{puerto}/v1/chat/completions"
+
+    async def medir(llamada):
+        limite = asyncio.Semaphore(concurrencia)
+
+        async def una(i):
+            async with limite:
+                inicio = time.perf_counter()
+                try:
+                    await llamada(f"¿Cómo está la sequía? #{i}")
+                    return time.perf_counter() - inicio, True
+                except Exception:
+                    return time.perf_counter() - inicio, False
+
+        try:
+            return await asyncio.gather(*(una(i) for i in range(peticiones)))
+        finally:
+            await chatbot.cerrar_cliente()
+
+    rutas = {
+        "directo": chatbot._completar_zephyr,
+        "enrutador": lambda prompt: chatbot.enrutador.completar(prompt, "zephyr"),
+    }
+    print(f"Peticiones: {peticiones} | concurrencia: {concurrencia} | fallas zephyr: {fallas}")
+    for nombre, llamada in rutas.items():
+        FALLAS["zephyr"].update(fallas)
+        chatbot.enrutador.reiniciar()
+        resultados = asyncio.run(medir(llamada))
+        latencias = [d for d, _ in resultados]
+        errores = sum(1 for _, ok in resultados if not ok)
+        print(f"{nombre:>9}: p50 {_percentil(latencias, 0.5) * 1000:7.1f} ms | p95 {_percentil(latencias, 0.95) * 1000:7.1f} ms | "
+              f"p99 {_percentil(latencias, 0.99) * 1000:7.1f} ms | errores {errores / peticiones:6.1%}")
+    print(json.dumps(chatbot.enrutador.estado(), indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modo", choices=["servir", "bench", "lote", "cola"])
+    parser.add_argument("--puerto", type=int, default=8001)
+    parser.add_argument("--peticiones", type=int, default=500)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--error", type=float, default=0.1, help="modo cola: probabilidad de 500 en zephyr")
+    parser.add_argument("--lento", type=float, default=0.05, help="modo cola: probabilidad de respuesta lenta")
+    parser.add_argument("--latencia-lenta", type=float, default=2.0)
+    parser.add_argument("--arranque-frio", type=int, default=10, help="modo cola: 503 iniciales de zephyr")
+    args = parser.parse_args()
+
+    if args.modo == "servir":
+        uvicorn.run(app, host="127.0.0.1", port=args.puerto)
+    elif args.modo == "lote":
+        verificar_lote(args.puerto)
+    elif args.modo == "cola":
+        cola_latencia(args.puerto, args.peticiones, args.concurrencia, {
+            "error": args.error, "lento": args.lento,
+            "latencia_lenta": args.latencia_lenta, "arranque_frio": args.arranque_frio,
+        })
+    else:
+        benchmark(args.puerto, args.peticiones, args.concurrencia)
@@ -0,0 +1,229 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from backend.estaciones import DATA_DIR
+
+# === Inferencia local en CPU (sin red) ===
+# Un modelo instruct pequeño corre dentro del proceso. Se carga una sola vez por worker,
+# la primera vez que se usa, con pesos int8 (cuantización dinámica de las capas
+# lineales) o, si MODELO_LOCAL_ONNX=1, exportado y cuantizado para ONNX Runtime.
+# Las peticiones concurrentes se agrupan en un hilo dedicado: el primer prompt abre
+# una ventana de MODELO_LOCAL_ESPERA_MS y todo lo que llegue en ella (hasta
+# MODELO_LOCAL_LOTE_MAX) se genera en una sola pasada con padding a la izquierda.
+# torch y transformers se importan al cargar: sin ellos el resto del backend funciona igual.
+#
+# Los pesos viven en MODELO_LOCAL_DIR (por defecto data/modelos bajo DATA_DIR, no el
+# directorio de trabajo) y se cargan siempre desde ahí con local_files_only=True. Con
+# red, la primera carga descarga el modelo a ese directorio; sin red (MODELO_LOCAL_OFFLINE=1
+# o HF_HUB_OFFLINE=1) hay que descargarlo antes, p. ej. al construir la imagen:
+#   python -m backend.modelo_local descargar
+
+MODELO_LOCAL = os.getenv("MODELO_LOCAL", "Qwen/Qwen2.5-0.5B-Instruct")
+MODELO_LOCAL_ONNX = os.getenv("MODELO_LOCAL_ONNX", "0") == "1"
+MODELO_LOCAL_INT8 = os.getenv("MODELO_LOCAL_INT8", "1") == "1"
+MODELO_LOCAL_LOTE_MAX = int(os.getenv("MODELO_LOCAL_LOTE_MAX", 8))
+MODELO_LOCAL_ESPERA_MS = float(os.getenv("MODELO_LOCAL_ESPERA_MS", 20))
+MODELO_LOCAL_HILOS = int(os.getenv("MODELO_LOCAL_HILOS", 0))  # 0 = lo que decida torch
+MODELO_LOCAL_DIR = os.path.abspath(os.getenv("MODELO_LOCAL_DIR", os.path.join(DATA_DIR, "modelos")))
+MODELO_LOCAL_OFFLINE = os.getenv("MODELO_LOCAL_OFFLINE", os.getenv("HF_HUB_OFFLINE", "0")) in ("1", "true", "True")
+
+PARAMETROS_LOCAL = {
+    "modelo": MODELO_LOCAL,
+    "backend": "onnx" if MODELO_LOCAL_ONNX else ("torch-int8" if MODELO_LOCAL_INT8 else "torch"),
+    "max_new_tokens": int(os.getenv("MODELO_LOCAL_MAX_TOKENS", 200)),
+    "do_sample": False,
+    "repetition_penalty": 1.1,
+}
+
+def ruta_modelo(nombre: str) -> str:
+    # Un directorio existente se usa tal cual; un id del hub va a su copia en MODELO_LOCAL_DIR
+    if os.path.isdir(nombre):
+        return nombre
+    return os.path.join(MODELO_LOCAL_DIR, nombre.replace("/", "__"))
+
+def descargar(nombre: str = MODELO_LOCAL) -> str:
+    # Deja los archivos del modelo en MODELO_LOCAL_DIR; si ya están, no toca la red
+    ruta = ruta_modelo(nombre)
+    if os.path.isfile(os.path.join(ruta, "config.json")):
+        return ruta
+    if MODELO_LOCAL_OFFLINE:
+        raise RuntimeError(f"El modelo {nombre} no está en {ruta} y no hay red (MODELO_LOCAL_OFFLINE). "
+                           "Descárgalo antes con: python -m backend.modelo_local descargar")
+    from huggingface_hub import snapshot_download
+    snapshot_download(repo_id=nombre, local_dir=ruta)
+    return ruta
+
+def _cargar_onnx(nombre: str):
+    from optimum.onnxruntime import ORTModelForCausalLM, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    # La exportación y la cuantización se hacen una vez y quedan en disco
+    destino = nombre.rstrip(os.sep) + ("-onnx-int8" if MODELO_LOCAL_INT8 else "-onnx")
+    if not os.path.isdir(destino):
+        exportado = ORTModelForCausalLM.from_pretrained(nombre, export=True, use_cache=True, local_files_only=True)
+        if not MODELO_LOCAL_INT8:
+            exportado.save_pretrained(destino)
+        else:
+            cuantizador = ORTQuantizer.from_pretrained(exportado)
+            cuantizador.quantize(save_dir=destino, quantization_config=AutoQuantizationConfig.avx2(is_static=False))
+    return ORTModelForCausalLM.from_pretrained(destino, use_cache=True, local_files_only=True)
+
+def _cargar_torch(nombre: str):
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    modelo = AutoModelForCausalLM.from_pretrained(nombre, torch_dtype=torch.float32, local_files_only=True)
+    modelo.eval()
+    if MODELO_LOCAL_INT8:
+        modelo = torch.quantization.quantize_dynamic(modelo, {torch.nn.Linear}, dtype=torch.qint8)
+    return modelo
+
+class ModeloLocal:
+    def __init__(self, nombre: str = MODELO_LOCAL, lote_max: int = MODELO_LOCAL_LOTE_MAX,
+                 espera_ms: float = MODELO_LOCAL_ESPERA_MS):
+        self.nombre = nombre
+        self.lote_max = lote_max
+        self.espera = espera_ms / 1000
+        self._modelo = None
+        self._tokenizador = None
+        self._lock = threading.Lock()
+        self._cola = queue.Queue()
+        self._hilo = None
+        self.contadores = {"peticiones": 0, "lotes": 0, "tokens_generados": 0, "segundos_generando": 0.0,
+                           "segundos_carga": None}
+
+    def cargar(self):
+        # Carga perezosa y única por proceso; también arranca el hilo que arma los lotes
+        with self._lock:
+            if self._modelo is not None:
+                return
+            try:
+                import torch
+                from transformers import AutoTokenizer
+            except ImportError as e:
+                raise RuntimeError(f"El modelo local necesita torch y transformers instalados: {e}")
+            if MODELO_LOCAL_HILOS:
+                torch.set_num_threads(MODELO_LOCAL_HILOS)
+            inicio = time.perf_counter()
+            ruta = descargar(self.nombre)
+            tokenizador = AutoTokenizer.from_pretrained(ruta, padding_side="left", local_files_only=True)
+            if tokenizador.pad_token is None:
+                tokenizador.pad_token = tokenizador.eos_token
+            self._tokenizador = tokenizador
+            self._modelo = _cargar_onnx(ruta) if MODELO_LOCAL_ONNX else _cargar_torch(ruta)
+            self.contadores["segundos_carga"] = round(time.perf_counter() - inicio, 2)
+            self._hilo = threading.Thread(target=self._atender, name="modelo-local", daemon=True)
+            self._hilo.start()
+
+    def _atender(self):
+        while True:
+            lote = [self._cola.get()]
+            limite = time.monotonic() + self.espera
+            while len(lote) < self.lote_max:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+            lote = [(mensajes, futuro) for mensajes, futuro in lote if futuro.set_running_or_notify_cancel()]
+            if not lote:
+                continue
+            try:
+                respuestas = self._generar_lote([mensajes for mensajes, _ in lote])
+            except Exception as e:
+                for _, futuro in lote:
+                    futuro.set_exception(e)
+                continue
+            for (_, futuro), respuesta in zip(lote, respuestas):
+                futuro.set_result(respuesta)
+
+    def _generar_lote(self, conversaciones: list) -> list:
+        import torch
+
+        textos = [
+            self._tokenizador.apply_chat_template(mensajes, tokenize=False, add_generation_prompt=True)
+            for mensajes in conversaciones
+        ]
+        entradas = self._tokenizador(textos, return_tensors="pt", padding=True)
+        parametros = {k: v for k, v in PARAMETROS_LOCAL.items() if k not in ("modelo", "backend")}
+        inicio = time.perf_counter()
+        with torch.inference_mode():
+            salida = self._modelo.generate(**entradas, pad_token_id=self._tokenizador.pad_token_id, **parametros)
+        duracion = time.perf_counter() - inicio
+        # Sólo los tokens nuevos (la entrada ocupa las primeras columnas de todas las filas)
+        nuevos = salida[:, entradas["input_ids"].shape[1]:]
+        generados = int((nuevos != self._tokenizador.pad_token_id).sum())
+        self.contadores["lotes"] += 1
+        self.contadores["peticiones"] += len(conversaciones)
+        self.contadores["tokens_generados"] += generados
+        self.contadores["segundos_generando"] += duracion
+        return [texto.strip() or "Sin respuesta." for texto in self._tokenizador.batch_decode(nuevos, skip_special_tokens=True)]
+
+    def enviar(self, mensajes: list) -> Future:
+        if self._modelo is None:
+            self.cargar()
+        futuro = Future()
+        self._cola.put((mensajes, futuro))
+        return futuro
+
+    def generar(self, mensajes: list) -> str:
+        return self.enviar(mensajes).result()
+
+    async def generar_async(self, mensajes: list) -> str:
+        # La carga (segundos la primera vez) también sale del event loop
+        if self._modelo is None:
+            await asyncio.to_thread(self.cargar)
+        return await asyncio.wrap_future(self.enviar(mensajes))
+
+    def estadisticas(self) -> dict:
+        segundos = self.contadores["segundos_generando"]
+        return {
+            **self.contadores,
+            "cargado": self._modelo is not None,
+            "parametros": PARAMETROS_LOCAL,
+            "tokens_por_segundo": round(self.contadores["tokens_generados"] / segundos, 1) if segundos else None,
+            "peticiones_por_lote": round(self.contadores["peticiones"] / self.contadores["lotes"], 2) if self.contadores["lotes"] else None,
+        }
+
+modelo_local = ModeloLocal()
+
+# === Benchmark en CPU: python -m backend.modelo_local [concurrencias...] ===
+# python -m backend.modelo_local descargar [modelo]: sólo descarga los pesos a MODELO_LOCAL_DIR
+if __name__ == "__main__":
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    if sys.argv[1:2] == ["descargar"]:
+        print(f"Modelo en {descargar(sys.argv[2] if len(sys.argv) > 2 else MODELO_LOCAL)}")
+        sys.exit(0)
+
+    concurrencias = [int(c) for c in sys.argv[1:]] or [1, 4, 8]
+    preguntas = [
+        [{"role": "user", "content": f"En dos oraciones, ¿qué medidas ayudan a enfrentar una sequía de {d} días?"}]
+        for d in range(10, 10 + max(concurrencias))
+    ]
+    modelo_local.cargar()
+    print(f"Modelo {MODELO_LOCAL} ({PARAMETROS_LOCAL['backend']}) cargado en {modelo_local.contadores['segundos_carga']} s")
+    modelo_local.generar(preguntas[0])  # Calentamiento
+
+    for concurrencia in concurrencias:
+        tokens_antes = modelo_local.contadores["tokens_generados"]
+
+        def medir(mensajes):
+            inicio = time.perf_counter()
+            modelo_local.generar(mensajes)
+            return time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            latencias = sorted(pool.map(medir, preguntas[:concurrencia]))
+        duracion = time.perf_counter() - inicio
+        tokens = modelo_local.contadores["tokens_generados"] - tokens_antes
+        print(f"concurrencia {concurrencia:>2}: {tokens / duracion:6.1f} tokens/s | "
+              f"latencia p50 {latencias[len(latencias) // 2]:.2f} s, máx {latencias[-1]:.2f} s")
+    print(modelo_local.estadisticas())
@@ -0,0 +1,142 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from backend.almacen import almacen_estacion
+
+# === Reducción de series para gráficos ===
+# Un gráfico no puede mostrar más puntos que píxeles de ancho, así que las series se
+# reducen en el servidor antes de enviarlas al navegador. Dos métodos:
+#  - "lttb" (Largest-Triangle-Three-Buckets): conserva la forma visual de la línea.
+#  - "minmax": mínimo y máximo de cada tramo de tiempo; no pierde picos ni ceros,
+#    adecuado para dispersión y para series con eventos extremos.
+# La reducción se aplica sobre el rango visible: al acercarse a un rango más corto
+# se vuelve a pedir la serie y se obtiene más detalle. Cada respuesta lleva un ETag
+# de la versión del almacén y los parámetros: sin cambios, la API contesta 304.
+
+PUNTOS_GRAFICO = int(os.getenv("PUNTOS_GRAFICO", 1200))
+METODOS = ("lttb", "minmax")
+
+def _indices_lttb(x: np.ndarray, y: np.ndarray, puntos: int) -> np.ndarray:
+    n = len(x)
+    if puntos >= n or puntos < 3:
+        return np.arange(n)
+    # puntos - 2 tramos entre el primer y el último punto, que siempre se conservan
+    bordes = np.linspace(1, n - 1, puntos - 1).astype(np.int64)
+    # Centroide de cada tramo (el "siguiente" del último tramo es el último punto)
+    suma_x = np.concatenate(([0.0], np.cumsum(x)))
+    suma_y = np.concatenate(([0.0], np.cumsum(y)))
+    largo = bordes[1:] - bordes[:-1]
+    centro_x = np.append((suma_x[bordes[1:]] - suma_x[bordes[:-1]]) / largo, x[-1])
+    centro_y = np.append((suma_y[bordes[1:]] - suma_y[bordes[:-1]]) / largo, y[-1])
+
+    indices = np.empty(puntos, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    anterior = 0
+    # El punto elegido en un tramo depende del elegido en el anterior: se itera por tramo, no por fila
+    for i in range(puntos - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        area = np.abs(
+            (x[anterior] - centro_x[i + 1]) * (y[inicio:fin] - y[anterior])
+            - (x[anterior] - x[inicio:fin]) * (centro_y[i + 1] - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(area))
+        indices[i + 1] = anterior
+    return np.unique(indices)
+
+def _indices_minmax(x: np.ndarray, y: np.ndarray, puntos: int) -> np.ndarray:
+    n = len(x)
+    if puntos >= n or puntos < 2:
+        return np.arange(n)
+    # Tramos de igual duración sobre el rango visible; dos puntos (mín. y máx.) por tramo
+    tramos = max(puntos // 2, 1)
+    ancho = (x[-1] - x[0]) or 1.0
+    tramo = np.minimum(((x - x[0]) / ancho * tramos).astype(np.int64), tramos - 1)
+    serie = pd.Series(y)
+    minimos = serie.groupby(tramo).idxmin().to_numpy()
+    maximos = serie.groupby(tramo).idxmax().to_numpy()
+    return np.unique(np.concatenate(([0, n - 1], minimos, maximos)))
+
+def reducir(df: pd.DataFrame, puntos: int = PUNTOS_GRAFICO, metodo: str = "lttb",
+            x: str = "fecha", y: str = "valor") -> pd.DataFrame:
+    # Devuelve como mucho ~puntos filas de df (ordenado por x), sin valores faltantes
+    if metodo not in METODOS:
+        raise ValueError(f"Método de reducción desconocido: {metodo}. Opciones: {', '.join(METODOS)}")
+    df = df[df[y].notna()]
+    if len(df) <= puntos:
+        return df.reset_index(drop=True)
+    if not df[x].is_monotonic_increasing:
+        df = df.sort_values(x, kind="stable")
+    eje_x = df[x].to_numpy()
+    eje_x = eje_x.astype("datetime64[ns]").astype(np.int64).astype(float) if np.issubdtype(eje_x.dtype, np.datetime64) else eje_x.astype(float)
+    eje_y = df[y].to_numpy(dtype=float)
+    indices = _indices_lttb(eje_x, eje_y, puntos) if metodo == "lttb" else _indices_minmax(eje_x, eje_y, puntos)
+    return df.iloc[indices].reset_index(drop=True)
+
+def serie_almacen(almacen, desde=None, hasta=None, puntos: int = PUNTOS_GRAFICO, metodo: str = "lttb") -> dict:
+    # Cada partición anual del rango visible se reduce por separado (son vistas del
+    # memory-map, sin copiar) y luego se reduce la unión: la memoria no crece con la historia
+    desde = pd.Timestamp(desde) if desde is not None else None
+    hasta = pd.Timestamp(hasta) if hasta is not None else None
+    total, partes = 0, []
+    for anio in almacen.anios():
+        inicio, fin = pd.Timestamp(int(anio), 1, 1), pd.Timestamp(int(anio) + 1, 1, 1) - pd.Timedelta(1, "ns")
+        if (desde is not None and fin < desde) or (hasta is not None and inicio > hasta):
+            continue
+        df = almacen.leer(["fecha", "valor"], max(inicio, desde) if desde is not None else inicio,
+                          min(fin, hasta) if hasta is not None else fin)
+        total += len(df)
+        partes.append(reducir(df, puntos, metodo))
+    if not partes:
+        # Rango sin datos: columnas vacías con los mismos tipos que las del almacén
+        partes = [pd.DataFrame({"fecha": pd.Series(dtype="datetime64[ns]"), "valor": pd.Series(dtype=float)})]
+    union = pd.concat(partes, ignore_index=True)
+    # rango: primera y última fecha de todo el almacén (los límites del selector de rango)
+    return {"total_puntos": total, "metodo": metodo, "rango": almacen.rango(), "datos": reducir(union, puntos, metodo)}
+
+def etag_serie(almacen, desde=None, hasta=None, puntos: int = PUNTOS_GRAFICO, metodo: str = "lttb") -> str:
+    material = json.dumps([almacen.version(), str(desde), str(hasta), puntos, metodo])
+    return f'"{hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]}"'
+
+def serie_json(serie: dict) -> dict:
+    # Columnas como listas y fechas ISO 8601, para responder desde la API
+    datos = serie["datos"]
+    return {
+        "total_puntos": serie["total_puntos"],
+        "metodo": serie["metodo"],
+        "rango": [None if f is None else f.isoformat() for f in serie["rango"]],
+        "fecha": datos["fecha"].dt.strftime("%Y-%m-%dT%H:%M:%S").tolist(),
+        "valor": datos["valor"].tolist(),
+    }
+
+def serie_estacion(estacion: str = None, desde=None, hasta=None, puntos: int = PUNTOS_GRAFICO,
+                   metodo: str = "lttb") -> dict:
+    # Lee sólo el rango visible del almacén y lo reduce a ~puntos puntos
+    return serie_almacen(almacen_estacion(estacion), desde, hasta, puntos, metodo)
+
+# 🧪 Prueba manual: python -m backend.muestreo
+if __name__ == "__main__":
+    import time
+
+    fechas = pd.date_range("1975-01-01", periods=50 * 365 * 24, freq="h")
+    rng = np.random.default_rng(0)
+    horaria = pd.DataFrame({"fecha": fechas, "valor": np.where(rng.random(len(fechas)) < 0.9, 0, rng.gamma(0.8, 2, len(fechas)))})
+    for metodo in METODOS:
+        inicio = time.perf_counter()
+        reducida = reducir(horaria, metodo=metodo)
+        duracion = time.perf_counter() - inicio
+        assert len(reducida) <= PUNTOS_GRAFICO + 2, len(reducida)
+        assert reducida["fecha"].is_monotonic_increasing
+        if metodo == "minmax":
+            assert reducida["valor"].max() == horaria["valor"].max(), "minmax debe conservar el pico"
+        print(f"{metodo:>6}: {len(horaria):,} -> {len(reducida):,} puntos en {duracion * 1000:.1f} ms")
+
+    # Un rango sin datos responde listas vacías (no un error)
+    import tempfile
+    from backend.almacen import AlmacenColumnar
+    almacen = AlmacenColumnar(None, tempfile.mkdtemp())
+    almacen.escribir(horaria.iloc[:48])
+    vacia = serie_json(serie_almacen(almacen, desde="2100-01-01"))
+    assert vacia["fecha"] == [] and vacia["valor"] == [] and vacia["total_puntos"] == 0, vacia
+    print(f"rango vacío: {vacia}")
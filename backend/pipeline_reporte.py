@@ -0,0 +1,206 @@
+import os
+import time
+import contextvars
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from backend import graficos as modulo_graficos
+from backend.metricas import registro, CUBOS_LENTOS
+
+# === Pipeline de secciones del reporte ===
+# Cada sección aporta (opcionalmente) un gráfico y un análisis IA. Los gráficos se
+# dibujan con las plantillas de backend.graficos en un pool de procesos (cada worker
+# conserva sus figuras) o salen de la cache por huella de datos; los análisis corren
+# en paralelo con un límite de concurrencia. Una sección puede depender del
+# análisis de otras: su análisis arranca en cuanto están listos su propio gráfico y
+# los análisis de sus dependencias, en el orden en que terminen. La disponibilidad se
+# revisa cada vez que termina cualquier tarea, gráfico o análisis.
+
+REPORTE_PROCESOS = int(os.getenv("REPORTE_PROCESOS", 2))
+REPORTE_LLM_CONCURRENCIA = int(os.getenv("REPORTE_LLM_CONCURRENCIA", 4))
+
+# Duración de cada etapa de un reporte; grafico y llm se observan por sección (corren en paralelo)
+REPORTE_ETAPA_SEGUNDOS = registro.histograma(
+    "reporte_etapa_segundos", "Duración de las etapas de generación de reportes.", ("etapa",), CUBOS_LENTOS,
+)
+
+class Seccion:
+    def __init__(self, id, titulo, datos, grafico=None, prompt=None, depende_de=()):
+        self.id = id
+        self.titulo = titulo
+        self.datos = datos            # df -> objeto serializable que reciben grafico y prompt
+        self.grafico = grafico        # tipo de gráfico de backend.graficos.PLANTILLAS
+        self.prompt = prompt          # (datos, analisis_dependencias, estacion) -> str
+        self.depende_de = tuple(depende_de)
+
+def _ordenar(secciones):
+    # Valida el grafo de dependencias y detecta ciclos (orden topológico de Kahn)
+    ids = {s.id for s in secciones}
+    pendientes = {s.id: set(s.depende_de) for s in secciones}
+    for id_seccion, deps in pendientes.items():
+        faltantes = deps - ids
+        if faltantes:
+            raise ValueError(f"La sección '{id_seccion}' depende de secciones inexistentes: {faltantes}")
+    orden = []
+    listos = [i for i, deps in pendientes.items() if not deps]
+    while listos:
+        actual = listos.pop()
+        orden.append(actual)
+        for id_seccion, deps in pendientes.items():
+            if actual in deps:
+                deps.discard(actual)
+                if not deps and id_seccion not in orden and id_seccion not in listos:
+                    listos.append(id_seccion)
+    if len(orden) != len(secciones):
+        raise ValueError("Las dependencias entre secciones forman un ciclo.")
+    return orden
+
+_pool_procesos = None
+
+def _obtener_pool_procesos():
+    global _pool_procesos
+    if _pool_procesos is None:
+        # "spawn" evita heredar locks de los hilos del servidor al hacer fork
+        _pool_procesos = ProcessPoolExecutor(
+            max_workers=REPORTE_PROCESOS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool_procesos
+
+def cerrar_pool_procesos():
+    global _pool_procesos
+    if _pool_procesos is not None:
+        _pool_procesos.shutdown(wait=False, cancel_futures=True)
+        _pool_procesos = None
+
+def _enviar(pool, funcion, argumento):
+    # Cada tarea corre en una copia del contexto: los tramos de traza cuelgan del reporte
+    return pool.submit(contextvars.copy_context().run, funcion, argumento)
+
+def ejecutar_secciones(secciones, df, analizar, progreso=None, max_llm=REPORTE_LLM_CONCURRENCIA, estacion=None,
+                       analizar_lote=None):
+    # Devuelve ({id: PNG en bytes}, {id: análisis})
+    # analizar_lote({id: prompt}) -> {id: análisis}, si se da, agrupa en una sola llamada
+    # todos los análisis que quedan listos a la vez (las secciones sin dependencias, juntas)
+    _ordenar(secciones)
+    por_id = {s.id: s for s in secciones}
+    datos = {s.id: s.datos(df) for s in secciones}
+    graficos, analisis = {}, {}
+    total = sum(1 for s in secciones if s.grafico) + sum(1 for s in secciones if s.prompt)
+    hechos = 0
+
+    with ThreadPoolExecutor(max_workers=max_llm, thread_name_prefix="analisis") as pool_llm:
+        en_vuelo, huellas = {}, {}
+        for s in secciones:
+            if s.grafico:
+                # Un gráfico con los mismos datos ya dibujado (otro reporte, la API) no se redibuja
+                huellas[s.id] = modulo_graficos.huella(s.grafico, datos[s.id])
+                imagen = modulo_graficos.cache_graficos.obtener(huellas[s.id])
+                if imagen is not None:
+                    graficos[s.id] = imagen
+                    hechos += 1
+                    continue
+                futuro = _obtener_pool_procesos().submit(modulo_graficos.dibujar, s.grafico, datos[s.id])
+                en_vuelo[futuro] = ("grafico", s.id, None, time.perf_counter())
+
+        lanzados = set()
+
+        def lista(s):
+            # Sin gráfico propio basta con las dependencias; con gráfico, también debe estar dibujado
+            return (not s.grafico or s.id in graficos) and all(d in analisis for d in s.depende_de)
+
+        def lanzar_analisis_listos():
+            listos = {}
+            for s in secciones:
+                if s.prompt and s.id not in lanzados and lista(s):
+                    previos = {d: analisis[d] for d in s.depende_de}
+                    listos[s.id] = s.prompt(datos[s.id], previos, estacion or {})
+                    lanzados.add(s.id)
+                elif not s.prompt and s.id not in analisis and all(d in analisis for d in s.depende_de):
+                    analisis[s.id] = None
+            if analizar_lote and len(listos) > 1:
+                en_vuelo[_enviar(pool_llm, analizar_lote, listos)] = ("lote", tuple(listos), listos, time.perf_counter())
+            else:
+                for id_seccion, prompt in listos.items():
+                    en_vuelo[_enviar(pool_llm, analizar, prompt)] = ("analisis", id_seccion, None, time.perf_counter())
+
+        lanzar_analisis_listos()
+        while en_vuelo:
+            terminados, _ = wait(list(en_vuelo), return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                tipo, id_seccion, prompts_lote, inicio = en_vuelo.pop(futuro)
+                # Desde que se encola: incluye la espera por un worker libre
+                REPORTE_ETAPA_SEGUNDOS.observar(time.perf_counter() - inicio, "grafico" if tipo == "grafico" else "llm")
+                try:
+                    resultado = futuro.result()
+                except BrokenProcessPool:
+                    # Un worker murió: se descarta el pool para que el próximo reporte cree uno nuevo
+                    cerrar_pool_procesos()
+                    raise
+                except Exception:
+                    if tipo != "lote":
+                        raise
+                    # El lote falló (p. ej. el proveedor no admite listas): una petición por sección
+                    for id_lote, prompt in prompts_lote.items():
+                        en_vuelo[_enviar(pool_llm, analizar, prompt)] = ("analisis", id_lote, None, time.perf_counter())
+                    continue
+                if tipo == "grafico":
+                    graficos[id_seccion] = resultado
+                    modulo_graficos.cache_graficos.guardar(huellas[id_seccion], resultado)
+                    hechos += 1
+                elif tipo == "lote":
+                    for id_lote in id_seccion:
+                        analisis[id_lote] = resultado.get(id_lote)
+                    hechos += len(id_seccion)
+                else:
+                    analisis[id_seccion] = resultado
+                    hechos += 1
+                if progreso:
+                    etiqueta = f"{len(id_seccion)} secciones" if tipo == "lote" else f"Sección '{por_id[id_seccion].titulo}'"
+                    progreso(hechos / total, f"{etiqueta} ({tipo}) lista")
+            lanzar_analisis_listos()
+
+    return graficos, analisis
+
+# === Verificación: python -m backend.pipeline_reporte ===
+# Una sección con gráfico que depende de otra debe lanzar su análisis sea cual sea el
+# orden en que terminan: primero la dependencia y luego el gráfico (gráfico nuevo, en
+# el pool de procesos) o primero el gráfico (de la cache) y luego la dependencia.
+if __name__ == "__main__":
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    fechas = pd.date_range("2020-01-01", periods=3 * 365, freq="D")
+    df = pd.DataFrame({"fecha": fechas, "valor": rng.gamma(0.8, 5, len(fechas))})
+
+    for caso, espera_dependencia in (("dependencia antes que el gráfico", 0.0), ("gráfico antes que la dependencia", 0.5)):
+        eventos = []
+
+        def analizar(prompt):
+            if prompt == "base":
+                time.sleep(espera_dependencia)
+            eventos.append(f"análisis {prompt}")
+            return f"análisis de {prompt}"
+
+        def prompt_grafico(datos, previos, estacion):
+            eventos.append("prompt grafico")
+            assert previos == {"base": "análisis de base"}, previos
+            return "grafico"
+
+        secciones = [
+            Seccion("base", "Base", lambda d: d, prompt=lambda datos, previos, estacion: "base"),
+            Seccion("grafico", "Gráfico", lambda d: d[["fecha", "valor"]], grafico="variacion_temporal",
+                    prompt=prompt_grafico, depende_de=("base",)),
+        ]
+        en_cache = modulo_graficos.cache_graficos.obtener(modulo_graficos.huella("variacion_temporal", df[["fecha", "valor"]]))
+        graficos, analisis = ejecutar_secciones(
+            secciones, df, analizar, progreso=lambda fraccion, etapa: eventos.append(etapa)
+        )
+        assert analisis == {"base": "análisis de base", "grafico": "análisis de grafico"}, analisis
+        assert graficos["grafico"], "falta el gráfico"
+        if en_cache is None:
+            # El gráfico se dibujó en el pool: el análisis esperó a que terminara
+            assert eventos.index("Sección 'Gráfico' (grafico) lista") < eventos.index("prompt grafico"), eventos
+        assert eventos.index("análisis base") < eventos.index("prompt grafico"), eventos
+        print(f"✅ {caso}: {' → '.join(eventos)}")
+    cerrar_pool_procesos()
@@ -0,0 +1,450 @@
+import os
+import re
+import time
+import zlib
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+import pandas as pd
+from backend.almacen import almacen_estacion
+from backend.estaciones import registro_estaciones, DATA_DIR
+
+# === Recuperación de contexto para el chatbot ===
+# Los datos de cada estación se resumen en fragmentos de texto (uno por mes, uno por
+# año y uno por evento: rachas secas largas y días extremos) y se suman los documentos
+# técnicos que se dejen en DOCUMENTOS_DIR. Cada fragmento se convierte en un vector con
+# embeddings locales y se guarda en un índice ANN (FAISS o hnswlib si están instalados;
+# si no, búsqueda exacta con NumPy). Al llegar datos nuevos cambia la versión del
+# almacén: los resúmenes se recalculan y sólo se vuelven a vectorizar los fragmentos
+# cuyo texto cambió. A cada pregunta se le anteponen los top-k fragmentos más cercanos.
+
+RAG_ACTIVO = os.getenv("RAG_ACTIVO", "1") == "1"
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", 4))
+RAG_INDICE = os.getenv("RAG_INDICE", "auto")            # auto | faiss | hnswlib | numpy
+RAG_EMBEDDINGS = os.getenv("RAG_EMBEDDINGS", "hash")    # hash | nombre de un modelo de sentence-transformers
+RAG_DIMENSION = int(os.getenv("RAG_DIMENSION", 512))    # sólo para los embeddings por hashing
+RAG_REVISION_S = float(os.getenv("RAG_REVISION_S", 5))  # cada cuánto se revisa si hay datos o documentos nuevos
+DOCUMENTOS_DIR = os.getenv("DOCUMENTOS_DIR", os.path.join(DATA_DIR, "documentos"))
+RACHA_EVENTO_MIN = 15   # días: rachas secas que se indexan como evento propio
+DIAS_EXTREMOS = 10      # días de mayor valor del registro que se indexan como evento
+CARACTERES_FRAGMENTO = 800
+
+MESES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+         "septiembre", "octubre", "noviembre", "diciembre"]
+
+# === Embeddings locales ===
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+class EmbeddingsHash:
+    # Hashing de palabras y n-gramas de caracteres con signo, tf sublineal y norma L2.
+    # Sin modelo ni descargas: es léxico, pero tolera plurales y tildes ("sequías" ~ "sequia").
+    def __init__(self, dimension: int = RAG_DIMENSION):
+        self.dimension = dimension
+        self.nombre = f"hash-{dimension}"
+
+    def _rasgos(self, texto: str) -> list:
+        palabras = re.findall(r"\w+", _normalizar(texto))
+        rasgos = list(palabras)
+        rasgos += [f"{a} {b}" for a, b in zip(palabras, palabras[1:])]
+        for palabra in palabras:
+            relleno = f"<{palabra}>"
+            rasgos += [relleno[i:i + 4] for i in range(max(len(relleno) - 3, 1))]
+        return rasgos
+
+    def codificar(self, textos: list) -> np.ndarray:
+        matriz = np.zeros((len(textos), self.dimension), dtype=np.float32)
+        for fila, texto in enumerate(textos):
+            hashes = np.array([zlib.crc32(r.encode("utf-8")) for r in self._rasgos(texto)], dtype=np.int64)
+            if not len(hashes):
+                continue
+            signos = np.where(hashes & (1 << 31), -1.0, 1.0)
+            np.add.at(matriz[fila], hashes % self.dimension, signos)
+        matriz = np.sign(matriz) * np.log1p(np.abs(matriz))
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        return matriz / np.where(normas == 0, 1, normas)
+
+class EmbeddingsTransformer:
+    # Modelo de sentence-transformers en CPU (se carga al primer uso)
+    def __init__(self, nombre: str):
+        from sentence_transformers import SentenceTransformer
+        self.nombre = nombre
+        self._modelo = SentenceTransformer(nombre, device="cpu")
+        self.dimension = self._modelo.get_sentence_embedding_dimension()
+
+    def codificar(self, textos: list) -> np.ndarray:
+        return self._modelo.encode(textos, batch_size=64, normalize_embeddings=True,
+                                   convert_to_numpy=True).astype(np.float32)
+
+def crear_embeddings(nombre: str = RAG_EMBEDDINGS):
+    return EmbeddingsHash() if nombre == "hash" else EmbeddingsTransformer(nombre)
+
+# === Índices vectoriales (producto interno sobre vectores normalizados) ===
+# Ninguno borra físicamente: los fragmentos reemplazados quedan marcados y se filtran.
+class IndiceNumpy:
+    nombre = "numpy"
+
+    def __init__(self, dimension: int):
+        self._vectores = np.zeros((1024, dimension), dtype=np.float32)
+        self._vigentes = np.zeros(1024, dtype=bool)
+        self._n = 0
+
+    def agregar(self, ids: np.ndarray, vectores: np.ndarray):
+        # ids consecutivos desde self._n (los asigna IndiceRecuperacion)
+        fin = self._n + len(ids)
+        if fin > len(self._vectores):
+            capacidad = max(fin, 2 * len(self._vectores))
+            self._vectores = np.resize(self._vectores, (capacidad, self._vectores.shape[1]))
+            self._vigentes = np.concatenate((self._vigentes, np.zeros(capacidad - len(self._vigentes), dtype=bool)))
+        self._vectores[self._n:fin] = vectores
+        self._vigentes[self._n:fin] = True
+        self._n = fin
+
+    def quitar(self, ids):
+        self._vigentes[list(ids)] = False
+
+    def buscar(self, consulta: np.ndarray, k: int) -> tuple:
+        puntajes = self._vectores[:self._n] @ consulta
+        puntajes[~self._vigentes[:self._n]] = -np.inf
+        k = min(k, int(self._vigentes[:self._n].sum()))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        mejores = np.argpartition(-puntajes, k - 1)[:k]
+        mejores = mejores[np.argsort(-puntajes[mejores], kind="stable")]
+        return mejores, puntajes[mejores]
+
+class IndiceHnswlib:
+    nombre = "hnswlib"
+
+    def __init__(self, dimension: int):
+        import hnswlib
+        self._indice = hnswlib.Index(space="ip", dim=dimension)
+        self._indice.init_index(max_elements=1024, ef_construction=200, M=16)
+        self._vigentes = 0
+
+    def agregar(self, ids: np.ndarray, vectores: np.ndarray):
+        necesario = self._indice.get_current_count() + len(ids)
+        if necesario > self._indice.get_max_elements():
+            self._indice.resize_index(max(necesario, 2 * self._indice.get_max_elements()))
+        self._indice.add_items(vectores, ids)
+        self._vigentes += len(ids)
+
+    def quitar(self, ids):
+        for i in ids:
+            self._indice.mark_deleted(int(i))
+        self._vigentes -= len(ids)
+
+    def buscar(self, consulta: np.ndarray, k: int) -> tuple:
+        k = min(k, self._vigentes)
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        self._indice.set_ef(max(64, 2 * k))
+        ids, distancias = self._indice.knn_query(consulta, k=k)
+        return ids[0].astype(np.int64), 1 - distancias[0]
+
+class IndiceFaiss:
+    nombre = "faiss"
+
+    def __init__(self, dimension: int):
+        import faiss
+        self._indice = faiss.IndexIDMap(faiss.IndexHNSWFlat(dimension, 32, faiss.METRIC_INNER_PRODUCT))
+        self._borrados = set()
+
+    def agregar(self, ids: np.ndarray, vectores: np.ndarray):
+        self._indice.add_with_ids(vectores, ids.astype(np.int64))
+
+    def quitar(self, ids):
+        # HNSW no admite borrar: se piden de más y se filtran los reemplazados
+        self._borrados.update(int(i) for i in ids)
+
+    def buscar(self, consulta: np.ndarray, k: int) -> tuple:
+        pedir = min(k + len(self._borrados), self._indice.ntotal)
+        if pedir == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        puntajes, ids = self._indice.search(consulta[None, :], pedir)
+        validos = [(i, p) for i, p in zip(ids[0], puntajes[0]) if i >= 0 and int(i) not in self._borrados][:k]
+        return np.array([i for i, _ in validos], dtype=np.int64), np.array([p for _, p in validos], dtype=np.float32)
+
+INDICES = {"numpy": IndiceNumpy, "hnswlib": IndiceHnswlib, "faiss": IndiceFaiss}
+
+def crear_indice(dimension: int, tipo: str = RAG_INDICE):
+    if tipo != "auto":
+        return INDICES[tipo](dimension)
+    for clase in (IndiceFaiss, IndiceHnswlib):
+        try:
+            return clase(dimension)
+        except ImportError:
+            continue
+    return IndiceNumpy(dimension)
+
+# === Fragmentos de texto a partir de los datos ===
+def _num(valor, decimales=1) -> str:
+    return f"{valor:.{decimales}f}" if np.isfinite(valor) else "s/d"
+
+def _diario(df: pd.DataFrame, umbral: float) -> tuple:
+    # (fechas, total del día, seco) por fecha distinta: con telemetría hay varias lecturas por día.
+    # Seco si todas las lecturas del día son <= umbral, como en calcular_indicadores.
+    diario = pd.DataFrame({"valor": df["valor"].to_numpy(dtype=float), "seco": (df["valor"] <= umbral).to_numpy()}) \
+        .groupby(df["fecha"].dt.normalize().to_numpy()).agg(valor=("valor", "sum"), seco=("seco", "all"))
+    return pd.DatetimeIndex(diario.index), diario["valor"].to_numpy(), diario["seco"].to_numpy()
+
+def _rachas_diarias(fechas: pd.DatetimeIndex, seco: np.ndarray) -> tuple:
+    # (inicios, fines exclusivos) de las rachas de días secos consecutivos; una fecha faltante las corta
+    continua = np.zeros(len(seco), dtype=bool)
+    continua[1:] = seco[1:] & seco[:-1] & (np.diff(fechas.to_numpy()) == np.timedelta64(1, "D"))
+    return np.flatnonzero(seco & ~continua), np.flatnonzero(seco & ~np.append(continua[1:], False)) + 1
+
+def fragmentos_estacion(codigo: str) -> dict:
+    # {id: (texto, metadatos)} con resúmenes mensuales, anuales y de eventos de una estación
+    from backend.analysis import UMBRAL_DIA_SECO
+
+    estacion = registro_estaciones.obtener(codigo)
+    nombre = f"{estacion['codigo']} ({estacion.get('nombre', estacion['codigo'])})"
+    variable = estacion.get("variable", "valor").lower()
+    df = almacen_estacion(codigo).leer(["fecha", "valor"]).dropna()
+    if df.empty:
+        return {}
+    fechas, valores, seco = _diario(df, UMBRAL_DIA_SECO)
+    meta = {"estacion": estacion["codigo"]}
+    fragmentos = {}
+
+    # Mensual: total, días, días sin agua, máximo y anomalía frente al mismo mes de otros años
+    mensual = pd.DataFrame({"valor": valores, "seco": seco, "fecha": fechas}).groupby(fechas.to_period("M"))
+    tabla = mensual.agg(total=("valor", "sum"), dias=("valor", "size"), secos=("seco", "sum"), maximo=("valor", "max"),
+                        dia_maximo=("valor", "idxmax"))
+    climatologia = tabla["total"].groupby(tabla.index.month).transform("mean")
+    for periodo, fila, normal in zip(tabla.index, tabla.itertuples(), climatologia):
+        anomalia = (fila.total / normal - 1) * 100 if normal else np.nan
+        fragmentos[f"{codigo}/mes/{periodo}"] = (
+            f"Estación {nombre}, {MESES[periodo.month - 1]} de {periodo.year}: {variable} total {_num(fila.total)} "
+            f"en {fila.dias} días con datos; {fila.secos} días sin agua ({fila.secos / fila.dias * 100:.0f}%); "
+            f"máximo diario {_num(fila.maximo)} el {fechas[fila.dia_maximo]:%Y-%m-%d}; "
+            f"{_num(anomalia, 0)}% respecto al promedio de {MESES[periodo.month - 1]}.",
+            {**meta, "tipo": "mes"},
+        )
+
+    # Anual: totales, ranking, meses extremos y racha seca más larga del año
+    inicios, fines = _rachas_diarias(fechas, seco)
+    largos = fines - inicios
+    anual = tabla.groupby(tabla.index.year).agg(total=("total", "sum"), dias=("dias", "sum"), secos=("secos", "sum"))
+    ranking = anual["total"].rank(ascending=False, method="min").astype(int)
+    for anio, fila in anual.iterrows():
+        meses = tabla[tabla.index.year == anio]["total"]
+        del_anio = fechas[inicios].year == anio
+        racha = largos[del_anio].max() if del_anio.any() else 0
+        fragmentos[f"{codigo}/anio/{anio}"] = (
+            f"Estación {nombre}, año {anio}: {variable} total {_num(fila.total)} en {int(fila.dias)} días con datos "
+            f"(puesto {ranking[anio]} de {len(anual)} años, del más húmedo al más seco); {int(fila.secos)} días sin agua; "
+            f"mes más húmedo {MESES[meses.idxmax().month - 1]} ({_num(meses.max())}), "
+            f"más seco {MESES[meses.idxmin().month - 1]} ({_num(meses.min())}); racha seca más larga iniciada en el año: {racha} días.",
+            {**meta, "tipo": "anio"},
+        )
+
+    # Eventos: rachas secas largas y días de mayor valor
+    orden_rachas = (-largos).argsort(kind="stable")
+    puesto = np.empty(len(largos), dtype=np.int64)
+    puesto[orden_rachas] = np.arange(1, len(largos) + 1)
+    for i in np.flatnonzero(largos >= RACHA_EVENTO_MIN):
+        inicio, fin = fechas[inicios[i]], fechas[fines[i] - 1]
+        fragmentos[f"{codigo}/racha/{inicio:%Y-%m-%d}"] = (
+            f"Evento de sequía en la estación {nombre}: racha seca de {largos[i]} días sin agua entre "
+            f"{inicio:%Y-%m-%d} y {fin:%Y-%m-%d}" + (" (en curso)" if fines[i] == len(seco) else "") +
+            f"; es la racha número {puesto[i]} más larga de {len(largos)} registradas.",
+            {**meta, "tipo": "evento"},
+        )
+    for posicion, i in enumerate(np.argsort(-valores, kind="stable")[:DIAS_EXTREMOS], start=1):
+        fragmentos[f"{codigo}/extremo/{posicion}"] = (
+            f"Evento extremo en la estación {nombre}: el {fechas[i]:%Y-%m-%d} se registró {variable} de {_num(valores[i])}, "
+            f"el valor diario número {posicion} más alto del registro.",
+            {**meta, "tipo": "evento"},
+        )
+    return fragmentos
+
+def fragmentos_documento(ruta: str) -> dict:
+    # Párrafos de un documento técnico (.txt o .md) agrupados hasta CARACTERES_FRAGMENTO
+    with open(ruta, encoding="utf-8", errors="replace") as f:
+        parrafos = [p.strip() for p in re.split(r"\n\s*\n", f.read()) if p.strip()]
+    nombre = os.path.basename(ruta)
+    fragmentos, actual = {}, ""
+    for parrafo in parrafos:
+        if actual and len(actual) + len(parrafo) > CARACTERES_FRAGMENTO:
+            fragmentos[f"doc/{nombre}/{len(fragmentos)}"] = (actual, {"estacion": None, "tipo": "documento", "fuente": nombre})
+            actual = ""
+        actual = f"{actual}\n{parrafo}" if actual else parrafo
+    if actual:
+        fragmentos[f"doc/{nombre}/{len(fragmentos)}"] = (actual, {"estacion": None, "tipo": "documento", "fuente": nombre})
+    return fragmentos
+
+# === Índice con actualización incremental ===
+class IndiceRecuperacion:
+    def __init__(self, embeddings=None, tipo_indice: str = RAG_INDICE):
+        self._embeddings = embeddings
+        self._tipo_indice = tipo_indice
+        self._indice = None
+        self._fragmentos = {}   # id -> (número interno, huella, texto, metadatos)
+        self._por_numero = {}   # número interno -> id
+        self._siguiente = 0
+        self._versiones = {}    # fuente (estación o documento) -> versión indexada
+        self._revisado = 0.0
+        self._lock = threading.Lock()
+        self.contadores = {"vectorizados": 0, "reemplazados": 0, "eliminados": 0, "busquedas": 0}
+
+    def _preparar(self):
+        if self._indice is None:
+            self._embeddings = self._embeddings or crear_embeddings()
+            self._indice = crear_indice(self._embeddings.dimension, self._tipo_indice)
+
+    def actualizar(self, prefijo: str, fragmentos: dict):
+        # Reemplaza los fragmentos bajo prefijo: vectoriza sólo los nuevos o cambiados
+        with self._lock:
+            self._preparar()
+            nuevos, quitar = [], []
+            for id_fragmento, (texto, metadatos) in fragmentos.items():
+                huella = hashlib.sha1(texto.encode("utf-8")).hexdigest()
+                anterior = self._fragmentos.get(id_fragmento)
+                if anterior is not None and anterior[1] == huella:
+                    continue
+                if anterior is not None:
+                    quitar.append(anterior[0])
+                    self.contadores["reemplazados"] += 1
+                nuevos.append((id_fragmento, huella, texto, metadatos))
+            for id_fragmento in [i for i in self._fragmentos if i.startswith(prefijo) and i not in fragmentos]:
+                quitar.append(self._fragmentos.pop(id_fragmento)[0])
+                self.contadores["eliminados"] += 1
+            if quitar:
+                self._indice.quitar(quitar)
+                for numero in quitar:
+                    self._por_numero.pop(numero, None)
+            if nuevos:
+                vectores = self._embeddings.codificar([texto for _, _, texto, _ in nuevos])
+                numeros = np.arange(self._siguiente, self._siguiente + len(nuevos), dtype=np.int64)
+                self._indice.agregar(numeros, vectores)
+                self._siguiente += len(nuevos)
+                for numero, (id_fragmento, huella, texto, metadatos) in zip(numeros.tolist(), nuevos):
+                    self._fragmentos[id_fragmento] = (numero, huella, texto, metadatos)
+                    self._por_numero[numero] = id_fragmento
+                self.contadores["vectorizados"] += len(nuevos)
+            return len(nuevos)
+
+    def sincronizar(self, forzar: bool = False):
+        # Re-indexa estaciones cuya versión del almacén cambió y documentos nuevos o modificados
+        if not forzar and time.monotonic() - self._revisado < RAG_REVISION_S:
+            return
+        self._revisado = time.monotonic()
+        for estacion in registro_estaciones.listar():
+            codigo = estacion["codigo"]
+            version = almacen_estacion(codigo).version()
+            if self._versiones.get(codigo) != version:
+                self.actualizar(f"{codigo}/", fragmentos_estacion(codigo))
+                self._versiones[codigo] = version
+        documentos = sorted(os.listdir(DOCUMENTOS_DIR)) if os.path.isdir(DOCUMENTOS_DIR) else []
+        for archivo in documentos:
+            if not archivo.endswith((".txt", ".md")):
+                continue
+            ruta = os.path.join(DOCUMENTOS_DIR, archivo)
+            version = os.stat(ruta).st_mtime_ns
+            if self._versiones.get(f"doc/{archivo}") != version:
+                self.actualizar(f"doc/{archivo}/", fragmentos_documento(ruta))
+                self._versiones[f"doc/{archivo}"] = version
+        for retirado in [f for f in self._versiones if f.startswith("doc/") and f[4:] not in documentos]:
+            self.actualizar(f"{retirado}/", {})
+            del self._versiones[retirado]
+
+    def buscar(self, consulta: str, k: int = RAG_TOP_K, estacion: str = None) -> list:
+        # Con estacion, sólo sus fragmentos y los documentos técnicos
+        self.sincronizar()
+        with self._lock:
+            self._preparar()
+            self.contadores["busquedas"] += 1
+            vector = self._embeddings.codificar([consulta])[0]
+            pedir = k if estacion is None else 4 * k
+            while True:
+                numeros, puntajes = self._indice.buscar(vector, pedir)
+                resultados = []
+                for numero, puntaje in zip(numeros.tolist(), puntajes.tolist()):
+                    id_fragmento = self._por_numero.get(numero)
+                    if id_fragmento is None:
+                        continue
+                    _, _, texto, metadatos = self._fragmentos[id_fragmento]
+                    if estacion is not None and metadatos.get("estacion") not in (None, estacion):
+                        continue
+                    resultados.append({"id": id_fragmento, "texto": texto, "puntaje": round(float(puntaje), 4), **metadatos})
+                if len(resultados) >= k or len(numeros) < pedir:
+                    return resultados[:k]
+                pedir *= 4
+
+    def contexto(self, consulta: str, k: int = RAG_TOP_K, estacion: str = None) -> str:
+        fragmentos = self.buscar(consulta, k, estacion)
+        return "\n".join(f"- {f['texto']}" for f in fragmentos)
+
+    def estadisticas(self) -> dict:
+        return {
+            **self.contadores,
+            "fragmentos": len(self._fragmentos),
+            "indice": self._indice.nombre if self._indice is not None else None,
+            "embeddings": self._embeddings.nombre if self._embeddings is not None else None,
+            "fuentes": len(self._versiones),
+        }
+
+indice_recuperacion = IndiceRecuperacion()
+
+# === Benchmark: latencia de recuperación al crecer el corpus ===
+# python -m backend.recuperacion [max_fragmentos]
+if __name__ == "__main__":
+    import sys
+
+    maximo = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = np.random.default_rng(0)
+    embeddings = EmbeddingsHash()
+    textos = [f"Estación C{i % 40}, {MESES[i % 12]} de {1950 + i % 75}: precipitación total {rng.gamma(2, 30):.1f}, "
+              f"{rng.integers(0, 31)} días sin agua." for i in range(2_000)]
+    inicio = time.perf_counter()
+    embeddings.codificar(textos)
+    print(f"Embeddings hash: {len(textos) / (time.perf_counter() - inicio):,.0f} fragmentos/s")
+
+    consultas = embeddings.codificar(["¿Cuál fue el mes más seco de 2010?", "racha seca más larga", "enero lluvioso"])
+    disponibles = [n for n, c in INDICES.items() if n == "numpy" or __import__("importlib").util.find_spec(n)]
+    tamanio = 1_000
+    while tamanio <= maximo:
+        # Vectores de corpus: los de textos reales repetidos con ruido, para no medir sólo el hashing
+        base = embeddings.codificar(textos)[rng.integers(0, len(textos), tamanio)]
+        corpus = base + rng.normal(0, 0.05, base.shape).astype(np.float32)
+        corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+        for nombre in disponibles:
+            indice = INDICES[nombre](embeddings.dimension)
+            inicio = time.perf_counter()
+            for desde in range(0, tamanio, 10_000):  # Altas incrementales, por bloques
+                indice.agregar(np.arange(desde, min(desde + 10_000, tamanio)), corpus[desde:desde + 10_000])
+            alta = time.perf_counter() - inicio
+            latencias = []
+            for _ in range(30):
+                for consulta in consultas:
+                    inicio = time.perf_counter()
+                    indice.buscar(consulta, RAG_TOP_K)
+                    latencias.append(time.perf_counter() - inicio)
+            latencias.sort()
+            print(f"{tamanio:>8,} fragmentos | {nombre:>7}: alta {alta * 1000:8.1f} ms | "
+                  f"búsqueda p50 {latencias[len(latencias) // 2] * 1000:6.2f} ms, p95 {latencias[int(len(latencias) * 0.95)] * 1000:6.2f} ms")
+        tamanio *= 10
+
+    # Los fragmentos cuentan fechas, no lecturas: 10 días horarios con lluvia el día 4 y sin el día 8
+    horas = pd.date_range("2024-01-01", periods=10 * 24, freq="h")
+    horaria = pd.DataFrame({"fecha": horas, "valor": np.where(horas.day == 4, 0.5, 0.0)})
+    fechas, valores, seco = _diario(horaria[horaria["fecha"].dt.day != 8], 0.0)
+    inicios, fines = _rachas_diarias(fechas, seco)
+    assert len(fechas) == 9 and seco.sum() == 8 and valores.max() == 12.0
+    assert (fines - inicios).tolist() == [3, 3, 2], (inicios, fines)
+
+    # Extremo a extremo con las estaciones del directorio de datos
+    indice = IndiceRecuperacion(embeddings)
+    inicio = time.perf_counter()
+    indice.sincronizar(forzar=True)
+    print(f"Indexación de estaciones: {time.perf_counter() - inicio:.2f} s | {indice.estadisticas()}")
+    for pregunta in ("¿Cuál fue la sequía más larga?", "¿Cómo fue la lluvia en marzo de 2021?"):
+        inicio = time.perf_counter()
+        resultados = indice.buscar(pregunta)
+        print(f"{pregunta} ({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        for r in resultados[:2]:
+            print(f"   {r['puntaje']:.3f} {r['texto'][:110]}")
@@ -0,0 +1,211 @@
+import io
+import os
+import re
+import html
+import base64
+import shutil
+import struct
+from functools import lru_cache
+
+# === Render del reporte a PDF dentro del proceso ===
+# El reporte se describe como un diccionario (título, metadatos, resumen y secciones
+# con la imagen PNG en memoria y el análisis) y se compone con ReportLab directo a
+# bytes: sin wkhtmltopdf, sin archivos temporales y sin URLs file:///. Fuentes, estilos
+# y la plantilla de página se preparan una sola vez por proceso y se reutilizan.
+# El motor wkhtmltopdf sigue disponible (REPORTE_PDF_MOTOR=wkhtmltopdf) con las
+# imágenes incrustadas como data: URIs, para comparar o si se prefiere su estilo HTML.
+
+REPORTE_PDF_MOTOR = os.getenv("REPORTE_PDF_MOTOR", "reportlab")
+WKHTMLTOPDF_PATH = (os.getenv("WKHTMLTOPDF_PATH") or shutil.which("wkhtmltopdf")
+                    or r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe")
+ANCHO_GRAFICO_CM = 16
+
+# Emojis fuera del plano básico (y el selector de variación): las fuentes PDF no los tienen
+_SIN_GLIFO = re.compile("[\U00010000-\U0010FFFF\uFE0F]")
+
+def _texto(valor) -> str:
+    # Texto plano a marcado de Paragraph: sin emojis y con &, < y > escapados
+    return html.escape(_SIN_GLIFO.sub("", str(valor)).strip(), quote=False)
+
+def _tamano_png(datos: bytes) -> tuple:
+    # Ancho y alto en píxeles desde la cabecera IHDR, sin decodificar la imagen
+    return struct.unpack(">II", datos[16:24])
+
+@lru_cache(maxsize=1)
+def _fuentes() -> tuple:
+    # DejaVu (viene con matplotlib) cubre acentos, ñ y símbolos; si no está, Helvetica
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    try:
+        import matplotlib
+        carpeta = os.path.join(matplotlib.get_data_path(), "fonts", "ttf")
+        pdfmetrics.registerFont(TTFont("DejaVuSans", os.path.join(carpeta, "DejaVuSans.ttf")))
+        pdfmetrics.registerFont(TTFont("DejaVuSans-Bold", os.path.join(carpeta, "DejaVuSans-Bold.ttf")))
+        pdfmetrics.registerFontFamily("DejaVuSans", normal="DejaVuSans", bold="DejaVuSans-Bold",
+                                      italic="DejaVuSans", boldItalic="DejaVuSans-Bold")
+        return "DejaVuSans", "DejaVuSans-Bold"
+    except Exception:
+        return "Helvetica", "Helvetica-Bold"
+
+@lru_cache(maxsize=1)
+def plantilla() -> dict:
+    # Estilos del reporte; se construyen una vez por proceso
+    from reportlab import rl_config
+    from reportlab.lib import colors
+    from reportlab.lib.styles import ParagraphStyle
+
+    # Flujos binarios en vez de ASCII85: el PDF pesa menos y no se codifica en Python puro
+    rl_config.useA85 = 0
+
+    normal, negrita = _fuentes()
+    base = ParagraphStyle("base", fontName=normal, fontSize=10, leading=14, spaceAfter=6)
+    return {
+        "titulo": ParagraphStyle("titulo", parent=base, fontName=negrita, fontSize=18, leading=22, spaceAfter=10,
+                                 textColor=colors.HexColor("#0b3d91")),
+        "h2": ParagraphStyle("h2", parent=base, fontName=negrita, fontSize=14, leading=18, spaceBefore=10),
+        "h3": ParagraphStyle("h3", parent=base, fontName=negrita, fontSize=12, leading=16, spaceBefore=8),
+        "normal": base,
+        "item": ParagraphStyle("item", parent=base, leftIndent=14, bulletIndent=4, spaceAfter=2),
+        "pie": ParagraphStyle("pie", parent=base, fontSize=8, textColor=colors.grey),
+    }
+
+def _pie_de_pagina(canvas, documento):
+    canvas.saveState()
+    canvas.setFont(plantilla()["pie"].fontName, 8)
+    canvas.drawRightString(documento.pagesize[0] - documento.rightMargin, 1.2 * 28.35, f"Página {documento.page}")
+    canvas.restoreState()
+
+def renderizar_reportlab(contenido: dict) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Image, Spacer, KeepTogether
+
+    estilos = plantilla()
+    buffer = io.BytesIO()
+    documento = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=2 * cm, rightMargin=2 * cm,
+                                  topMargin=2 * cm, bottomMargin=2 * cm, title=_texto(contenido["titulo"]))
+    partes = [Paragraph(_texto(contenido["titulo"]), estilos["titulo"])]
+    for etiqueta, valor in contenido.get("metadatos", {}).items():
+        partes.append(Paragraph(f"<b>{_texto(etiqueta)}:</b> {_texto(valor)}", estilos["normal"]))
+    partes.append(Paragraph(_texto("📌 Resumen"), estilos["h2"]))
+    partes += [Paragraph(_texto(linea), estilos["item"], bulletText="•") for linea in contenido.get("resumen", [])]
+    partes.append(Paragraph(_texto("📈 Gráficos y Análisis"), estilos["h2"]))
+
+    for seccion in contenido.get("secciones", []):
+        bloque = [Paragraph(_texto(seccion["titulo"]), estilos["h3"])]
+        if seccion.get("png"):
+            ancho, alto = _tamano_png(seccion["png"])
+            bloque.append(Image(io.BytesIO(seccion["png"]), width=ANCHO_GRAFICO_CM * cm,
+                                height=ANCHO_GRAFICO_CM * cm * alto / ancho))
+        partes.append(KeepTogether(bloque))
+        if seccion.get("analisis"):
+            texto = _texto(seccion["analisis"]).replace("\n", "<br/>")
+            partes.append(Paragraph(f"<b>Análisis IA:</b> {texto}", estilos["normal"]))
+        partes.append(Spacer(1, 0.3 * cm))
+
+    documento.build(partes, onFirstPage=_pie_de_pagina, onLaterPages=_pie_de_pagina)
+    return buffer.getvalue()
+
+def html_reporte(contenido: dict) -> str:
+    # Misma estructura en HTML, con los gráficos como data: URIs (o la "url" de la sección, si la trae)
+    secciones = ""
+    for seccion in contenido.get("secciones", []):
+        secciones += f"\n    <h3>{html.escape(seccion['titulo'])}</h3>\n"
+        fuente = seccion.get("url") or (seccion.get("png") and f"data:image/png;base64,{base64.b64encode(seccion['png']).decode()}")
+        if fuente:
+            secciones += f'    <img src="{fuente}" width="600"/>\n'
+        if seccion.get("analisis"):
+            secciones += f"    <p><strong>Análisis IA:</strong> {html.escape(seccion['analisis'])}</p>\n"
+    metadatos = "".join(f"\n    <p><strong>{html.escape(k)}:</strong> {html.escape(str(v))}</p>"
+                        for k, v in contenido.get("metadatos", {}).items())
+    resumen = "".join(f"\n        <li>{html.escape(linea)}</li>" for linea in contenido.get("resumen", []))
+    return f"""<!DOCTYPE html>
+    <html lang="es">
+    <head><meta charset="UTF-8"><title>Reporte Sequía</title></head>
+    <body>
+    <h1>{html.escape(contenido['titulo'])}</h1>{metadatos}
+    <h2>📌 Resumen</h2>
+    <ul>{resumen}
+    </ul>
+    <h2>📈 Gráficos y Análisis</h2>
+{secciones}
+    </body>
+    </html>
+    """
+
+def renderizar_wkhtmltopdf(contenido: dict) -> bytes:
+    import pdfkit
+    config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
+    # output_path=False: wkhtmltopdf escribe a stdout y pdfkit devuelve los bytes
+    return pdfkit.from_string(html_reporte(contenido), False, configuration=config, options={"quiet": ""})
+
+MOTORES = {"reportlab": renderizar_reportlab, "wkhtmltopdf": renderizar_wkhtmltopdf}
+
+def renderizar(contenido: dict, motor: str = None) -> bytes:
+    return MOTORES[motor or REPORTE_PDF_MOTOR](contenido)
+
+# === Benchmark: python -m backend.render_pdf [repeticiones] ===
+# Compara este render en memoria con el camino anterior (PNG a disco + file:/// + wkhtmltopdf)
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+    import subprocess
+    import numpy as np
+    import pandas as pd
+    from backend.graficos import dibujar
+
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = np.random.default_rng(0)
+    fechas = pd.date_range("2000-01-01", periods=25 * 365, freq="D")
+    df = pd.DataFrame({"fecha": fechas, "valor": np.where(rng.random(len(fechas)) < 0.4, 0, rng.gamma(0.8, 5, len(fechas)))})
+    imagenes = [dibujar("dias_sin_agua_anio", df[df["valor"] == 0].groupby(df["fecha"].dt.year).size()),
+                dibujar("variacion_temporal", df)]
+    analisis = "La serie muestra una estacionalidad marcada con meses secos entre junio y septiembre. " * 6
+    contenido = {
+        "titulo": "Reporte de Sequía - Calderón (C20) 💧",
+        "metadatos": {"Fecha": "2025-01-01 00:00:00", "Período": "2000-01-01 a 2024-12-31"},
+        "resumen": ["Total días: 9125", "Días sin agua: 3650", "Porcentaje sin agua: 40.0%", "Fiabilidad: 98.5%"],
+        "secciones": [{"titulo": f"🟦 Sección {i}", "png": imagenes[i % 2], "analisis": analisis} for i in range(3)],
+    }
+
+    def medir(funcion):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        return resultado, sorted(tiempos)
+
+    inicio = time.perf_counter()
+    pdf = renderizar_reportlab(contenido)
+    primero = time.perf_counter() - inicio
+    pdf, tiempos = medir(lambda: renderizar_reportlab(contenido))
+    assert pdf.startswith(b"%PDF")
+    print(f"reportlab (memoria): primero {primero * 1000:.0f} ms (fuentes y estilos) | "
+          f"p50 {tiempos[len(tiempos) // 2] * 1000:.1f} ms | {len(pdf) / 1024:.0f} KB")
+
+    try:
+        subprocess.run([WKHTMLTOPDF_PATH, "--version"], capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        print(f"wkhtmltopdf no disponible en {WKHTMLTOPDF_PATH}: se omite la comparación")
+        sys.exit(0)
+
+    def camino_anterior():
+        import pdfkit
+        with tempfile.TemporaryDirectory() as tmp:
+            partes = []
+            for i, seccion in enumerate(contenido["secciones"]):
+                ruta = os.path.join(tmp, f"{i}.png")
+                with open(ruta, "wb") as f:
+                    f.write(seccion["png"])
+                partes.append({**seccion, "png": None, "url": f"file:///{os.path.abspath(ruta).replace(os.sep, '/')}"})
+            salida = os.path.join(tmp, "reporte.pdf")
+            pdfkit.from_string(html_reporte({**contenido, "secciones": partes}), salida,
+                               configuration=pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH),
+                               options={"enable-local-file-access": "", "quiet": ""})
+            with open(salida, "rb") as f:
+                return f.read()
+
+    pdf, tiempos = medir(camino_anterior)
+    print(f"wkhtmltopdf (archivos): p50 {tiempos[len(tiempos) // 2] * 1000:.1f} ms | {len(pdf) / 1024:.0f} KB")
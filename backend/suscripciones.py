@@ -0,0 +1,289 @@
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from collections import defaultdict
+from backend.estaciones import registro_estaciones, DATA_DIR
+from backend.trabajos import gestor_trabajos, COMPLETADO
+from backend.correo import bandeja_salida
+
+# === Suscripciones y distribución programada de reportes ===
+# Cada suscriptor pide una estación con una frecuencia (diaria, semanal o mensual).
+# El programador revisa cada SUSCRIPCIONES_REVISION_S qué (estación, frecuencia) no
+# se ha enviado aún en el período vigente, genera el reporte de cada estación una sola
+# vez y lo reparte: un mensaje por (estación, frecuencia) con todos sus suscriptores en
+# el sobre y el PDF leído una vez y compartido en memoria. El costo crece con las
+# estaciones, no con los destinatarios. Quien se suscribe a un período ya enviado
+# recibe el reporte desde el siguiente.
+#
+# Con varios workers (o procesos) cada uno corre su programador: antes de generar,
+# cada (estación, frecuencia, período) se reclama con un INSERT en envios (sin
+# id_correo). Sólo quien lo inserta lo envía; si falla, borra el reclamo y se
+# reintenta en la próxima revisión. Un reclamo huérfano (worker caído) vence a los
+# SUSCRIPCIONES_RECLAMO_S segundos.
+
+SUSCRIPCIONES_DB = os.getenv("SUSCRIPCIONES_DB", os.path.join(DATA_DIR, "suscripciones.db"))
+SUSCRIPCIONES_REVISION_S = float(os.getenv("SUSCRIPCIONES_REVISION_S", 300))
+SUSCRIPCIONES_HORA = int(os.getenv("SUSCRIPCIONES_HORA", 7))  # no se envía antes de esta hora local
+SUSCRIPCIONES_RECLAMO_S = float(os.getenv("SUSCRIPCIONES_RECLAMO_S", 3600))
+SUSCRIPCIONES_PROGRAMADOR = os.getenv("SUSCRIPCIONES_PROGRAMADOR", "1") == "1"
+
+FRECUENCIAS = {
+    "diaria": lambda momento: momento.date().isoformat(),
+    "semanal": lambda momento: "{}-W{:02d}".format(*momento.isocalendar()[:2]),
+    "mensual": lambda momento: momento.strftime("%Y-%m"),
+}
+
+def periodo(frecuencia: str, momento: datetime) -> str:
+    return FRECUENCIAS[frecuencia](momento)
+
+class Suscripciones:
+    def __init__(self, ruta_db: str = SUSCRIPCIONES_DB, revision_s: float = SUSCRIPCIONES_REVISION_S,
+                 hora: int = SUSCRIPCIONES_HORA, bandeja=bandeja_salida, reclamo_s: float = SUSCRIPCIONES_RECLAMO_S):
+        self.ruta_db = ruta_db
+        self.revision_s = revision_s
+        self.hora = hora
+        self.reclamo_s = reclamo_s
+        self.bandeja = bandeja
+        self._db = None
+        self._lock = threading.Lock()
+        self._ejecutando = threading.Lock()  # una distribución a la vez (programador o manual)
+        self._detener = threading.Event()
+        self._hilo = None
+        self.contadores = {"ejecuciones": 0, "reportes_generados": 0, "mensajes": 0, "destinatarios": 0, "errores": 0}
+
+    def _abrir_db(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.ruta_db) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.ruta_db, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS suscriptores (id INTEGER PRIMARY KEY AUTOINCREMENT, correo TEXT, "
+                "estacion TEXT, frecuencia TEXT, creado REAL, UNIQUE (correo, estacion, frecuencia))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS suscriptores_grupo ON suscriptores (frecuencia, estacion)")
+            # Un registro por (estación, frecuencia, período) ya distribuido: evita repetir envíos
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS envios (estacion TEXT, frecuencia TEXT, periodo TEXT, id_correo TEXT, "
+                "destinatarios INTEGER, creado REAL, PRIMARY KEY (estacion, frecuencia, periodo))"
+            )
+            self._db.commit()
+        return self._db
+
+    def agregar(self, correo: str, estacion: str = None, frecuencia: str = "semanal") -> dict:
+        if frecuencia not in FRECUENCIAS:
+            raise ValueError(f"Frecuencia desconocida: {frecuencia}. Opciones: {', '.join(FRECUENCIAS)}")
+        codigo = registro_estaciones.obtener(estacion)["codigo"]
+        correo = correo.strip().lower()
+        with self._lock:
+            db = self._abrir_db()
+            db.execute("INSERT OR IGNORE INTO suscriptores (correo, estacion, frecuencia, creado) VALUES (?, ?, ?, ?)",
+                       (correo, codigo, frecuencia, time.time()))
+            db.commit()
+            id_suscripcion = db.execute("SELECT id FROM suscriptores WHERE correo = ? AND estacion = ? AND frecuencia = ?",
+                                        (correo, codigo, frecuencia)).fetchone()[0]
+        return {"id": id_suscripcion, "correo": correo, "estacion": codigo, "frecuencia": frecuencia}
+
+    def agregar_lote(self, filas) -> int:
+        # (correo, estacion, frecuencia) en una sola transacción; para importar listas grandes
+        filas = [(c.strip().lower(), registro_estaciones.obtener(e)["codigo"], f, time.time()) for c, e, f in filas]
+        if any(f not in FRECUENCIAS for _, _, f, _ in filas):
+            raise ValueError(f"Frecuencia desconocida. Opciones: {', '.join(FRECUENCIAS)}")
+        with self._lock:
+            db = self._abrir_db()
+            antes = db.total_changes
+            db.executemany("INSERT OR IGNORE INTO suscriptores (correo, estacion, frecuencia, creado) VALUES (?, ?, ?, ?)", filas)
+            db.commit()
+            return db.total_changes - antes
+
+    def eliminar(self, id_suscripcion: int) -> bool:
+        with self._lock:
+            db = self._abrir_db()
+            borradas = db.execute("DELETE FROM suscriptores WHERE id = ?", (id_suscripcion,)).rowcount
+            db.commit()
+        return borradas > 0
+
+    def listar(self, estacion: str = None) -> list:
+        consulta, parametros = "SELECT id, correo, estacion, frecuencia FROM suscriptores", ()
+        if estacion:
+            consulta, parametros = consulta + " WHERE estacion = ?", (registro_estaciones.obtener(estacion)["codigo"],)
+        with self._lock:
+            filas = self._abrir_db().execute(consulta + " ORDER BY id", parametros).fetchall()
+        return [dict(zip(("id", "correo", "estacion", "frecuencia"), fila)) for fila in filas]
+
+    def pendientes(self, momento: datetime) -> dict:
+        # {estación: {frecuencia: (período, [correos])}} de lo que aún no se envió en el período vigente
+        grupos = defaultdict(dict)
+        with self._lock:
+            db = self._abrir_db()
+            for frecuencia in FRECUENCIAS:
+                actual = periodo(frecuencia, momento)
+                filas = db.execute(
+                    "SELECT s.estacion, s.correo FROM suscriptores s WHERE s.frecuencia = ? AND NOT EXISTS ("
+                    "SELECT 1 FROM envios e WHERE e.estacion = s.estacion AND e.frecuencia = s.frecuencia "
+                    "AND e.periodo = ?) ORDER BY s.estacion, s.id", (frecuencia, actual),
+                ).fetchall()
+                for estacion, correo in filas:
+                    grupos[estacion].setdefault(frecuencia, (actual, []))[1].append(correo)
+        return dict(grupos)
+
+    def _reclamar(self, estacion: str, frecuencia: str, actual: str) -> bool:
+        # INSERT sobre la clave primaria: de varios workers, sólo uno lo consigue
+        with self._lock:
+            db = self._abrir_db()
+            db.execute("DELETE FROM envios WHERE estacion = ? AND frecuencia = ? AND periodo = ? "
+                       "AND id_correo IS NULL AND creado < ?", (estacion, frecuencia, actual, time.time() - self.reclamo_s))
+            reclamado = db.execute("INSERT OR IGNORE INTO envios VALUES (?, ?, ?, NULL, 0, ?)",
+                                   (estacion, frecuencia, actual, time.time())).rowcount == 1
+            db.commit()
+        return reclamado
+
+    def _liberar(self, estacion: str, frecuencia: str, actual: str):
+        with self._lock:
+            self._db.execute("DELETE FROM envios WHERE estacion = ? AND frecuencia = ? AND periodo = ? AND id_correo IS NULL",
+                             (estacion, frecuencia, actual))
+            self._db.commit()
+
+    def _distribuir(self, estacion: str, grupos: dict, resumen: list):
+        trabajo = gestor_trabajos.esperar(gestor_trabajos.enviar(estacion=estacion))
+        if trabajo.estado != COMPLETADO:
+            raise RuntimeError(trabajo.error or "No se pudo generar el reporte")
+        self.contadores["reportes_generados"] += 1
+        with open(trabajo.ruta_pdf, "rb") as f:
+            adjunto = (f"reporte_sequia_{estacion}.pdf", f.read())
+        nombre = registro_estaciones.obtener(estacion).get("nombre", estacion)
+        for frecuencia in list(grupos):
+            actual, correos = grupos.pop(frecuencia)
+            try:
+                id_correo = self.bandeja.encolar(
+                    correos,
+                    asunto=f"Reporte de Sequía - {nombre} ({frecuencia}, {actual})",
+                    cuerpo=f"Adjunto el reporte {frecuencia} de sequía de la estación {nombre} ({estacion}).",
+                    adjuntos=[adjunto],
+                )
+            except ValueError as e:
+                # Sin registro en envios: se reintenta en la próxima revisión
+                self._liberar(estacion, frecuencia, actual)
+                self.contadores["errores"] += 1
+                resumen.append({"estacion": estacion, "frecuencia": frecuencia, "periodo": actual, "error": str(e)})
+                continue
+            with self._lock:
+                self._db.execute("UPDATE envios SET id_correo = ?, destinatarios = ?, creado = ? "
+                                 "WHERE estacion = ? AND frecuencia = ? AND periodo = ?",
+                                 (id_correo, len(correos), time.time(), estacion, frecuencia, actual))
+                self._db.commit()
+            self.contadores["mensajes"] += 1
+            self.contadores["destinatarios"] += len(correos)
+            resumen.append({"estacion": estacion, "frecuencia": frecuencia, "periodo": actual,
+                            "destinatarios": len(correos), "id_correo": id_correo})
+
+    def ejecutar(self, momento: datetime = None, forzar: bool = False) -> list:
+        # Genera cada reporte pendiente una vez y lo encola para todos sus suscriptores
+        momento = momento or datetime.now()
+        if not forzar and momento.hour < self.hora:
+            return []
+        resumen = []
+        with self._ejecutando:
+            self.contadores["ejecuciones"] += 1
+            for estacion, grupos in self.pendientes(momento).items():
+                # Sólo lo reclamado por este worker; lo que otro ya tomó se omite
+                grupos = {f: g for f, g in grupos.items() if self._reclamar(estacion, f, g[0])}
+                if not grupos:
+                    continue
+                try:
+                    self._distribuir(estacion, grupos, resumen)
+                except Exception as e:
+                    # Un fallo de una estación no detiene a las demás; sus reclamos pendientes se liberan
+                    for frecuencia, (actual, _) in grupos.items():
+                        self._liberar(estacion, frecuencia, actual)
+                    self.contadores["errores"] += 1
+                    resumen.append({"estacion": estacion, "error": str(e)})
+        return resumen
+
+    def envios(self, limite: int = 50) -> list:
+        with self._lock:
+            filas = self._abrir_db().execute(
+                "SELECT estacion, frecuencia, periodo, id_correo, destinatarios, creado FROM envios "
+                "WHERE id_correo IS NOT NULL ORDER BY creado DESC LIMIT ?", (limite,),
+            ).fetchall()
+        return [dict(zip(("estacion", "frecuencia", "periodo", "id_correo", "destinatarios", "creado"), fila)) for fila in filas]
+
+    def _programar(self):
+        while not self._detener.is_set():
+            try:
+                self.ejecutar()
+            except Exception as e:
+                self.contadores["errores"] += 1
+                print(f"❌ Error al distribuir reportes programados: {e}")
+            self._detener.wait(self.revision_s)
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._programar, name="suscripciones", daemon=True)
+            self._hilo.start()
+
+    def cerrar(self):
+        self._detener.set()
+        self._hilo = None
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            suscriptores = self._abrir_db().execute("SELECT COUNT(*) FROM suscriptores").fetchone()[0]
+        return {**self.contadores, "suscriptores": suscriptores, "programador": self._hilo is not None}
+
+suscripciones = Suscripciones()
+
+# === Benchmark: python -m backend.suscripciones [suscriptores...] ===
+# Distribuye a N suscriptores de una estación contra un SMTP local (pip install aiosmtpd)
+# y cuenta reportes generados, mensajes encolados y transacciones SMTP.
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    from datetime import timedelta
+    from aiosmtpd.controller import Controller
+    from backend import generar_reporte
+    from backend.correo import BandejaSalida
+
+    class Servidor:
+        transacciones = destinatarios = 0
+
+        async def handle_DATA(self, server, session, envelope):
+            Servidor.transacciones += 1
+            Servidor.destinatarios += len(envelope.rcpt_tos)
+            return "250 OK"
+
+    # Sin proveedor LLM: el benchmark mide la distribución, no el análisis
+    generar_reporte.analizar_grafico_con_huggingface = lambda prompt: "Análisis de prueba."
+    generar_reporte.analizar_graficos_con_huggingface = lambda prompts: {c: "Análisis de prueba." for c in prompts}
+
+    controlador = Controller(Servidor(), hostname="127.0.0.1", port=8029)
+    controlador.start()
+    directorio = tempfile.mkdtemp()
+    bandeja = BandejaSalida(os.path.join(directorio, "bandeja"), "reportes@localhost",
+                            host="127.0.0.1", puerto=8029, seguridad="ninguna", usuario=None)
+    estacion = registro_estaciones.obtener(None)["codigo"]
+    try:
+        momento = datetime(2025, 1, 6, 8)
+        for n in [int(a) for a in sys.argv[1:]] or [10, 100, 1000, 5000]:
+            prueba = Suscripciones(os.path.join(directorio, f"suscripciones_{n}.db"), bandeja=bandeja)
+            prueba.agregar_lote((f"usuario{i}@ejemplo.com", estacion, "diaria") for i in range(n))
+            Servidor.transacciones = Servidor.destinatarios = 0
+            inicio = time.perf_counter()
+            resumen = prueba.ejecutar(momento)
+            encolado = time.perf_counter() - inicio
+            estado = bandeja.esperar(resumen[0]["id_correo"])
+            total = time.perf_counter() - inicio
+            assert estado["estado"] == "enviado" and Servidor.destinatarios == n, estado
+            # Una segunda ejecución en el mismo período no reenvía nada, ni otro worker sobre la misma base
+            assert prueba.ejecutar(momento) == []
+            assert Suscripciones(prueba.ruta_db, bandeja=bandeja).ejecutar(momento) == []
+            print(f"{n:>5} suscriptores: {prueba.contadores['reportes_generados']} reporte, "
+                  f"{prueba.contadores['mensajes']} mensaje, {Servidor.transacciones} transacciones SMTP | "
+                  f"encolado {encolado:.2f} s, entregado {total:.2f} s")
+            momento += timedelta(days=1)
+    finally:
+        bandeja.cerrar()
+        controlador.stop()
+        gestor_trabajos.cerrar()
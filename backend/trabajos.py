@@ -0,0 +1,120 @@
+import os
+import time
+import uuid
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from backend.generar_reporte import generar_reporte_pdf, BASE_DIR
+
+# === Cola de trabajos para generación de reportes ===
+# Pool acotado de workers; cada trabajo tiene su propio directorio de trabajo
+# y expone estado y progreso para que el cliente pueda consultarlos.
+
+TRABAJOS_DIR = os.getenv("TRABAJOS_DIR", os.path.join(BASE_DIR, "trabajos"))
+TRABAJOS_WORKERS = int(os.getenv("TRABAJOS_WORKERS", 2))
+TRABAJOS_MAX_PENDIENTES = int(os.getenv("TRABAJOS_MAX_PENDIENTES", 20))
+TRABAJOS_RETENCION = float(os.getenv("TRABAJOS_RETENCION", 3600))
+
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+COMPLETADO = "completado"
+ERROR = "error"
+
+class ColaLlenaError(Exception):
+    pass
+
+class Trabajo:
+    def __init__(self, directorio_base: str):
+        self.id = uuid.uuid4().hex
+        self.estado = PENDIENTE
+        self.progreso = 0
+        self.etapa = "En cola"
+        self.error = None
+        self.creado = time.time()
+        self.terminado = None
+        self.directorio = os.path.join(directorio_base, self.id)
+        self.ruta_pdf = os.path.join(self.directorio, "reporte_sequia.pdf")
+        self.id_correo = None  # lo fija el al_terminar de /reporte/enviar
+        self.futuro = None
+
+    def actualizar(self, porcentaje, etapa):
+        self.progreso = porcentaje
+        self.etapa = etapa
+
+    def a_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "estado": self.estado,
+            "progreso": self.progreso,
+            "etapa": self.etapa,
+            "error": self.error,
+            "creado": self.creado,
+            "terminado": self.terminado,
+            "id_correo": self.id_correo,
+        }
+
+class GestorTrabajos:
+    def __init__(self, workers=TRABAJOS_WORKERS, max_pendientes=TRABAJOS_MAX_PENDIENTES,
+                 directorio_base=TRABAJOS_DIR, retencion=TRABAJOS_RETENCION):
+        self.max_pendientes = max_pendientes
+        self.directorio_base = directorio_base
+        self.retencion = retencion
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reporte")
+        self._trabajos = {}
+        self._lock = threading.Lock()
+
+    def _ejecutar(self, trabajo: Trabajo, al_terminar=None, **kwargs):
+        trabajo.estado = EN_PROCESO
+        try:
+            exito = generar_reporte_pdf(
+                trabajo.ruta_pdf,
+                directorio_trabajo=trabajo.directorio,
+                progreso=trabajo.actualizar,
+                **kwargs
+            )
+            if exito and al_terminar is not None:
+                # Corre en el mismo worker antes de marcar el trabajo: si falla, el trabajo queda en error
+                al_terminar(trabajo)
+            if exito:
+                trabajo.estado = COMPLETADO
+                trabajo.actualizar(100, "Reporte listo")
+            else:
+                trabajo.estado = ERROR
+                trabajo.error = "Error al generar el reporte"
+        except Exception as e:
+            trabajo.estado = ERROR
+            trabajo.error = str(e)
+        finally:
+            trabajo.terminado = time.time()
+
+    def _limpiar_antiguos(self):
+        limite = time.time() - self.retencion
+        for id_trabajo, trabajo in list(self._trabajos.items()):
+            if trabajo.terminado and trabajo.terminado < limite:
+                shutil.rmtree(trabajo.directorio, ignore_errors=True)
+                del self._trabajos[id_trabajo]
+
+    def enviar(self, al_terminar=None, **kwargs) -> Trabajo:
+        # al_terminar(trabajo) se llama con el PDF ya generado (p. ej. para encolar el correo)
+        with self._lock:
+            self._limpiar_antiguos()
+            activos = sum(1 for t in self._trabajos.values() if t.estado in (PENDIENTE, EN_PROCESO))
+            if activos >= self.max_pendientes:
+                raise ColaLlenaError("Demasiados reportes en cola, intenta más tarde.")
+            trabajo = Trabajo(self.directorio_base)
+            os.makedirs(trabajo.directorio, exist_ok=True)
+            self._trabajos[trabajo.id] = trabajo
+        trabajo.futuro = self._pool.submit(self._ejecutar, trabajo, al_terminar, **kwargs)
+        return trabajo
+
+    def obtener(self, id_trabajo: str):
+        return self._trabajos.get(id_trabajo)
+
+    def esperar(self, trabajo: Trabajo) -> Trabajo:
+        trabajo.futuro.result()
+        return trabajo
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+gestor_trabajos = GestorTrabajos()
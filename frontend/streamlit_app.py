@@ -1,38 +1,141 @@
 import streamlit as st
 import requests
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import os
+import json
 
 # Configuración de la app
 st.set_page_config(page_title="Asistente Sequía Calderón", page_icon="💧", layout="wide")
 st.title("💧 Asistente de Análisis de Sequías - Calderón")
 
-DATA_PATH = os.path.join("data", "C20-Calderón_Precipitación-Diario.csv")
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+
+# Todo llega por la API (el frontend puede correr en otro contenedor): registro de
+# estaciones, agregados, series reducidas y CSV subidos.
+@st.cache_data(ttl=300, show_spinner=False)
+def listar_estaciones() -> list:
+    respuesta = requests.get(f"{BACKEND_URL}/estaciones", timeout=10)
+    respuesta.raise_for_status()
+    return respuesta.json()
+
+# Selector de estación (registro descubierto en data/)
+try:
+    estaciones = {e["codigo"]: e for e in listar_estaciones()}
+except Exception as e:
+    st.error(f"❌ No se pudo conectar con el backend: {e}")
+    st.stop()
+if not estaciones:
+    st.error("❌ No se encontraron estaciones en la carpeta data/.")
+    st.stop()
+codigos = list(estaciones)
+estacion_elegida = st.sidebar.selectbox(
+    "Estación:",
+    codigos,
+    index=codigos.index("C20") if "C20" in codigos else 0,
+    format_func=lambda codigo: f"{codigo} - {estaciones[codigo].get('nombre', codigo)}"
+)
+
+def obtener_con_etag(ruta: str, **parametros):
+    # Se guarda el ETag de cada respuesta: si los datos no cambiaron, la API contesta 304
+    # sin cuerpo y se reutiliza la copia de la sesión.
+    clave = (ruta, json.dumps(parametros, sort_keys=True, default=str))
+    copias = st.session_state.setdefault("agregados", {})
+    previo = copias.get(clave)
+    respuesta = requests.get(
+        f"{BACKEND_URL}{ruta}",
+        params=parametros,
+        headers={"If-None-Match": previo[0]} if previo else {},
+        timeout=30
+    )
+    if respuesta.status_code == 304 and previo:
+        return previo[1]
+    respuesta.raise_for_status()
+    copias[clave] = (respuesta.headers.get("ETag"), respuesta.json())
+    return copias[clave][1]
+
+def obtener_agregado(tipo: str, **parametros):
+    # Agregados precalculados por la API
+    return obtener_con_etag(f"/agregados/{tipo}", estacion=estacion_elegida, **parametros)
+
+def a_tabla(serie: dict) -> pd.DataFrame:
+    return pd.DataFrame({"fecha": pd.to_datetime(serie["fecha"]), "valor": serie["valor"]})
+
+def serie_visible(desde, hasta, metodo: str) -> dict:
+    # Sólo ~PUNTOS_GRAFICO puntos del rango visible llegan al navegador (los reduce la API)
+    serie = obtener_con_etag("/series", estacion=estacion_elegida, metodo=metodo,
+                             desde=None if desde is None else pd.Timestamp(desde).isoformat(),
+                             hasta=None if hasta is None else pd.Timestamp(hasta).isoformat())
+    return {**serie, "datos": a_tabla(serie)}
+
+def stream_chatbot(prompt: str, modelo: str, recuperar: bool = True):
+    # Consume los server-sent events de /chatbot/stream y entrega los fragmentos a medida que llegan.
+    # El timeout de lectura aplica entre fragmentos, no a la respuesta completa.
+    with requests.post(
+        f"{BACKEND_URL}/chatbot/stream",
+        json={"pregunta": prompt, "modelo": modelo.lower(), "recuperar": recuperar},
+        stream=True,
+        timeout=(5, 60)
+    ) as response:
+        response.raise_for_status()
+        for linea in response.iter_lines(decode_unicode=True):
+            if linea and linea.startswith("data:"):
+                token = json.loads(linea[5:]).get("token")
+                if token:
+                    yield token
+
+def mostrar_stream(prompt: str, modelo: str, contenedor) -> str:
+    texto = ""
+    for token in stream_chatbot(prompt, modelo):
+        texto += token
+        contenedor.markdown(texto + "▌")
+    contenedor.markdown(texto or "Sin respuesta.")
+    return texto or "Sin respuesta."
 
-@st.cache_data(show_spinner=False)
-def cargar_datos():
+def interpretar_grafica(prompt: str, modelo: str) -> str:
     try:
-        df = pd.read_csv(DATA_PATH, parse_dates=["fecha"])
-        return df
+        with st.spinner("Consultando al asistente IA..."):
+            # Sin recuperación: los prompts de gráficas y de archivos subidos ya incluyen el
+            # resumen de sus propios datos (agregado "contexto" o resumir_serie)
+            return "".join(stream_chatbot(prompt, modelo, recuperar=False)) or "Sin respuesta."
+    except requests.exceptions.HTTPError as e:
+        return f"Error: {e.response.status_code}"
     except Exception as e:
-        st.error(f"❌ No se pudo cargar el archivo CSV: {e}")
-        return pd.DataFrame()
+        return f"Error al conectar con el backend: {e}"
 
-def interpretar_grafica(prompt: str, modelo: str) -> str:
+def interpretar_graficas(prompts: dict, modelo: str) -> dict:
+    # Todas las interpretaciones en una sola petición a /chatbot/batch
     try:
         with st.spinner("Consultando al asistente IA..."):
             response = requests.post(
-                "http://localhost:8000/chatbot",
-                json={"pregunta": prompt, "modelo": modelo.lower()},
-                timeout=20
+                f"{BACKEND_URL}/chatbot/batch", json={"prompts": prompts, "modelo": modelo.lower()}, timeout=120
             )
-        if response.status_code == 200:
-            return response.json().get("respuesta", "Sin respuesta.")
-        else:
-            return f"Error: {response.status_code}"
+            response.raise_for_status()
+            return response.json()["respuestas"]
+    except requests.exceptions.HTTPError as e:
+        return dict.fromkeys(prompts, f"Error: {e.response.status_code}")
     except Exception as e:
-        return f"Error al conectar con el backend: {e}"
+        return dict.fromkeys(prompts, f"Error al conectar con el backend: {e}")
+
+def prompts_graficas(registros_anio: dict) -> dict:
+    # Cada prompt lleva el digesto de la serie de la estación: el modelo no ve la gráfica
+    nombre = estaciones[estacion_elegida].get("nombre", estacion_elegida)
+    datos = f"Resumen de la serie de {nombre} ({estacion_elegida}):\n{obtener_agregado('contexto')['texto']}\n\n"
+    registros = ", ".join(f"{a}: {n}" for a, n in zip(registros_anio["año"], registros_anio["registros"]))
+    return {
+        "registros": datos + (
+            f"Número de registros por año: {registros}.\n\n"
+            "Analiza el gráfico de barras titulado Número de registros por año. Describe la tendencia "
+            "del Número de registros. Específicamente, identifica el año con la menor cantidad de registros, "
+            "los años con la mayor cantidad consistente de registros y explica los cambios aparentes, teniendo "
+            "en cuenta que los datos del último año podrían ser parciales. "
+            "Hipotetiza qué podría causar este patrón en el número de registros a lo largo de estos años."
+        ),
+        "tendencia": datos + f"Interpreta la tendencia de la disponibilidad de agua en {nombre} según la gráfica de línea generada.",
+        "dispersion": datos + f"Describe la dispersión de los valores de disponibilidad de agua en el tiempo en {nombre}.",
+        "histograma": datos + f"Analiza el histograma de distribución de valores de disponibilidad de agua en {nombre}.",
+    }
 
 # Inicializar estados de sesión para interpretaciones
 if "interpretaciones" not in st.session_state:
@@ -57,7 +160,7 @@ with tab1:
     if "modelo_seleccionado" not in st.session_state:
         st.session_state.modelo_seleccionado = "OpenAI"
 
-    modelo_opciones = ["OpenAI", "HuggingFace"]
+    modelo_opciones = ["OpenAI", "HuggingFace", "Local"]
     modelo_elegido = st.selectbox(
         "Selecciona el modelo de lenguaje:", 
         modelo_opciones, 
@@ -65,32 +168,17 @@ with tab1:
     )
     st.session_state.modelo_seleccionado = modelo_elegido
 
+    if "pregunta_pendiente" not in st.session_state:
+        st.session_state.pregunta_pendiente = None
+
     def enviar_pregunta():
         pregunta = st.session_state.input_pregunta.strip()
         if not pregunta:
             st.warning("Por favor, ingresa una pregunta válida.")
             return
-        try:
-            with st.spinner("Consultando al asistente..."):
-                response = requests.post(
-                    "http://localhost:8000/chatbot",
-                    json={"pregunta": pregunta, "modelo": st.session_state.modelo_seleccionado.lower()},
-                    timeout=15
-                )
-            if response.status_code == 200:
-                respuesta = response.json().get("respuesta", "Sin respuesta.")
-                st.session_state.historial.append({
-                    "pregunta": pregunta,
-                    "respuesta": respuesta,
-                    "modelo": st.session_state.modelo_seleccionado
-                })
-                st.session_state.input_pregunta = ""
-            else:
-                st.error(f"Error al contactar con el backend: {response.status_code}")
-        except requests.exceptions.Timeout:
-            st.error("El servidor no respondió a tiempo. Intenta de nuevo más tarde.")
-        except Exception as e:
-            st.error(f"No se pudo conectar con el backend: {e}")
+        # La respuesta se transmite más abajo, al renderizar el historial
+        st.session_state.pregunta_pendiente = pregunta
+        st.session_state.input_pregunta = ""
 
     st.text_input("Tu pregunta:", key="input_pregunta", on_change=enviar_pregunta)
 
@@ -100,38 +188,67 @@ with tab1:
         st.markdown(f"**Asistente:** {turno['respuesta']}")
         st.markdown("---")
 
+    if st.session_state.pregunta_pendiente:
+        pregunta = st.session_state.pregunta_pendiente
+        st.session_state.pregunta_pendiente = None
+        st.markdown(f"**Modelo ({st.session_state.modelo_seleccionado}):**")
+        st.markdown(f"**Tú:** {pregunta}")
+        st.markdown("**Asistente:**")
+        try:
+            respuesta = mostrar_stream(pregunta, st.session_state.modelo_seleccionado, st.empty())
+            st.session_state.historial.append({
+                "pregunta": pregunta,
+                "respuesta": respuesta,
+                "modelo": st.session_state.modelo_seleccionado
+            })
+        except requests.exceptions.HTTPError as e:
+            st.error(f"Error al contactar con el backend: {e.response.status_code}")
+        except requests.exceptions.Timeout:
+            st.error("El servidor no respondió a tiempo. Intenta de nuevo más tarde.")
+        except Exception as e:
+            st.error(f"No se pudo conectar con el backend: {e}")
+        st.markdown("---")
+
 with tab2:
     st.subheader("💧 Explora los datos históricos del suministro de agua")
 
-    df = cargar_datos()
-    if df.empty:
+    # Los agregados los calcula y cachea la API; aquí sólo se dibujan
+    try:
+        # La serie completa trae también el rango de fechas de la estación
+        fecha_min, fecha_max = (None if f is None else pd.Timestamp(f) for f in serie_visible(None, None, "lttb")["rango"])
+        registros_anio = obtener_agregado("registros_anio")
+    except Exception as e:
+        st.error(f"❌ No se pudieron cargar los datos: {e}")
         st.stop()
-
-    if not {"fecha", "valor"}.issubset(df.columns):
-        st.error("El archivo debe contener las columnas 'fecha' y 'valor'.")
+    if fecha_min is None:
+        st.error("❌ La estación no tiene registros.")
         st.stop()
 
-    df["año"] = df["fecha"].dt.year
-
     # Función local para solicitar interpretación y actualizar estado
-    def solicitar_interpretacion(clave, prompt):
+    def solicitar_interpretacion(clave):
+        try:
+            prompt = prompts_graficas(registros_anio)[clave]
+        except Exception as e:
+            st.session_state.interpretaciones[clave] = f"No se pudo obtener el resumen de los datos: {e}"
+            return
         resp = interpretar_grafica(prompt, st.session_state.modelo_seleccionado)
         st.session_state.interpretaciones[clave] = resp
 
+    if st.button("🧠 Interpretar todas las gráficas"):
+        try:
+            st.session_state.interpretaciones.update(
+                interpretar_graficas(prompts_graficas(registros_anio), st.session_state.modelo_seleccionado)
+            )
+        except Exception as e:
+            st.error(f"❌ No se pudo obtener el resumen de los datos: {e}")
+
     # Número de registros por año
     st.markdown("📊 ### Número de registros por año")
-    st.bar_chart(df.groupby("año").size())
+    st.bar_chart(pd.Series(registros_anio["registros"], index=pd.Index(registros_anio["año"], name="año")))
     col1, col2 = st.columns([1, 1])
     with col1:
         if st.button("Interpretar con IA - Registros por año"):
-            prompt = (
-                "Analiza el gráfico de barras titulado Número de registros por año. Describe la tendencia "
-                "del Número de registros desde 2020 hasta 2025. Específicamente, identifica el año con la menor "
-                "cantidad de registros, los años con la mayor cantidad consistente de registros y explica el cambio "
-                "aparente observado en el año 2025, teniendo en cuenta que los datos para 2025 podrían ser parciales. "
-                "Hipotetiza qué podría causar este patrón en el número de registros a lo largo de estos años."
-            )
-            solicitar_interpretacion("registros", prompt)
+            solicitar_interpretacion("registros")
     with col2:
         if st.button("Limpiar interpretación - Registros"):
             st.session_state.interpretaciones["registros"] = ""
@@ -139,14 +256,22 @@ with tab2:
     if st.session_state.interpretaciones["registros"]:
         st.info(st.session_state.interpretaciones["registros"])
 
+    # Rango visible de las series: al acotarlo se vuelve a pedir la serie con más detalle
+    fecha_min, fecha_max = fecha_min.date(), fecha_max.date()
+    visible_desde, visible_hasta = st.slider(
+        "Rango visible", min_value=fecha_min, max_value=fecha_max, value=(fecha_min, fecha_max), format="YYYY-MM-DD"
+    )
+    visible_hasta = pd.Timestamp(visible_hasta) + pd.Timedelta(days=1) - pd.Timedelta(1, "ns")
+
     # Tendencia temporal
     st.markdown("📊 ### Variación de disponibilidad de agua a lo largo del tiempo")
-    st.plotly_chart(px.line(df, x="fecha", y="valor", title="Tendencia de disponibilidad de agua"), use_container_width=True)
+    tendencia = serie_visible(visible_desde, visible_hasta, "lttb")
+    st.plotly_chart(px.line(tendencia["datos"], x="fecha", y="valor", title="Tendencia de disponibilidad de agua"), use_container_width=True)
+    st.caption(f"{len(tendencia['datos']):,} de {tendencia['total_puntos']:,} puntos (LTTB)")
     col1, col2 = st.columns([1, 1])
     with col1:
         if st.button("Interpretar con IA - Tendencia temporal"):
-            prompt = "Interpreta la tendencia de la disponibilidad de agua en Calderón según la gráfica de línea generada."
-            solicitar_interpretacion("tendencia", prompt)
+            solicitar_interpretacion("tendencia")
     with col2:
         if st.button("Limpiar interpretación - Tendencia"):
             st.session_state.interpretaciones["tendencia"] = ""
@@ -156,12 +281,13 @@ with tab2:
 
     # Dispersión
     st.markdown("📊 ### Dispersión de valores en el tiempo")
-    st.plotly_chart(px.scatter(df, x="fecha", y="valor", title="Dispersión del indicador 'valor'"), use_container_width=True)
+    dispersion = serie_visible(visible_desde, visible_hasta, "minmax")
+    st.plotly_chart(px.scatter(dispersion["datos"], x="fecha", y="valor", title="Dispersión del indicador 'valor'"), use_container_width=True)
+    st.caption(f"{len(dispersion['datos']):,} de {dispersion['total_puntos']:,} puntos (mín./máx. por tramo)")
     col1, col2 = st.columns([1, 1])
     with col1:
         if st.button("Interpretar con IA - Dispersión temporal"):
-            prompt = "Describe la dispersión de los valores de disponibilidad de agua en el tiempo en Calderón."
-            solicitar_interpretacion("dispersion", prompt)
+            solicitar_interpretacion("dispersion")
     with col2:
         if st.button("Limpiar interpretación - Dispersión"):
             st.session_state.interpretaciones["dispersion"] = ""
@@ -171,12 +297,18 @@ with tab2:
 
     # Histograma
     st.markdown("📊 ### Distribución del indicador 'valor' (Histograma)")
-    st.plotly_chart(px.histogram(df, x="valor", nbins=30, title="Histograma de valores"), use_container_width=True)
+    # Al navegador sólo llegan las barras del histograma
+    agregado = obtener_agregado("histograma")
+    bordes = np.array(agregado["bordes"])
+    histograma = pd.DataFrame({"valor": (bordes[:-1] + bordes[1:]) / 2, "count": agregado["conteos"]})
+    st.plotly_chart(
+        px.bar(histograma, x="valor", y="count", title="Histograma de valores").update_traces(width=bordes[1] - bordes[0]),
+        use_container_width=True
+    )
     col1, col2 = st.columns([1, 1])
     with col1:
         if st.button("Interpretar con IA - Histograma"):
-            prompt = "Analiza el histograma de distribución de valores de disponibilidad de agua en Calderón."
-            solicitar_interpretacion("histograma", prompt)
+            solicitar_interpretacion("histograma")
     with col2:
         if st.button("Limpiar interpretación - Histograma"):
             st.session_state.interpretaciones["histograma"] = ""
@@ -185,19 +317,15 @@ with tab2:
         st.info(st.session_state.interpretaciones["histograma"])
 
     # --- Resumen ---
-    total_dias = df.shape[0]
-    dias_sin_agua = df[df["valor"] == 0].shape[0]
-    porcentaje_sin_agua = (dias_sin_agua / total_dias) * 100 if total_dias > 0 else 0
-
-    fiabilidad = None
-    if {"completo_mediciones", "completo_umbral"}.issubset(df.columns):
-        fiabilidad = (df["completo_mediciones"] >= df["completo_umbral"]).sum() / total_dias * 100
-
+    indicadores = obtener_agregado("resumen")
+    rachas = obtener_agregado("rachas")
     resumen = {
-        "Total de días registrados": total_dias,
-        "Días sin agua (valor = 0)": dias_sin_agua,
-        "Porcentaje sin disponibilidad (%)": round(porcentaje_sin_agua, 2),
-        "Fiabilidad (%)": round(fiabilidad, 2) if fiabilidad is not None else "No disponible"
+        "Total de días registrados": indicadores["total_dias"],
+        "Días sin agua (valor = 0)": indicadores["dias_sin_agua"],
+        "Porcentaje sin disponibilidad (%)": round(indicadores["porcentaje_sin_agua"], 2),
+        "Fiabilidad (%)": indicadores["fiabilidad"] if indicadores["fiabilidad"] is not None else "No disponible",
+        "Racha seca más larga (días)": rachas["racha_seca_max"],
+        "Racha seca actual (días)": rachas["racha_seca_actual"],
     }
     st.markdown("### Resumen de indicadores")
     st.json(resumen)
@@ -208,20 +336,49 @@ with tab3:
     archivo_cargado = st.file_uploader("Sube tu archivo CSV", type=["csv"])
     
     if archivo_cargado is not None:
-        df_personalizado = pd.read_csv(archivo_cargado)
-        
-        # Mostrar datos cargados
-        st.success("✅ Archivo cargado correctamente.")
-        st.dataframe(df_personalizado.head())
-
-        # Mostrar gráfica
-        if "fecha" in df_personalizado.columns and "valor" in df_personalizado.columns:
-            df_personalizado["fecha"] = pd.to_datetime(df_personalizado["fecha"], errors="coerce")
-            st.line_chart(df_personalizado.set_index("fecha")["valor"])
-
-            # Construir prompt de análisis
+        # Se ingiere por bloques en la API una sola vez por archivo: los reruns reutilizan el informe
+        subidas = st.session_state.setdefault("subidas", {})
+        if archivo_cargado.file_id not in subidas:
+            with st.spinner("Procesando el archivo por bloques..."):
+                try:
+                    archivo_cargado.seek(0)
+                    respuesta = requests.post(f"{BACKEND_URL}/subidas", data=archivo_cargado,
+                                              headers={"Content-Type": "text/csv"}, timeout=600)
+                    if respuesta.status_code == 400:
+                        subidas[archivo_cargado.file_id] = {"error": respuesta.json()["detail"]}
+                    else:
+                        respuesta.raise_for_status()
+                        subidas[archivo_cargado.file_id] = respuesta.json()
+                except Exception as e:
+                    subidas[archivo_cargado.file_id] = {"error": f"No se pudo procesar el archivo: {e}"}
+        informe = subidas[archivo_cargado.file_id]
+
+        if "error" in informe:
+            st.warning(f"⚠️ {informe['error']}")
+        elif informe["estadisticas"]["filas"] == 0:
+            st.warning("El archivo no tiene filas válidas.")
+        else:
+            estadisticas = informe["estadisticas"]
+            st.success(f"✅ Archivo cargado correctamente: {estadisticas['filas']:,} filas válidas.")
+            if informe["filas_invalidas"]:
+                st.warning(f"⚠️ Se descartaron {informe['filas_invalidas']:,} filas inválidas.")
+                st.dataframe(pd.DataFrame(informe["errores"]), hide_index=True)
+            st.json(estadisticas)
+            st.dataframe(pd.DataFrame(informe["muestra"]))
+
+            # Mostrar gráfica (la reduce la API; si la subida ya se purgó allí, se vuelve a subir)
+            try:
+                serie = obtener_con_etag(f"/subidas/{informe['id']}/series")
+                st.line_chart(a_tabla(serie).set_index("fecha")["valor"])
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code != 404:
+                    raise
+                subidas.pop(archivo_cargado.file_id)
+                st.rerun()
+
+            # Prompt de análisis: digesto de tamaño fijo de todo el archivo, calculado por la API al subirlo
             prompt_analisis = (
-                f"Aquí tienes datos de disponibilidad de agua para Calderón:\n{df_personalizado.head(30).to_string(index=False)}\n\n"
+                f"Aquí tienes un resumen de los datos de disponibilidad de agua para Calderón:\n{informe['contexto']}\n\n"
                 "Por favor, proporciona un análisis técnico de la situación de sequía basándote en los datos proporcionados. "
                 "Incluye observaciones, posibles causas y recomendaciones."
             )
@@ -237,38 +394,64 @@ with tab3:
                     st.write(analisis_automatico)
                 except Exception as e:
                     st.error(f"❌ Error al generar el análisis con IA: {e}")
-        else:
-            st.warning("El archivo debe tener las columnas 'fecha' y 'valor'.")
 
 with tab4:
     st.subheader("4️⃣ Generar Reporte PDF y Enviar por Correo")
 
-    if "reporte_generado" not in st.session_state:
-        st.session_state.reporte_generado = False
+    if "trabajo_reporte" not in st.session_state:
+        st.session_state.trabajo_reporte = None
+    if "reporte_pdf" not in st.session_state:
+        st.session_state.reporte_pdf = None
 
     if st.button("📄 Generar Reporte PDF"):
-        with st.spinner("🚀 Generando reporte... por favor espera"):
+        try:
+            respuesta = requests.post(
+                f"{BACKEND_URL}/reporte/trabajos", params={"estacion": estacion_elegida}, timeout=10
+            )
+            if respuesta.status_code == 202:
+                st.session_state.trabajo_reporte = respuesta.json()["id"]
+                st.session_state.reporte_pdf = None
+            else:
+                st.error(f"❌ Error al generar el reporte: {respuesta.text}")
+        except Exception as e:
+            st.error(f"❌ No se pudo conectar con el backend: {e}")
+
+    # El fragmento se vuelve a ejecutar solo cada 2 s mientras haya un trabajo en curso,
+    # sin bloquear ni recalcular el resto de la app.
+    @st.fragment(run_every=2)
+    def estado_reporte():
+        id_trabajo = st.session_state.trabajo_reporte
+        if id_trabajo:
             try:
-                respuesta = requests.get("http://localhost:8000/reporte")
-                if respuesta.status_code == 200:
-                    with open("reporte_sequia.pdf", "wb") as f:
-                        f.write(respuesta.content)
-                    st.success("✅ Reporte generado exitosamente.")
-                    st.session_state.reporte_generado = True
-                else:
-                    st.error(f"❌ Error al generar el reporte: {respuesta.text}")
+                estado = requests.get(f"{BACKEND_URL}/reporte/trabajos/{id_trabajo}", timeout=10).json()
             except Exception as e:
                 st.error(f"❌ No se pudo conectar con el backend: {e}")
+                return
+
+            if estado.get("estado") == "completado":
+                pdf = requests.get(f"{BACKEND_URL}/reporte/trabajos/{id_trabajo}/pdf", timeout=30)
+                st.session_state.reporte_pdf = pdf.content
+                st.session_state.trabajo_reporte = None
+                st.success("✅ Reporte generado exitosamente.")
+            elif estado.get("estado") == "error":
+                st.session_state.trabajo_reporte = None
+                st.error(f"❌ Error al generar el reporte: {estado.get('error')}")
+            elif "progreso" in estado:
+                st.progress(estado["progreso"] / 100, text=f"🚀 {estado['etapa']}...")
+            else:
+                st.session_state.trabajo_reporte = None
+                st.error(f"❌ Error al consultar el reporte: {estado}")
 
-    if st.session_state.reporte_generado:
-        with open("reporte_sequia.pdf", "rb") as pdf_file:
+        if st.session_state.reporte_pdf:
             st.download_button(
                 label="📥 Descargar Reporte",
-                data=pdf_file,
+                data=st.session_state.reporte_pdf,
                 file_name="reporte_sequia.pdf",
                 mime="application/pdf"
             )
 
+    estado_reporte()
+
     st.markdown("---")
 
     st.markdown("### ✉️ Enviar Reporte por Correo")
@@ -280,12 +463,31 @@ with tab4:
         else:
             with st.spinner("🚀 Enviando correo..."):
                 try:
-                    payload = {"destinatario": email_destinatario}
-                    respuesta = requests.post("http://localhost:8000/reporte/enviar", json=payload)
-                    if respuesta.status_code == 200:
-                        st.success("✅ Correo enviado exitosamente.")
+                    payload = {"destinatario": email_destinatario, "estacion": estacion_elegida}
+                    respuesta = requests.post(f"{BACKEND_URL}/reporte/enviar", json=payload)
+                    if respuesta.status_code in (200, 202):
+                        st.success("✅ Reporte en preparación: el correo se enviará en cuanto el PDF esté listo.")
                     else:
                         st.error(f"❌ Error al enviar correo: {respuesta.text}")
                 except Exception as e:
                     st.error(f"❌ Error de conexión con backend: {e}")
 
+
+    st.markdown("### 🗓️ Suscribirse al reporte periódico")
+    col_correo, col_frecuencia = st.columns([3, 1])
+    correo_suscripcion = col_correo.text_input("Correo del suscriptor")
+    frecuencia = col_frecuencia.selectbox("Frecuencia", ["diaria", "semanal", "mensual"], index=1)
+
+    if st.button("🔔 Suscribirse"):
+        if not correo_suscripcion:
+            st.warning("⚠️ Debes ingresar un correo válido.")
+        else:
+            try:
+                payload = {"correo": correo_suscripcion, "estacion": estacion_elegida, "frecuencia": frecuencia}
+                respuesta = requests.post(f"{BACKEND_URL}/suscripciones", json=payload)
+                if respuesta.status_code == 201:
+                    st.success(f"✅ Suscripción {frecuencia} registrada: recibirás el reporte en cada período.")
+                else:
+                    st.error(f"❌ Error al suscribirse: {respuesta.text}")
+            except Exception as e:
+                st.error(f"❌ Error de conexión con backend: {e}")
@@ -1,19 +1,16 @@
-import smtplib
-import os
-from dotenv import load_dotenv
+from backend.correo import ConexionSMTP, SMTP_HOST, SMTP_PORT, SMTP_SEGURIDAD, SMTP_USER, SMTP_PASSWORD
 
-load_dotenv()
-
-remitente = os.getenv("EMAIL_SENDER")
-password = os.getenv("EMAIL_PASSWORD")
-
-print(f"Usuario: {remitente}")
-print(f"Password length: {len(password) if password else 'No definido'}")
+# Prueba de login con la misma configuración que usa la bandeja de salida (backend/correo.py)
+print(f"Servidor: {SMTP_HOST}:{SMTP_PORT} ({SMTP_SEGURIDAD})")
+print(f"Usuario: {SMTP_USER}")
+print(f"Password length: {len(SMTP_PASSWORD) if SMTP_PASSWORD else 'No definido'}")
 
 try:
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-        smtp.set_debuglevel(1)
-        smtp.login(remitente, password)
+    conexion = ConexionSMTP()
+    smtp = conexion.abrir()
+    smtp.set_debuglevel(1)
+    smtp.noop()
+    conexion.cerrar()
     print("Login exitoso")
 except Exception as e:
     print(f"Error en login SMTP: {e}")
@@ -0,0 +1,47 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from backend.almacen import AlmacenColumnar
+
+# Una reconstrucción desde el CSV (cambió su firma) concurrente con anexar() no debe
+# perder las lecturas anexadas en vivo.
+
+def test_reconstruccion_concurrente_conserva_anexos(tmp_path):
+    ruta_csv = tmp_path / "estacion.csv"
+    pd.DataFrame({
+        "fecha": pd.date_range("2020-01-01", "2020-12-31", freq="D"),
+        "valor": 0.0,
+    }).to_csv(ruta_csv, index=False)
+    almacen = AlmacenColumnar(str(ruta_csv), str(tmp_path / "almacen"))
+    almacen.leer()
+
+    vivas = pd.date_range("2021-01-01", periods=60, freq="D")
+    fin = threading.Event()
+
+    def anexar():
+        try:
+            for fecha in vivas:
+                almacen.anexar(pd.DataFrame({"fecha": [fecha], "valor": [1.0]}))
+        finally:
+            fin.set()
+
+    def tocar_csv():
+        # Cambia la firma del CSV para forzar reconstrucciones mientras se anexa
+        mtime = os.stat(ruta_csv).st_mtime_ns
+        while not fin.is_set():
+            mtime += 1_000_000_000
+            os.utime(ruta_csv, ns=(mtime, mtime))
+            almacen.leer(columnas=["fecha"])
+
+    hilos = [threading.Thread(target=anexar), threading.Thread(target=tocar_csv)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    df = almacen.leer()
+    assert len(df) == 366 + len(vivas)
+    assert np.array_equal(df["fecha"].to_numpy()[-len(vivas):], vivas.to_numpy())
@@ -0,0 +1,134 @@
+import json
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from backend import chatbot
+from backend.cache import CacheRespuestas
+from backend.enrutador import ABIERTO
+
+# Lotes de prompts (/chatbot/batch y los análisis del reporte) contra un servidor local
+# que imita OpenAI y Hugging Face, con fallas inyectadas: el lote debe pasar por el
+# enrutador (reintentos, circuit breaker y conmutación) igual que un prompt suelto.
+
+class _Stub(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, estado, cuerpo):
+        datos = json.dumps(cuerpo).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_POST(self):
+        datos = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        proveedor = "openai" if self.path.startswith("/v1/") else "zephyr"
+        servidor = self.server
+        with servidor.lock:
+            es_lista = isinstance(datos.get("inputs"), list)
+            servidor.peticiones.append((proveedor, len(datos["inputs"]) if es_lista else 1))
+            fallas = servidor.fallas[proveedor]
+            estado = fallas.pop(0) if fallas else servidor.siempre.get(proveedor)
+        if es_lista and servidor.rechazar_listas:
+            return self._responder(400, {"error": "inputs must be a string"})
+        if estado:
+            return self._responder(estado, {"error": "falla inyectada"})
+        if proveedor == "openai":
+            pregunta = datos["messages"][-1]["content"]
+            return self._responder(200, {"choices": [{"message": {"content": f"openai: {pregunta}"}}]})
+        entradas = datos["inputs"] if es_lista else [datos["inputs"]]
+        resultados = [
+            [{"generated_text": f"{e}zephyr: {e.split('<|user|>')[-1].split('<|assistant|>')[0]}"}] for e in entradas
+        ]
+        return self._responder(200, resultados if es_lista else resultados[0])
+
+@pytest.fixture
+def servidor(monkeypatch):
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    servidor.lock = threading.Lock()
+    servidor.peticiones = []
+    servidor.fallas = {"openai": [], "zephyr": []}  # códigos a devolver en las próximas peticiones
+    servidor.siempre = {}                           # código fijo por proveedor
+    servidor.rechazar_listas = False
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    monkeypatch.setattr(chatbot, "OPENAI_API_URL", f"{url}/v1/chat/completions")
+    monkeypatch.setattr(chatbot, "HF_API_URL", f"{url}/models/zephyr")
+    monkeypatch.setattr(chatbot, "cache_respuestas", CacheRespuestas())
+    monkeypatch.setattr(chatbot.enrutador, "backoff", 0.0)
+    monkeypatch.setattr(chatbot.enrutador, "cobertura", False)
+    chatbot.enrutador.reiniciar()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+    chatbot.enrutador.reiniciar()
+
+def _lote(prompts, modelo):
+    async def correr():
+        try:
+            return await chatbot.responder_lote_async(prompts, modelo)
+        finally:
+            await chatbot.cerrar_cliente()
+    return asyncio.run(correr())
+
+PROMPTS = {f"s{i}": f"pregunta {i}" for i in range(5)}
+
+def test_lote_zephyr_en_una_sola_peticion(servidor):
+    respuestas = _lote(PROMPTS, "zephyr")
+    assert respuestas == {c: f"zephyr: {p}" for c, p in PROMPTS.items()}
+    assert servidor.peticiones == [("zephyr", 5)]
+
+def test_lote_reintenta_errores_transitorios(servidor):
+    servidor.fallas["zephyr"] = [503]
+    respuestas = _lote(PROMPTS, "zephyr")
+    assert respuestas == {c: f"zephyr: {p}" for c, p in PROMPTS.items()}
+    assert servidor.peticiones == [("zephyr", 5), ("zephyr", 5)]
+    assert chatbot.enrutador.estados["zephyr"].contadores["reintentos"] == 1
+
+def test_lista_rechazada_cae_a_prompts_individuales(servidor):
+    servidor.rechazar_listas = True
+    respuestas = _lote(PROMPTS, "zephyr")
+    assert respuestas == {c: f"zephyr: {p}" for c, p in PROMPTS.items()}
+    assert sorted(servidor.peticiones) == [("zephyr", 1)] * 5 + [("zephyr", 5)]
+    assert chatbot.enrutador.estados["zephyr"].contadores["lotes_fallidos"] == 1
+
+def test_conmuta_a_openai_si_zephyr_falla(servidor):
+    servidor.siempre["zephyr"] = 500
+    respuestas = _lote(PROMPTS, "zephyr")
+    assert respuestas == {c: f"openai: {p}" for c, p in PROMPTS.items()}
+    # Se cachea bajo el proveedor que respondió
+    assert chatbot.cache_respuestas.obtener("pregunta 0", "openai", chatbot.PARAMETROS["openai"]) == "openai: pregunta 0"
+    assert chatbot.cache_respuestas.obtener("pregunta 0", "zephyr", chatbot.PARAMETROS["zephyr"]) is None
+
+def test_circuito_abierto_no_recibe_el_lote(servidor):
+    estado = chatbot.enrutador.estados["zephyr"]
+    estado.circuito, estado.abierto_hasta = ABIERTO, float("inf")
+    respuestas = _lote(PROMPTS, "zephyr")
+    assert respuestas == {c: f"openai: {p}" for c, p in PROMPTS.items()}
+    assert all(proveedor == "openai" for proveedor, _ in servidor.peticiones)
+
+def test_error_sin_respaldo_afecta_solo_a_su_prompt(servidor):
+    servidor.siempre = {"zephyr": 400, "openai": 400}
+    respuestas = _lote({"a": "uno", "b": "dos"}, "zephyr")
+    assert all(r.startswith("Error en la API Hugging Face") for r in respuestas.values()), respuestas
+
+def test_puente_sincrono_desde_hilos(servidor):
+    # Los reportes llaman desde hilos de trabajo; todos comparten el event loop del puente
+    resultados = {}
+
+    def pedir(i):
+        resultados[i] = chatbot.responder_lote({"x": f"hilo {i}", "y": f"otro {i}"}, "zephyr")
+
+    hilos = [threading.Thread(target=pedir, args=(i,)) for i in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert resultados == {i: {"x": f"zephyr: hilo {i}", "y": f"zephyr: otro {i}"} for i in range(4)}
+    assert servidor.peticiones == [("zephyr", 2)] * 4